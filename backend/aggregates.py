@@ -0,0 +1,100 @@
+import json
+import time
+import zlib
+import hashlib
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from state_backend import ChangeFollower, StateBackend
+
+# metric name -> (collection, contribution(record) -> number)
+Metrics = Dict[str, Tuple[str, Callable[[Dict[str, Any]], float]]]
+
+
+class RunningTotals(ChangeFollower):
+    """
+    Dashboard aggregates kept as running sums over collections.
+
+    Each metric is the sum of a per-record contribution (a field value, or
+    1/0 for counts). Every record's last contribution is remembered, so a
+    write only adds the difference: O(1) per change instead of re-reading
+    the collection on every dashboard poll. Reads return a snapshot plus a
+    digest that only changes when a total does.
+    """
+
+    def __init__(self, backend: StateBackend, metrics: Metrics):
+        self.metrics = metrics
+        self._by_collection: Dict[str, list] = {}
+        for name, (collection, _) in metrics.items():
+            self._by_collection.setdefault(collection, []).append(name)
+        super().__init__(backend, self._by_collection)
+        self.reset()
+
+    def reset(self):
+        self.totals: Dict[str, float] = {name: 0 for name in self.metrics}
+        self._contributions: Dict[str, Dict[str, tuple]] = {collection: {} for collection in self._by_collection}
+        self.changed_at = time.time()
+        self._digest: Optional[str] = None
+
+    def _contribution(self, name: str, record: Dict[str, Any]) -> float:
+        try:
+            return self.metrics[name][1](record)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"⚠️ Skipping record in dashboard metric {name}: {e}")
+            return 0
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        names = self._by_collection[collection]
+        contributions = self._contributions[collection]
+        old = contributions.pop(key, None)
+        new = tuple(self._contribution(name, record) for name in names) if record is not None else None
+        if new is not None:
+            contributions[key] = new
+        if old == new:
+            return
+        for i, name in enumerate(names):
+            self.totals[name] += (new[i] if new is not None else 0) - (old[i] if old is not None else 0)
+        self.changed_at = time.time()
+        self._digest = None
+
+    def snapshot(self) -> Tuple[Dict[str, float], str]:
+        """Current totals and a digest of them (the basis for ETags)"""
+        self.sync()
+        with self._lock:
+            if self._digest is None:
+                self._digest = hashlib.sha1(json.dumps(self.totals, sort_keys=True).encode()).hexdigest()[:16]
+            return dict(self.totals), self._digest
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def conditional_response(request: Request, digest: str, build: Callable[[], Dict[str, Any]]) -> Response:
+    """304 with no body if the client already has this version of the resource, else the JSON payload built by `build`"""
+    # Scoped to the path, since several endpoints render the same totals differently; weak,
+    # because the payloads carry timestamps
+    etag = f'W/"{digest}-{zlib.crc32(request.url.path.encode()):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=build(), headers=headers)
+
+
+def count_where(field: str, value: Any) -> Callable[[Dict[str, Any]], int]:
+    """Contribution counting records whose `field` equals `value`"""
+    return lambda record: 1 if record.get(field) == value else 0
+
+
+def count_all(record: Dict[str, Any]) -> int:
+    return 1
+
+
+def field_sum(field: str) -> Callable[[Dict[str, Any]], float]:
+    return lambda record: record[field]
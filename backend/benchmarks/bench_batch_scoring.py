@@ -0,0 +1,74 @@
+"""
+Vulnerability scoring throughput: per-applicant predict_vulnerability_* vs predict_vulnerability_batch.
+
+Uses a freshly trained scaler + random forest on synthetic applicants so the numbers do not
+depend on which model files are present. Run from the backend directory:
+    python benchmarks/bench_batch_scoring.py
+"""
+import os
+import sys
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shelter_allocation import routes
+from shelter_allocation.scoring import feature_matrix, fallback_scores, priority_levels
+
+CIRCUMSTANCES = ['flood_damage', 'medical_condition', 'pregnant', 'orphaned_minor', 'lost_documents']
+
+
+def synthetic_applicants(n, rng):
+    return [
+        {
+            'poverty_level': float(rng.uniform(0, 100)),
+            'unemployment_duration': int(rng.integers(0, 24)),
+            'family_size': int(rng.integers(1, 9)),
+            'has_disability': bool(rng.random() < 0.1),
+            'is_elderly': bool(rng.random() < 0.15),
+            'is_single_parent': bool(rng.random() < 0.1),
+            'minority_status': bool(rng.random() < 0.2),
+            'special_circumstances': list(rng.choice(CIRCUMSTANCES, size=int(rng.integers(0, 4)), replace=False))
+        }
+        for _ in range(n)
+    ]
+
+
+def main():
+    rng = np.random.default_rng(7)
+    train = synthetic_applicants(2000, rng)
+    X_train = feature_matrix(train)
+    scaler = StandardScaler().fit(X_train)
+    model = RandomForestRegressor(n_estimators=100, random_state=0, n_jobs=1).fit(
+        scaler.transform(X_train), fallback_scores(X_train)
+    )
+    routes.model, routes.scaler = model, scaler
+
+    print(f"{'applicants':>10} {'path':>9} {'single_ms':>10} {'batch_ms':>9} {'speedup':>8} {'single/s':>9} {'batch/s':>9}")
+    for n in (10, 100, 500, 2000):
+        applicants = synthetic_applicants(n, rng)
+
+        for label, single in (("ml", routes.predict_vulnerability_ml), ("fallback", routes.predict_vulnerability_fallback)):
+            if label == "fallback":
+                routes.model, routes.scaler = None, None
+
+            start = time.perf_counter()
+            single_scores = [single(a) for a in applicants]
+            single_levels = [routes.get_priority_level(s) for s in single_scores]
+            single_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batch_scores, _ = routes.predict_vulnerability_batch(applicants, use_ml=label == "ml")
+            batch_levels = priority_levels(batch_scores)
+            batch_s = time.perf_counter() - start
+
+            assert np.allclose(single_scores, batch_scores) and single_levels == batch_levels
+            print(f"{n:>10} {label:>9} {single_s * 1000:>10.1f} {batch_s * 1000:>9.1f} {single_s / batch_s:>7.1f}x "
+                  f"{n / single_s:>9.0f} {n / batch_s:>9.0f}")
+            routes.model, routes.scaler = model, scaler
+
+
+if __name__ == "__main__":
+    main()
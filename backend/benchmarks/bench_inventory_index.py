@@ -0,0 +1,89 @@
+"""
+Warehouse item search latency: the previous scan (substring check over every
+item of every warehouse, then haversine per match) vs InventoryIndex combined
+with the ProfileGeoIndex radius filter.
+
+Run from the backend directory:
+    python benchmarks/bench_inventory_index.py
+"""
+import os
+import sys
+import time
+from math import radians, cos, sin, asin, sqrt
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state_backend import MemoryStateBackend
+from hospital_allocation.inventory_index import InventoryIndex
+from hospital_allocation.profile_index import ProfileGeoIndex
+
+# Rough bounding box of Tamil Nadu
+LAT_RANGE = (8.0, 13.6)
+LON_RANGE = (76.2, 80.4)
+PRODUCTS = ["rice", "basmati rice", "wheat flour", "rice bran oil", "tomatoes", "tomato paste", "milk powder",
+            "drinking water", "toor dal", "sugar", "salt", "tea", "biscuits", "blankets", "tarpaulin", "paracetamol",
+            "oral rehydration salts", "sanitary pads", "soap", "candles", "torch", "batteries", "baby food", "lentils"]
+SIZES = ["", " 1kg", " 5kg", " 25kg", " 500ml", " 1l", " pack of 10", " carton"]
+QUERIES = ["rice", "ri", "dal", "oral rehyd", "5kg", "paste", "batter", "zzz"]
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * asin(sqrt(a))
+
+
+def scan(profiles, item_name, lat, lon, radius_km, limit):
+    matching = []
+    for profile in profiles.values():
+        if profile["role"] == "warehouse_manager":
+            data = profile["profile_data"]
+            if not any(item_name.lower() in item.get("name", "").lower() for item in data.get("inventory_items", [])):
+                continue
+            distance = haversine(lon, lat, data["location_lon"], data["location_lat"])
+            if distance <= radius_km:
+                matching.append((distance, profile))
+    return sorted(matching, key=lambda x: x[0])[:limit]
+
+
+def indexed(inventory_index, profile_index, item_name, lat, lon, radius_km, limit):
+    matches, _ = inventory_index.search(item_name)
+    return profile_index.nearby("warehouse_manager", lat, lon, radius_km, limit, among=matches)
+
+
+def main():
+    rng = np.random.default_rng(7)
+    profiles = MemoryStateBackend().collection("user_profiles")
+    for warehouses, items_per_warehouse in ((1_000, 50), (5_000, 200)):
+        lat = rng.uniform(*LAT_RANGE, warehouses)
+        lon = rng.uniform(*LON_RANGE, warehouses)
+        for i in range(warehouses):
+            items = [{"name": (rng.choice(PRODUCTS) + rng.choice(SIZES)).title(), "quantity": int(rng.integers(1, 500))}
+                     for _ in range(items_per_warehouse)]
+            profiles.put(f"w{i}", {"user_id": f"w{i}", "role": "warehouse_manager", "profile_data": {
+                "location_lat": float(lat[i]), "location_lon": float(lon[i]), "inventory_items": items}})
+
+        start = time.perf_counter()
+        inventory_index, profile_index = InventoryIndex(profiles), ProfileGeoIndex(profiles)
+        inventory_index.sync()
+        profile_index.sync()
+        print(f"\n{warehouses} warehouses x {items_per_warehouse} items, index build {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"{inventory_index.stats()['distinct_names']} distinct names")
+        print(f"{'query':>12} {'radius_km':>10} {'scan_ms':>9} {'index_ms':>9} {'hits':>5}")
+        for query in QUERIES:
+            for radius_km in (25.0, 200.0):
+                q_lat, q_lon = float(rng.uniform(*LAT_RANGE)), float(rng.uniform(*LON_RANGE))
+                start = time.perf_counter()
+                expected = scan(profiles, query, q_lat, q_lon, radius_km, 20)
+                scan_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                for _ in range(20):
+                    got = indexed(inventory_index, profile_index, query, q_lat, q_lon, radius_km, 20)
+                index_ms = (time.perf_counter() - start) * 1000 / 20
+                assert [p["user_id"] for _, p in got] == [p["user_id"] for _, p in expected]
+                print(f"{query:>12} {radius_km:>10.0f} {scan_ms:>9.2f} {index_ms:>9.3f} {len(got):>5}")
+
+
+if __name__ == "__main__":
+    main()
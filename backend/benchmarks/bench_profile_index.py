@@ -0,0 +1,93 @@
+"""
+Nearby-profile lookup latency with 100k user profiles: the previous full scan
+(every profile, scalar haversine) vs the role-partitioned ProfileGeoIndex.
+
+Run from the backend directory:
+    python benchmarks/bench_profile_index.py
+"""
+import os
+import sys
+import time
+from math import radians, cos, sin, asin, sqrt
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state_backend import MemoryStateBackend
+from hospital_allocation.profile_index import ProfileGeoIndex
+
+# Rough bounding box of Tamil Nadu
+LAT_RANGE = (8.0, 13.6)
+LON_RANGE = (76.2, 80.4)
+ROLES = ["farmer", "logistics_driver", "shelter_manager", "warehouse_manager", "ngo"]
+PROFILES = 100_000
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * asin(sqrt(a))
+
+
+def scan_farmers(profiles, lat, lon, radius_km, limit):
+    nearby = []
+    for profile in profiles.values():
+        if profile["role"] == "farmer":
+            data = profile["profile_data"]
+            if "location_lat" in data and "location_lon" in data:
+                distance = haversine(lon, lat, data["location_lon"], data["location_lat"])
+                if distance <= radius_km:
+                    nearby.append((distance, profile))
+    return sorted(nearby, key=lambda x: x[0])[:limit]
+
+
+def time_per_query(fn, queries, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lat, lon in queries:
+            fn(lat, lon)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1000
+
+
+def main():
+    rng = np.random.default_rng(42)
+    profiles = MemoryStateBackend().collection("user_profiles")
+    lat = rng.uniform(*LAT_RANGE, PROFILES)
+    lon = rng.uniform(*LON_RANGE, PROFILES)
+    roles = rng.choice(ROLES, PROFILES)
+    profiles.seed(
+        (f"u{i}", {"user_id": f"u{i}", "role": roles[i],
+                   "profile_data": {"location_lat": float(lat[i]), "location_lon": float(lon[i])}})
+        for i in range(PROFILES)
+    )
+
+    start = time.perf_counter()
+    index = ProfileGeoIndex(profiles)
+    index.sync()
+    print(f"{PROFILES} profiles, index build {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = list(zip(rng.uniform(*LAT_RANGE, 50), rng.uniform(*LON_RANGE, 50)))
+    # Sanity check: same hits as the scan
+    for q_lat, q_lon in queries[:5]:
+        expected = [p["user_id"] for _, p in scan_farmers(profiles, q_lat, q_lon, 25.0, 100)]
+        assert [p["user_id"] for _, p in index.nearby("farmer", q_lat, q_lon, 25.0, 100)] == expected
+
+    print(f"{'radius_km':>10} {'limit':>6} {'scan_ms':>9} {'index_ms':>9} {'hits':>6}")
+    for radius_km, limit in ((10.0, 100), (50.0, 100), (50.0, 10), (500.0, 10)):
+        hits = np.mean([len(index.nearby("farmer", q_lat, q_lon, radius_km, limit)) for q_lat, q_lon in queries])
+        scan_ms = time_per_query(lambda q_lat, q_lon: scan_farmers(profiles, q_lat, q_lon, radius_km, limit), queries[:10], repeat=1)
+        index_ms = time_per_query(lambda q_lat, q_lon: index.nearby("farmer", q_lat, q_lon, radius_km, limit), queries)
+        print(f"{radius_km:>10.0f} {limit:>6} {scan_ms:>9.2f} {index_ms:>9.3f} {hits:>6.0f}")
+
+    start = time.perf_counter()
+    for i in range(1000):
+        key = f"u{i}"
+        profiles.put(key, {**profiles.get(key), "profile_data": {"location_lat": float(lat[-i - 1]), "location_lon": float(lon[-i - 1])}})
+    index.sync()
+    print(f"1000 profile moves applied from the change feed in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Radius lookup latency against infra size: full haversine scan vs HospitalSpatialIndex.
+
+Run from the backend directory:
+    python benchmarks/bench_spatial_index.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hospital_allocation.scoring import haversine_vec
+from hospital_allocation.spatial_index import HospitalSpatialIndex
+
+# Rough bounding box of Tamil Nadu
+LAT_RANGE = (8.0, 13.6)
+LON_RANGE = (76.2, 80.4)
+
+
+def time_per_query(fn, queries, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lat, lon in queries:
+            fn(lat, lon)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1000
+
+
+def main():
+    rng = np.random.default_rng(42)
+    queries = list(zip(rng.uniform(*LAT_RANGE, 200), rng.uniform(*LON_RANGE, 200)))
+
+    print(f"{'rows':>8} {'radius_km':>10} {'build_ms':>9} {'scan_ms':>9} {'index_ms':>9} {'hits':>7}")
+    for size in (1_000, 10_000, 100_000, 500_000):
+        lat = rng.uniform(*LAT_RANGE, size)
+        lon = rng.uniform(*LON_RANGE, size)
+
+        start = time.perf_counter()
+        index = HospitalSpatialIndex(lat, lon)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for radius_km in (10.0, 50.0):
+            def scan(q_lat, q_lon):
+                return np.flatnonzero(haversine_vec(q_lon, q_lat, lon, lat) <= radius_km)
+
+            def lookup(q_lat, q_lon):
+                return index.query_radius(q_lat, q_lon, radius_km)
+
+            hits = np.mean([len(lookup(q_lat, q_lon)) for q_lat, q_lon in queries])
+            scan_ms = time_per_query(scan, queries)
+            index_ms = time_per_query(lookup, queries)
+            print(f"{size:>8} {radius_km:>10.0f} {build_ms:>9.1f} {scan_ms:>9.3f} {index_ms:>9.3f} {hits:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Concurrent allocation submissions against a local dev chain (anvil, hardhat node, ganache).
+
+Deploy ShelterContract.sol to the dev chain first, then run from the backend directory:
+    BLOCKCHAIN_RPC_URL=http://127.0.0.1:8545 BLOCKCHAIN_CHAIN_ID=31337 \
+    CONTRACT_ADDRESS=0x... ADMIN_WALLET_ADDRESS=0x... ADMIN_PRIVATE_KEY=0x... \
+    python benchmarks/load_test_allocations.py --count 500 --threads 32
+
+Every thread submits through the shared BlockchainHandler, so the run checks that
+locally reserved nonces never collide and reports submission and confirmation rates.
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blockchain import BlockchainHandler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200, help="allocations to submit")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent submitting threads")
+    parser.add_argument("--receipt-timeout", type=float, default=120, help="seconds to wait for all receipts")
+    args = parser.parse_args()
+
+    handler = BlockchainHandler()
+    run_id = uuid.uuid4().hex[:8]
+
+    def submit(i):
+        start = time.perf_counter()
+        try:
+            txn_hash, nonce = handler.submit_allocation(f"load-{run_id}-{i}", 10 + i % 90, f"unit-{i % 50}")
+            return txn_hash, nonce, time.perf_counter() - start, None
+        except Exception as e:
+            return None, None, time.perf_counter() - start, str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(submit, range(args.count)))
+    submit_seconds = time.perf_counter() - start
+
+    sent = [r for r in results if r[3] is None]
+    errors = [r[3] for r in results if r[3] is not None]
+    nonces = [r[1] for r in sent]
+    latencies = sorted(r[2] * 1000 for r in results)
+
+    print(f"submitted {len(sent)}/{args.count} in {submit_seconds:.2f}s "
+          f"({len(sent) / submit_seconds:.1f} tx/s) with {args.threads} threads")
+    print(f"submit latency ms  p50={latencies[len(latencies) // 2]:.1f}  p99={latencies[int(len(latencies) * 0.99) - 1]:.1f}")
+    print(f"duplicate nonces: {len(nonces) - len(set(nonces))}   errors: {len(errors)}")
+    for error in sorted(set(errors))[:5]:
+        print(f"   {error}")
+
+    pending = {r[0] for r in sent}
+    failed = 0
+    deadline = time.time() + args.receipt_timeout
+    while pending and time.time() < deadline:
+        for txn_hash in list(pending):
+            receipt = handler.get_receipt(txn_hash)
+            if receipt is not None:
+                pending.discard(txn_hash)
+                failed += receipt['status'] != 1
+        time.sleep(0.5)
+    total_seconds = time.perf_counter() - start
+
+    print(f"confirmed {len(sent) - len(pending) - failed}, reverted {failed}, unconfirmed {len(pending)} "
+          f"after {total_seconds:.2f}s ({(len(sent) - len(pending)) / total_seconds:.1f} tx/s end to end)")
+    print(f"submission stats: {handler.get_submission_stats()}")
+
+
+if __name__ == "__main__":
+    main()
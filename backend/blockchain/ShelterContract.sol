@@ -60,6 +60,32 @@ contract ShelterAllocation {
         uint256 _vulnerabilityScore,
         string memory _shelterUnitId
     ) public onlyAuthorized {
+        _recordAllocation(_applicantId, _vulnerabilityScore, _shelterUnitId);
+    }
+    
+    // Record several allocations in one transaction (one AllocationRecorded event each)
+    function recordAllocationsBatch(
+        string[] memory _applicantIds,
+        uint256[] memory _vulnerabilityScores,
+        string[] memory _shelterUnitIds
+    ) public onlyAuthorized {
+        require(_applicantIds.length > 0, "Batch cannot be empty");
+        require(
+            _applicantIds.length == _vulnerabilityScores.length &&
+            _applicantIds.length == _shelterUnitIds.length,
+            "Batch arrays must have the same length"
+        );
+        
+        for (uint256 i = 0; i < _applicantIds.length; i++) {
+            _recordAllocation(_applicantIds[i], _vulnerabilityScores[i], _shelterUnitIds[i]);
+        }
+    }
+    
+    function _recordAllocation(
+        string memory _applicantId,
+        uint256 _vulnerabilityScore,
+        string memory _shelterUnitId
+    ) internal {
         require(bytes(_applicantId).length > 0, "Applicant ID cannot be empty");
         require(_vulnerabilityScore > 0, "Vulnerability score must be positive");
         require(bytes(_shelterUnitId).length > 0, "Shelter unit ID cannot be empty");
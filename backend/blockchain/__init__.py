@@ -1,16 +1,39 @@
 import os
 import json
 from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from web3.logs import DISCARD
+from eth_abi import decode as abi_decode
 from dotenv import load_dotenv
 import time
+import threading
+from .nonce_manager import NonceManager, TransactionQueue
+from .read_cache import AllocationReadCache, applicant_key
+from .rpc_provider import provider_from_env
+from state_backend import state_backend
 
 load_dotenv()
 
+# Gas for recordAllocationsBatch: fixed overhead plus the per-allocation cost of the string writes
+BATCH_GAS_BASE = 60000
+BATCH_GAS_PER_ALLOCATION = 200000
+
+DEFAULT_RPC_URL = 'https://polygon-amoy.publicnode.com'
+
+# Return types of getAllocation, for decoding batched eth_call results
+GET_ALLOCATION_OUTPUTS = ['string', 'uint256', 'string', 'uint256', 'bool']
+
+# Upper bound on the block range one log poll asks the node for
+MAX_LOG_SCAN_BLOCKS = 2000
+
 class BlockchainHandler:
-    def __init__(self):
-        # Initialize Web3 connection to Polygon Amoy Testnet
-        # RPC URL: `https://polygon-amoy.publicnode.com` is correct
-        self.w3 = Web3(Web3.HTTPProvider('https://polygon-amoy.publicnode.com'))
+    def __init__(self, w3=None):
+        # Initialize Web3 connection (defaults to Polygon Amoy Testnet)
+        # RPC URL: `https://polygon-amoy.publicnode.com` is correct; BLOCKCHAIN_RPC_URL points at a local dev chain
+        # or lists several comma-separated endpoints for failover
+        self.chain_id = int(os.getenv('BLOCKCHAIN_CHAIN_ID', '80002'))  # Amoy Testnet chain ID
+        self.explorer_tx_url = os.getenv('BLOCKCHAIN_EXPLORER_TX_URL', 'https://www.oklink.com/amoy/tx/')
+        self.w3 = w3 if w3 is not None else Web3(provider_from_env(DEFAULT_RPC_URL))
         
         if not self.w3.is_connected():
             raise ConnectionError("Failed to connect to blockchain network")
@@ -64,6 +87,12 @@ class BlockchainHandler:
                             "internalType": "uint256",
                             "name": "timestamp",
                             "type": "uint256"
+                        },
+                        {
+                            "indexed": False,
+                            "internalType": "address",
+                            "name": "recordedBy",
+                            "type": "address"
                         }
                     ],
                     "name": "AllocationRecorded",
@@ -169,6 +198,29 @@ class BlockchainHandler:
                     "outputs": [],
                     "stateMutability": "nonpayable",
                     "type": "function"
+                },
+                {
+                    "inputs": [
+                        {
+                            "internalType": "string[]",
+                            "name": "_applicantIds",
+                            "type": "string[]"
+                        },
+                        {
+                            "internalType": "uint256[]",
+                            "name": "_vulnerabilityScores",
+                            "type": "uint256[]"
+                        },
+                        {
+                            "internalType": "string[]",
+                            "name": "_shelterUnitIds",
+                            "type": "string[]"
+                        }
+                    ],
+                    "name": "recordAllocationsBatch",
+                    "outputs": [],
+                    "stateMutability": "nonpayable",
+                    "type": "function"
                 }
             ]
         
@@ -178,51 +230,165 @@ class BlockchainHandler:
             abi=self.contract_abi
         )
 
+        # Nonces come from a counter shared by every worker process (all of them sign with the admin
+        # account), and every sign-and-send in this process goes through one FIFO submitter
+        self.nonces = NonceManager(
+            lambda: self.w3.eth.get_transaction_count(self.admin_address, 'pending'),
+            backend=state_backend,
+            account=self.admin_address
+        )
+        self.tx_queue = TransactionQueue()
+
+        # Reads are served from a local cache fed by our own writes and AllocationRecorded logs;
+        # counters and network info come from a snapshot refreshed by a background poller
+        self.read_cache = AllocationReadCache(
+            finality_depth=int(os.getenv('BLOCKCHAIN_FINALITY_DEPTH', '16')),
+            block_time_seconds=float(os.getenv('BLOCKCHAIN_BLOCK_TIME_SECONDS', '2'))
+        )
+        self.poll_seconds = float(os.getenv('BLOCKCHAIN_POLL_SECONDS', '15'))
+        self._chain_state = None
+        self._chain_state_lock = threading.Lock()
+        self._chain_id = None
+        self._last_scanned_block = None
+        self._poller = None
+        self._poller_lock = threading.Lock()
+
         print("✅ Blockchain handler initialized successfully")
-        print(f"   Network: {'Connected' if self.w3.is_connected() else 'Disconnected'}")
+        print(f"   Network: Connected ({self.w3.provider})")
         print(f"   Contract Address: {self.contract_address}")
         print(f"   Admin Address: {self.admin_address}")
     
+    def build_allocation_transaction(self, applicant_id, vulnerability_score, shelter_unit_id, nonce):
+        """Build the unsigned recordAllocation transaction for a given nonce"""
+        # Convert score to integer (multiply by 100 to preserve 2 decimal places)
+        score_int = int(round(vulnerability_score * 100))
+        
+        return self.contract.functions.recordAllocation(
+            applicant_id,
+            score_int,
+            shelter_unit_id
+        ).build_transaction({
+            'chainId': self.chain_id,
+            'gas': 250000,     # Increased gas limit for string operations
+            'gasPrice': self.w3.to_wei('35', 'gwei'),  # Slightly higher gas price
+            'nonce': nonce,
+        })
+    
+    def send_transaction(self, build, nonce=None):
+        """
+        Reserve a nonce, build, sign and send a transaction through the submission queue
+        `build(nonce)` returns the unsigned transaction dict. Passing `nonce` re-sends at
+        that nonce (replacing a dropped transaction) instead of reserving a new one.
+        Returns: (transaction hash (hex), nonce)
+        """
+        def _send():
+            tx_nonce = self.nonces.reserve() if nonce is None else nonce
+            try:
+                signed_txn = self.w3.eth.account.sign_transaction(build(tx_nonce), self.private_key)
+                txn_hash = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+            except Exception:
+                # The nonce may be unused now; hand it back unless the node already took it
+                self.nonces.failed(tx_nonce)
+                raise
+            return self.w3.to_hex(txn_hash), tx_nonce
+        
+        return self.tx_queue.run(_send)
+    
+    def resync_nonces(self):
+        """
+        Re-read the pending nonce from the node, e.g. when a transaction is stuck behind a nonce gap
+        Runs on the submission queue so it never lands between a reservation and its send
+        """
+        return self.tx_queue.run(self.nonces.resync)
+    
+    def submit_allocation(self, applicant_id, vulnerability_score, shelter_unit_id, nonce=None):
+        """
+        Sign and send a recordAllocation transaction without waiting for it to be mined
+        Returns: (transaction hash (hex), nonce)
+        """
+        return self.send_transaction(
+            lambda tx_nonce: self.build_allocation_transaction(applicant_id, vulnerability_score, shelter_unit_id, tx_nonce),
+            nonce=nonce
+        )
+    
+    def build_batch_transaction(self, allocations, nonce):
+        """Build the unsigned recordAllocationsBatch transaction for a list of allocation dicts"""
+        return self.contract.functions.recordAllocationsBatch(
+            [a['applicant_id'] for a in allocations],
+            [int(round(a['vulnerability_score'] * 100)) for a in allocations],
+            [a['shelter_unit_id'] for a in allocations]
+        ).build_transaction({
+            'chainId': self.chain_id,
+            'gas': BATCH_GAS_BASE + BATCH_GAS_PER_ALLOCATION * len(allocations),
+            'gasPrice': self.w3.to_wei('35', 'gwei'),
+            'nonce': nonce,
+        })
+    
+    def submit_allocations_batch(self, allocations, nonce=None):
+        """
+        Sign and send one recordAllocationsBatch transaction for several allocations
+        Each allocation is a dict with applicant_id, vulnerability_score and shelter_unit_id
+        Returns: (transaction hash (hex), nonce)
+        """
+        return self.send_transaction(lambda tx_nonce: self.build_batch_transaction(allocations, tx_nonce), nonce=nonce)
+    
+    def wait_for_receipt(self, txn_hash, timeout=120, poll_seconds=3):
+        """Poll for a receipt until it appears or `timeout` seconds pass (blocking)"""
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            receipt = self.get_receipt(txn_hash)
+            if receipt is not None:
+                return receipt
+            time.sleep(poll_seconds)
+        return None
+    
+    def transaction_known(self, txn_hash):
+        """Whether the node still knows a transaction (False means it was dropped from the mempool)"""
+        try:
+            return self.w3.eth.get_transaction(txn_hash) is not None
+        except TransactionNotFound:
+            return False
+    
+    def get_submission_stats(self):
+        return {
+            'nonces': self.nonces.stats(),
+            'queue': self.tx_queue.stats()
+        }
+    
+    def get_receipt(self, txn_hash):
+        """Return the receipt for a transaction, or None while it is still pending"""
+        try:
+            return self.w3.eth.get_transaction_receipt(txn_hash)
+        except TransactionNotFound:
+            return None
+    
+    def allocation_result(self, txn_hash_hex, receipt):
+        """Convert a mined receipt into the allocation result dict"""
+        if receipt['status'] == 1:
+            self.note_confirmed(receipt)
+            return {
+                'success': True,
+                'transaction_hash': txn_hash_hex,
+                'block_number': receipt['blockNumber'],
+                'gas_used': receipt['gasUsed'],
+                'verification_url': f'{self.explorer_tx_url}{txn_hash_hex}'
+            }
+        return {
+            'success': False,
+            'error': 'Transaction failed on blockchain',
+            'transaction_hash': txn_hash_hex
+        }
+    
     def record_allocation(self, applicant_id, vulnerability_score, shelter_unit_id):
         """
-        Record a shelter allocation on the blockchain
+        Record a shelter allocation on the blockchain and wait for the receipt (blocking)
         Returns: {success: bool, transaction_hash: str, verification_url: str, error: str}
         """
         try:
-            # Convert score to integer (multiply by 100 to preserve 2 decimal places)
-            score_int = int(round(vulnerability_score * 100))
-            
-            # Build transaction
-            transaction = self.contract.functions.recordAllocation(
-                applicant_id,
-                score_int,
-                shelter_unit_id
-            ).build_transaction({
-                'chainId': 80002,  # CORRECT: Amoy Testnet chain ID
-                'gas': 250000,     # Increased gas limit for string operations
-                'gasPrice': self.w3.to_wei('35', 'gwei'),  # Slightly higher gas price
-                'nonce': self.w3.eth.get_transaction_count(self.admin_address),
-            })
-            
-            # Sign transaction
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, self.private_key)
-            
-            # Send transaction
-            txn_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            txn_hash_hex = txn_hash.hex()
+            txn_hash_hex, _ = self.submit_allocation(applicant_id, vulnerability_score, shelter_unit_id)
             
             # Wait for transaction receipt (with timeout)
-            start_time = time.time()
-            timeout = 120  # 2 minutes timeout
-            
-            while time.time() - start_time < timeout:
-                try:
-                    receipt = self.w3.eth.getTransactionReceipt(txn_hash)
-                    if receipt is not None:
-                        break
-                except:
-                    pass
-                time.sleep(3)  # Wait 3 seconds between checks
+            receipt = self.wait_for_receipt(txn_hash_hex)
             
             if receipt is None:
                 return {
@@ -231,60 +397,201 @@ class BlockchainHandler:
                     'transaction_hash': txn_hash_hex
                 }
             
-            # Check if transaction was successful
-            if receipt.status == 1:
-                return {
-                    'success': True,
-                    'transaction_hash': txn_hash_hex,
-                    'block_number': receipt['blockNumber'],
-                    'gas_used': receipt['gasUsed'],
-                    'verification_url': f'https://www.oklink.com/amoy/tx/{txn_hash_hex}' # CORRECT: Amoy block explorer URL
-                }
-            else:
+            return self.allocation_result(txn_hash_hex, receipt)
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Blockchain error: {str(e)}"
+            }
+    
+    def record_allocations_batch(self, allocations):
+        """
+        Record several shelter allocations in a single transaction and wait for the receipt (blocking)
+        Returns: {success: bool, transaction_hash: str, allocation_count: int, verification_url: str, error: str}
+        """
+        try:
+            txn_hash_hex, _ = self.submit_allocations_batch(allocations)
+            receipt = self.wait_for_receipt(txn_hash_hex)
+            
+            if receipt is None:
                 return {
                     'success': False,
-                    'error': 'Transaction failed on blockchain',
+                    'error': 'Transaction confirmation timeout',
                     'transaction_hash': txn_hash_hex
                 }
             
+            result = self.allocation_result(txn_hash_hex, receipt)
+            result['allocation_count'] = len(allocations)
+            return result
+            
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Blockchain error: {str(e)}"
             }
     
+    def note_confirmed(self, receipt):
+        """Feed the AllocationRecorded events of one of our mined transactions into the read cache"""
+        try:
+            events = [
+                event for event in self.contract.events.AllocationRecorded().process_receipt(receipt, errors=DISCARD)
+                if event['address'] == self.contract.address
+            ]
+        except Exception as e:
+            print(f"⚠️  Could not decode allocation events: {e}")
+            return
+        added = self.read_cache.put_events(events)
+        with self._chain_state_lock:
+            if self._chain_state is not None:
+                self._chain_state['count'] += added
+    
     def get_allocation(self, applicant_id):
         """
-        Retrieve allocation data from blockchain
+        Retrieve allocation data (read-through cache in front of the contract)
         """
+        cached = self.read_cache.get(applicant_id)
+        if cached is not None:
+            return cached
+        
         try:
             result = self.contract.functions.getAllocation(applicant_id).call()
             
+            data = {
+                'applicant_id': result[0],
+                'vulnerability_score': float(result[1]) / 100.0,  # Convert back to float
+                'shelter_unit_id': result[2],
+                'timestamp': result[3],
+                'is_approved': result[4]
+            }
+            # Recent allocations are left to the log poller, which knows their block
+            if time.time() - result[3] >= self.read_cache.finality_seconds:
+                self.read_cache.put(applicant_key(applicant_id), data)
+            
             return {
                 'success': True,
-                'data': {
-                    'applicant_id': result[0],
-                    'vulnerability_score': float(result[1]) / 100.0,  # Convert back to float
-                    'shelter_unit_id': result[2],
-                    'timestamp': result[3],
-                    'is_approved': result[4]
-                }
+                'data': data
             }
         except Exception as e:
+            if 'Allocation not found' in str(e):
+                self.read_cache.put_missing(applicant_id)
             return {
                 'success': False,
                 'error': f"Failed to get allocation: {str(e)}"
             }
     
+    def get_allocations(self, applicant_ids):
+        """
+        Retrieve several allocations: cache hits first, then one JSON-RPC batch of
+        getAllocation calls for the rest (sequential calls if the provider cannot batch)
+        Returns: {applicant_id: get_allocation-style result}
+        """
+        results = {}
+        missing = []
+        for applicant_id in dict.fromkeys(applicant_ids):
+            cached = self.read_cache.get(applicant_id)
+            if cached is not None:
+                results[applicant_id] = cached
+            else:
+                missing.append(applicant_id)
+        if not missing:
+            return results
+        
+        make_batch_request = getattr(self.w3.provider, 'make_batch_request', None)
+        try:
+            responses = make_batch_request([
+                ('eth_call', [{'to': self.contract.address, 'data': self.contract.encode_abi('getAllocation', [applicant_id])}, 'latest'])
+                for applicant_id in missing
+            ]) if make_batch_request else None
+        except NotImplementedError:
+            responses = None
+        except Exception as e:
+            print(f"⚠️  Batched getAllocation failed, falling back to single calls: {e}")
+            responses = None
+        
+        if responses is None:
+            for applicant_id in missing:
+                results[applicant_id] = self.get_allocation(applicant_id)
+            return results
+        
+        for applicant_id, response in zip(missing, responses):
+            if 'error' in response:
+                error = response['error'].get('message', str(response['error']))
+                if 'Allocation not found' in error:
+                    self.read_cache.put_missing(applicant_id)
+                results[applicant_id] = {'success': False, 'error': f"Failed to get allocation: {error}"}
+                continue
+            result = abi_decode(GET_ALLOCATION_OUTPUTS, Web3.to_bytes(hexstr=response['result']))
+            data = {
+                'applicant_id': result[0],
+                'vulnerability_score': float(result[1]) / 100.0,
+                'shelter_unit_id': result[2],
+                'timestamp': result[3],
+                'is_approved': result[4]
+            }
+            if time.time() - result[3] >= self.read_cache.finality_seconds:
+                self.read_cache.put(applicant_key(applicant_id), data)
+            results[applicant_id] = {'success': True, 'data': data}
+        return results
+    
+    def refresh_chain_state(self):
+        """Read counters, balance and new AllocationRecorded logs from the node in one pass"""
+        latest = self.w3.eth.block_number
+        count = self.contract.functions.allocationCount().call(block_identifier=latest)
+        balance = self.w3.eth.get_balance(self.admin_address, latest)
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        
+        from_block = latest if self._last_scanned_block is None else self._last_scanned_block + 1
+        from_block = max(from_block, latest - MAX_LOG_SCAN_BLOCKS + 1)
+        if from_block <= latest:
+            events = self.contract.events.AllocationRecorded().get_logs(from_block=from_block, to_block=latest)
+            self.read_cache.put_events(events)
+        self._last_scanned_block = latest
+        self.read_cache.check_finality(latest, lambda number: self.w3.to_hex(self.w3.eth.get_block(number)['hash']))
+        
+        with self._chain_state_lock:
+            self._chain_state = {
+                'latest_block': latest,
+                'count': count,
+                'admin_balance': balance,
+                'updated_at': time.time()
+            }
+    
+    def _poll_chain(self):
+        while True:
+            try:
+                self.refresh_chain_state()
+            except Exception as e:
+                print(f"⚠️  Blockchain poll failed: {e}")
+            time.sleep(self.poll_seconds)
+    
+    def _cached_chain_state(self):
+        """Latest chain snapshot; refreshed inline only when the poller has none or has stalled"""
+        # Concurrent first calls must not each start a poller
+        with self._poller_lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_chain, name='chain-poller', daemon=True)
+                self._poller.start()
+        
+        with self._chain_state_lock:
+            state = self._chain_state
+        if state is None or time.time() - state['updated_at'] > 3 * self.poll_seconds:
+            self.refresh_chain_state()
+            with self._chain_state_lock:
+                state = self._chain_state
+        return dict(state)
+    
     def get_allocation_count(self):
         """
         Get total number of allocations recorded
         """
         try:
-            count = self.contract.functions.getAllocationCount().call()
+            state = self._cached_chain_state()
             return {
                 'success': True,
-                'count': count
+                'count': state['count'],
+                'as_of_block': state['latest_block']
             }
         except Exception as e:
             return {
@@ -297,40 +604,82 @@ class BlockchainHandler:
         Get blockchain network information
         """
         try:
+            state = self._cached_chain_state()
             return {
                 'success': True,
-                'network_connected': self.w3.is_connected(),
-                'latest_block': self.w3.eth.block_number,
-                'chain_id': self.w3.eth.chain_id,
-                'admin_balance': self.w3.eth.getBalance(self.admin_address)
+                'network_connected': True,
+                'latest_block': state['latest_block'],
+                'chain_id': self._chain_id,
+                'admin_balance': state['admin_balance'],
+                'snapshot_age_seconds': round(time.time() - state['updated_at'], 2)
             }
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
-
-# Create global instance
-try:
-    blockchain_handler = BlockchainHandler()
-except Exception as e:
-    print(f"⚠️  Blockchain initialization failed: {e}")
-    print("⚠️  Running in offline mode - blockchain features disabled")
     
-    # Create dummy handler for offline development
-    class DummyBlockchainHandler:
-        def record_allocation(self, *args, **kwargs):
-            return {
-                'success': True, 
-                'transaction_hash': '0x' + '0' * 64,
-                'verification_url': 'https://example.com',
-                'blockchain_disabled': True
-            }
-        def get_allocation(self, *args, **kwargs):
-            return {'success': False, 'error': 'Blockchain disabled'}
-        def get_allocation_count(self):
-            return {'success': True, 'count': 0}
-        def get_network_info(self):
-            return {'success': False, 'error': 'Blockchain disabled'}
+    def get_cache_stats(self):
+        return self.read_cache.stats()
     
-    blockchain_handler = DummyBlockchainHandler()
\ No newline at end of file
+    def get_rpc_metrics(self):
+        metrics = getattr(self.w3.provider, 'metrics', None)
+        return metrics() if metrics else {'enabled': False, 'provider': str(self.w3.provider)}
+
+# Dummy handler for offline development
+class DummyBlockchainHandler:
+    offline = True
+    def record_allocation(self, *args, **kwargs):
+        return {
+            'success': True, 
+            'transaction_hash': '0x' + '0' * 64,
+            'verification_url': 'https://example.com',
+            'blockchain_disabled': True
+        }
+    def record_allocations_batch(self, allocations):
+        return {
+            'success': True,
+            'transaction_hash': '0x' + '0' * 64,
+            'verification_url': 'https://example.com',
+            'allocation_count': len(allocations),
+            'blockchain_disabled': True
+        }
+    def get_allocation(self, *args, **kwargs):
+        return {'success': False, 'error': 'Blockchain disabled'}
+    def get_allocation_count(self):
+        return {'success': True, 'count': 0}
+    def get_network_info(self):
+        return {'success': False, 'error': 'Blockchain disabled'}
+    def get_allocations(self, applicant_ids):
+        return {applicant_id: {'success': False, 'error': 'Blockchain disabled'} for applicant_id in applicant_ids}
+    def get_cache_stats(self):
+        return {'enabled': False}
+    def get_rpc_metrics(self):
+        return {'enabled': False}
+
+def create_blockchain_handler():
+    """Connect to the chain, or return the offline dummy handler if that fails"""
+    try:
+        return BlockchainHandler()
+    except Exception as e:
+        print(f"⚠️  Blockchain initialization failed: {e}")
+        print("⚠️  Running in offline mode - blockchain features disabled")
+        return DummyBlockchainHandler()
+
+# Global instance, created on first use so importing the package doesn't block on the RPC
+_handler = None
+_handler_lock = threading.Lock()
+
+def get_blockchain_handler():
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                _handler = create_blockchain_handler()
+    return _handler
+
+def __getattr__(name):
+    # Keeps `from blockchain import blockchain_handler` working (it connects on that import)
+    if name == 'blockchain_handler':
+        return get_blockchain_handler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
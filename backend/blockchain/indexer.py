@@ -0,0 +1,265 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from web3 import Web3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS allocations (
+    applicant_hash TEXT PRIMARY KEY,
+    applicant_id TEXT,
+    vulnerability_score REAL NOT NULL,
+    shelter_unit_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    recorded_by TEXT,
+    block_number INTEGER NOT NULL,
+    transaction_hash TEXT NOT NULL,
+    log_index INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_allocations_applicant ON allocations (applicant_id);
+CREATE INDEX IF NOT EXISTS idx_allocations_unit_time ON allocations (shelter_unit_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_allocations_unit_day ON allocations (shelter_unit_id, day);
+CREATE INDEX IF NOT EXISTS idx_allocations_time ON allocations (timestamp);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_block INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+COLUMNS = ['applicant_hash', 'applicant_id', 'vulnerability_score', 'shelter_unit_id', 'timestamp', 'day',
+           'recorded_by', 'block_number', 'transaction_hash', 'log_index']
+
+
+def utc_day(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class AllocationIndexer:
+    """
+    Tails AllocationRecorded events into a local SQLite table.
+
+    Blocks are scanned in fixed-size chunks up to `finality_depth` blocks
+    behind the head, so indexed rows never have to be rolled back after a
+    reorg. The last indexed block is checkpointed in the same transaction as
+    the rows, so a restart resumes exactly where it stopped. applicantId is an
+    indexed string in the event (only its hash is logged), so plain ids are
+    recovered by decoding the input of the emitting transaction.
+    """
+
+    def __init__(self,
+                 handler,
+                 db_path: str,
+                 chunk_blocks: int = 2000,
+                 poll_seconds: float = 15,
+                 start_block: Optional[int] = None):
+        self.handler = handler
+        self.db_path = db_path
+        self.chunk_blocks = chunk_blocks
+        self.poll_seconds = poll_seconds
+        self.start_block = start_block
+        self.finality_depth = handler.read_cache.finality_depth
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.head_block: Optional[int] = None
+        self.indexed_events = 0
+        self.last_error: Optional[str] = None
+
+    def checkpoint(self) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT last_block FROM checkpoint WHERE id = 1").fetchone()
+        return row['last_block'] if row else None
+
+    def _save_checkpoint(self, last_block: int):
+        """Record `last_block` as indexed (callers inside a transaction pass through the same connection)"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO checkpoint (id, last_block, updated_at) VALUES (1, ?, ?)",
+            (last_block, time.time())
+        )
+
+    def _applicant_ids(self, transaction_hashes) -> Dict[str, str]:
+        """Map applicant hash -> applicant id by decoding the emitting transactions"""
+        ids = {}
+        for txn_hash in transaction_hashes:
+            try:
+                txn = self.handler.w3.eth.get_transaction(txn_hash)
+                function, args = self.handler.contract.decode_function_input(txn['input'])
+            except Exception as e:
+                print(f"⚠️  Could not decode allocation transaction {txn_hash}: {e}")
+                continue
+            if function.fn_name == 'recordAllocationsBatch':
+                applicants = args['_applicantIds']
+            else:
+                applicants = [args.get('_applicantId')]
+            for applicant_id in applicants:
+                if applicant_id is not None:
+                    ids[Web3.to_hex(Web3.keccak(text=applicant_id))] = applicant_id
+        return ids
+
+    def index_range(self, from_block: int, to_block: int) -> int:
+        """Index one chunk of blocks and advance the checkpoint; returns the number of events stored"""
+        events = self.handler.contract.events.AllocationRecorded().get_logs(from_block=from_block, to_block=to_block)
+        applicant_ids = self._applicant_ids({Web3.to_hex(e['transactionHash']) for e in events})
+
+        rows = []
+        for event in events:
+            args = event['args']
+            applicant_hash = Web3.to_hex(args['applicantId'])
+            rows.append((
+                applicant_hash,
+                applicant_ids.get(applicant_hash),
+                float(args['vulnerabilityScore']) / 100.0,
+                args['shelterUnitId'],
+                args['timestamp'],
+                utc_day(args['timestamp']),
+                args.get('recordedBy'),
+                event['blockNumber'],
+                Web3.to_hex(event['transactionHash']),
+                event['logIndex']
+            ))
+
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO allocations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows
+            )
+            self._save_checkpoint(to_block)
+        self.indexed_events += len(rows)
+        return len(rows)
+
+    def sync(self) -> int:
+        """Index every finalized block after the checkpoint; returns the number of events stored"""
+        head = self.handler.w3.eth.block_number
+        self.head_block = head
+        safe_block = head - self.finality_depth
+
+        last_block = self.checkpoint()
+        if last_block is None:
+            # Without a configured start block only new allocations are indexed. The starting point is
+            # checkpointed right away, so later syncs scan forward from it instead of from the new head
+            last_block = (self.start_block - 1) if self.start_block is not None else max(safe_block, -1)
+            with self._lock, self._db:
+                self._save_checkpoint(last_block)
+
+        stored = 0
+        while last_block < safe_block:
+            to_block = min(last_block + self.chunk_blocks, safe_block)
+            stored += self.index_range(last_block + 1, to_block)
+            last_block = to_block
+        return stored
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️  Allocation indexer sync failed: {e}")
+            time.sleep(self.poll_seconds)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='allocation-indexer', daemon=True)
+            self._thread.start()
+
+    def _query(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def get_allocation(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT * FROM allocations WHERE applicant_hash = ?",
+            (Web3.to_hex(Web3.keccak(text=applicant_id)),)
+        )
+        if not rows:
+            return None
+        rows[0]['applicant_id'] = applicant_id
+        return rows[0]
+
+    def find_allocations(self,
+                         shelter_unit_id: Optional[str] = None,
+                         start_time: Optional[int] = None,
+                         end_time: Optional[int] = None,
+                         limit: int = 100,
+                         offset: int = 0) -> List[Dict[str, Any]]:
+        """Allocations filtered by shelter unit and [start_time, end_time), newest first"""
+        clauses, params = [], []
+        if shelter_unit_id is not None:
+            clauses.append("shelter_unit_id = ?")
+            params.append(shelter_unit_id)
+        if start_time is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start_time)
+        if end_time is not None:
+            clauses.append("timestamp < ?")
+            params.append(end_time)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(
+            f"SELECT * FROM allocations {where} ORDER BY timestamp DESC, log_index DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        )
+
+    def daily_counts(self,
+                     shelter_unit_id: Optional[str] = None,
+                     start_day: Optional[str] = None,
+                     end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Allocations per shelter unit per UTC day (days are inclusive YYYY-MM-DD bounds)"""
+        clauses, params = [], []
+        if shelter_unit_id is not None:
+            clauses.append("shelter_unit_id = ?")
+            params.append(shelter_unit_id)
+        if start_day is not None:
+            clauses.append("day >= ?")
+            params.append(start_day)
+        if end_day is not None:
+            clauses.append("day <= ?")
+            params.append(end_day)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(
+            f"""SELECT shelter_unit_id, day, COUNT(*) AS allocations,
+                       ROUND(AVG(vulnerability_score), 2) AS avg_vulnerability_score
+                FROM allocations {where}
+                GROUP BY shelter_unit_id, day
+                ORDER BY day, shelter_unit_id""",
+            params
+        )
+
+    def status(self) -> Dict[str, Any]:
+        total = self._query("SELECT COUNT(*) AS n FROM allocations")[0]['n']
+        last_block = self.checkpoint()
+        return {
+            "db_path": self.db_path,
+            "indexed_allocations": total,
+            "last_indexed_block": last_block,
+            "head_block": self.head_block,
+            "lag_blocks": (self.head_block - last_block) if self.head_block is not None and last_block is not None else None,
+            "finality_depth": self.finality_depth,
+            "chunk_blocks": self.chunk_blocks,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_error": self.last_error
+        }
+
+
+def indexer_from_env(handler) -> AllocationIndexer:
+    """Create an AllocationIndexer using the BLOCKCHAIN_INDEXER_* environment settings"""
+    start_block = os.getenv("BLOCKCHAIN_INDEXER_START_BLOCK")
+    return AllocationIndexer(
+        handler,
+        db_path=os.getenv("BLOCKCHAIN_INDEXER_DB", "data/allocations_index.db"),
+        chunk_blocks=int(os.getenv("BLOCKCHAIN_INDEXER_CHUNK_BLOCKS", "2000")),
+        poll_seconds=float(os.getenv("BLOCKCHAIN_INDEXER_POLL_SECONDS", "15")),
+        start_block=int(start_block) if start_block else None
+    )
@@ -0,0 +1,250 @@
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+
+class NonceManager:
+    """
+    Hands out account nonces locally instead of asking the node per transaction.
+
+    The first reservation (and every resync) reads the account's pending
+    transaction count; after that nonces are incremented in memory, so
+    concurrent submissions never reuse one.
+
+    With a state backend the counter lives there instead (`incr`), so worker
+    processes signing with the same account never reserve the same nonce.
+    A failed nonce the node never took goes to a shared pool that the next
+    reservation takes from, so it leaves no gap. Nonces lost without a
+    failure (a crash between reserving and sending, or a counter that outlived
+    a restarted dev chain) are recovered on resync: once no process has
+    reserved anything for `lost_after_seconds` the counter goes back to the
+    node's pending nonce, and under steady load a pending nonce that stays
+    stuck that long is put in the pool.
+    """
+
+    def __init__(self, fetch_nonce: Callable[[], int], backend=None, account: str = "", lost_after_seconds: float = 30):
+        self._fetch_nonce = fetch_nonce
+        self._lock = threading.Lock()
+        self._next: Optional[int] = None
+        self.lost_after_seconds = lost_after_seconds
+
+        self._backend = backend
+        self._account = account
+        self._counter = f"nonce:{account}"
+        # Shared bookkeeping counters: pool size, last reservation time, the pool/reset lock and the stuck-nonce watch
+        self._released_count = f"nonce_released:{account}"
+        self._reserved_at = f"nonce_reserved_at:{account}"
+        self._pool_lock = f"nonce_lock:{account}"
+        self._stuck = f"nonce_stuck:{account}"
+        self._stuck_since = f"nonce_stuck_since:{account}"
+        self._released = backend.collection("released_nonces").create_index("account") if backend is not None else None
+
+        self.reserved = 0
+        self.resyncs = 0
+        self.reused = 0
+        self.resets = 0
+        self.recovered = 0
+
+    @property
+    def shared(self) -> bool:
+        return self._backend is not None
+
+    def reserve(self) -> int:
+        with self._lock:
+            if self.shared:
+                return self._reserve_shared()
+            if self._next is None:
+                self._next = self._fetch_nonce()
+                self.resyncs += 1
+            nonce = self._next
+            self._next += 1
+            self.reserved += 1
+            return nonce
+
+    def _reserve_shared(self) -> int:
+        if self._next is None:
+            self._resync_shared()
+            self.resyncs += 1
+        # Stamped before the nonce is taken, so a resync that could miss this reservation sees it as recent
+        self._backend.raise_counter(self._reserved_at, _now_ms())
+        nonce = self._take_released() if self._backend.counter(self._released_count) > 0 else None
+        if nonce is None:
+            nonce = self._backend.incr(self._counter) - 1
+        self._next = nonce + 1
+        self.reserved += 1
+        return nonce
+
+    def _take_released(self) -> Optional[int]:
+        with self._pool():
+            for record in sorted(self._released.find("account", self._account), key=lambda r: r["nonce"]):
+                if self._drop_released(record["nonce"]):
+                    self.reused += 1
+                    return record["nonce"]
+        return None
+
+    def _pool_key(self, nonce: int) -> str:
+        return f"{self._account}:{nonce}"
+
+    def _put_released(self, nonce: int):
+        if self._pool_key(nonce) not in self._released:
+            self._released.put(self._pool_key(nonce), {"account": self._account, "nonce": nonce})
+            self._backend.incr(self._released_count)
+
+    def _drop_released(self, nonce: int) -> bool:
+        if self._released.delete(self._pool_key(nonce)):
+            self._backend.incr(self._released_count, -1)
+            return True
+        return False
+
+    @contextmanager
+    def _pool(self, ttl_seconds: float = 10):
+        """
+        Cross-process lock around the released pool and counter resets. The
+        lock counter holds the holder's expiry time (ms), so a crashed holder
+        only blocks the others until then.
+        """
+        while True:
+            held, now = self._backend.counter(self._pool_lock), _now_ms()
+            expires = now + int(ttl_seconds * 1000)
+            if held < now and self._backend.compare_and_set(self._pool_lock, held, expires):
+                break
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self._backend.compare_and_set(self._pool_lock, expires, 0)
+
+    def failed(self, nonce: int):
+        """A send at `nonce` failed: recover the nonce if the node never took it"""
+        if not self.shared:
+            self.resync()
+            return
+        with self._lock:
+            self.resyncs += 1
+            try:
+                self._resync_shared(released=nonce)
+            except Exception as e:
+                print(f"⚠️  Nonce resync failed: {e}")
+                with self._pool():
+                    self._put_released(nonce)
+
+    def resync(self) -> Optional[int]:
+        """Re-read the nonce from the node (after a failed send or a dropped transaction)"""
+        with self._lock:
+            self.resyncs += 1
+            try:
+                self._next = self._resync_shared() if self.shared else self._fetch_nonce()
+            except Exception as e:
+                # Leave it unset so the next reservation tries again
+                print(f"⚠️  Nonce resync failed: {e}")
+                self._next = None
+            return self._next
+
+    def _resync_shared(self, released: Optional[int] = None) -> int:
+        pending = self._fetch_nonce()
+        with self._pool():
+            current = self._backend.raise_counter(self._counter, pending)
+            # Below pending the node already has the nonce; at or past the counter `incr` hands it out again
+            for record in self._released.find("account", self._account):
+                if not pending <= record["nonce"] < current:
+                    self._drop_released(record["nonce"])
+            if released is not None and pending <= released < current:
+                self._put_released(released)
+
+            if current > pending and self._backend.counter(self._released_count) == 0:
+                # Nonces in [pending, current) were reserved but the node is missing the first one, and no
+                # failed send accounts for it
+                quiet = self._backend.counter(self._reserved_at) < _now_ms() - self.lost_after_seconds * 1000
+                # A reservation racing with the reset moves the counter first, so the reset loses the compare
+                if quiet and self._backend.compare_and_set(self._counter, current, pending):
+                    print(f"⚠️  Nonce counter was {current} but the node expects {pending}, resetting")
+                    self.resets += 1
+                    current = pending
+                elif self._stuck_for(pending) > self.lost_after_seconds:
+                    # Later transactions are queued behind it, so only the missing nonce is sent again
+                    print(f"⚠️  Nonce {pending} was reserved but never reached the node, reusing it")
+                    self._put_released(pending)
+                    self.recovered += 1
+        self._next = current
+        return current
+
+    def _stuck_for(self, pending: int) -> float:
+        """Seconds the node has reported `pending` (as seen by resyncs from any process)"""
+        seen = self._backend.counter(self._stuck)
+        if seen != pending + 1:
+            # Stored off by one, so 0 still means "nothing watched yet"
+            self._backend.compare_and_set(self._stuck, seen, pending + 1)
+            self._backend.compare_and_set(self._stuck_since, self._backend.counter(self._stuck_since), _now_ms())
+            return 0
+        return (_now_ms() - self._backend.counter(self._stuck_since)) / 1000
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "next_nonce": self._next,
+            "reserved": self.reserved,
+            "resyncs": self.resyncs,
+            "shared": self.shared,
+            "reused": self.reused,
+            "resets": self.resets,
+            "recovered": self.recovered
+        }
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class TransactionQueue:
+    """
+    Single submitter thread that runs sign-and-send jobs in FIFO order.
+
+    Callers from any thread enqueue a job and wait on its future, so nonce
+    reservation and broadcast happen in exactly the order nonces are handed out.
+    """
+
+    def __init__(self, name: str = "tx-submitter"):
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.sent = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(job())
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                future.set_exception(e)
+
+    def submit(self, job: Callable[[], Any]) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def run(self, job: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Enqueue a job and block until the submitter thread has run it"""
+        return self.submit(job).result(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "errors": self.errors
+        }
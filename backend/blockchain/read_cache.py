@@ -0,0 +1,138 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+from web3 import Web3
+
+
+def applicant_key(applicant_id: str) -> str:
+    """Cache key for an applicant: the keccak hash AllocationRecorded carries as its indexed topic"""
+    return Web3.to_hex(Web3.keccak(text=applicant_id))
+
+
+class AllocationReadCache:
+    """
+    Local copy of on-chain allocations keyed by applicant hash.
+
+    Entries come from contract reads, our own confirmed writes and
+    AllocationRecorded logs. Allocations are immutable once written, so an
+    entry is kept for good once its block is `finality_depth` blocks deep and
+    its block hash still matches; an entry whose block was reorged away is
+    dropped and read through again. "Not found" answers are cached briefly and
+    are overwritten by any later write or event.
+    """
+
+    def __init__(self, finality_depth: int = 16, block_time_seconds: float = 2.0, negative_ttl_seconds: float = 10):
+        self.finality_depth = finality_depth
+        # Contract reads carry no block, so their age is judged from the allocation timestamp instead
+        self.finality_seconds = finality_depth * block_time_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._missing: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.reorg_evictions = 0
+
+    def get(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        """Cached get_allocation result, or None when the caller has to read through"""
+        key = applicant_key(applicant_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                data = dict(entry["data"], applicant_id=applicant_id)
+                return {'success': True, 'data': data, 'cached': True, 'finalized': entry["finalized"]}
+
+            expires_at = self._missing.get(key)
+            if expires_at is not None:
+                if expires_at > time.time():
+                    self.negative_hits += 1
+                    return {'success': False, 'error': 'Failed to get allocation: Allocation not found', 'cached': True}
+                del self._missing[key]
+
+            self.misses += 1
+            return None
+
+    def put(self,
+            key: str,
+            data: Dict[str, Any],
+            block_number: Optional[int] = None,
+            block_hash: Optional[str] = None):
+        """Store an allocation; entries without a block are already known to be final"""
+        with self._lock:
+            self._missing.pop(key, None)
+            self._entries[key] = {
+                "data": data,
+                "block_number": block_number,
+                "block_hash": block_hash,
+                "finalized": block_number is None
+            }
+
+    def put_missing(self, applicant_id: str):
+        with self._lock:
+            self._missing[applicant_key(applicant_id)] = time.time() + self.negative_ttl_seconds
+
+    def put_events(self, events: Iterable[Any]) -> int:
+        """Store decoded AllocationRecorded events; returns how many were added"""
+        added = 0
+        for event in events:
+            args = event['args']
+            self.put(
+                Web3.to_hex(args['applicantId']),
+                {
+                    'applicant_id': None,
+                    'vulnerability_score': float(args['vulnerabilityScore']) / 100.0,
+                    'shelter_unit_id': args['shelterUnitId'],
+                    'timestamp': args['timestamp'],
+                    'is_approved': True
+                },
+                block_number=event['blockNumber'],
+                block_hash=Web3.to_hex(event['blockHash'])
+            )
+            added += 1
+        return added
+
+    def check_finality(self, latest_block: int, block_hash_at: Callable[[int], str]):
+        """
+        Settle entries that are now `finality_depth` deep: keep them for good if
+        their block is still canonical, drop them otherwise.
+        """
+        with self._lock:
+            settling = [
+                (key, entry) for key, entry in self._entries.items()
+                if not entry["finalized"] and entry["block_number"] <= latest_block - self.finality_depth
+            ]
+        if not settling:
+            return
+
+        canonical = {}
+        for block_number in {entry["block_number"] for _, entry in settling}:
+            canonical[block_number] = block_hash_at(block_number)
+
+        with self._lock:
+            for key, entry in settling:
+                if self._entries.get(key) is not entry:
+                    continue
+                if canonical[entry["block_number"]] == entry["block_hash"]:
+                    entry["finalized"] = True
+                else:
+                    del self._entries[key]
+                    self.reorg_evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "unfinalized": sum(1 for e in self._entries.values() if not e["finalized"]),
+                "negative_entries": len(self._missing),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0,
+                "reorg_evictions": self.reorg_evictions,
+                "finality_depth": self.finality_depth,
+                "finality_seconds": self.finality_seconds
+            }
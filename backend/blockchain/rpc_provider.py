@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+
+# Re-sending a raw transaction after an ambiguous failure can double-submit; only
+# failures that prove the request never left (connect errors) are retried for these
+NON_IDEMPOTENT_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 512
+
+
+class RPCUnavailable(ConnectionError):
+    pass
+
+
+class MethodLatency:
+    """Call count, error count and recent latency samples for one RPC method"""
+
+    __slots__ = ('calls', 'errors', 'retries', 'total_ms', 'max_ms', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, elapsed_ms: float, error: bool):
+        self.calls += 1
+        self.errors += int(error)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2) if ordered else 0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0,
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "max_ms": round(self.max_ms, 2)
+        }
+
+
+class PooledRPCProvider(JSONBaseProvider):
+    """
+    JSON-RPC over HTTP with pooled keep-alive sessions, retries and failover.
+
+    Each endpoint gets one requests.Session whose connection pool is shared by
+    every thread, so calls reuse warm TCP/TLS connections. A failed call is
+    retried with exponential backoff and then moved to the next endpoint; the
+    endpoint that answered last becomes the preferred one. Latency is recorded
+    per RPC method (a batch counts as one "batch" call).
+    """
+
+    def __init__(self,
+                 endpoint_uris: Sequence[str],
+                 timeout: float = 10,
+                 retries: int = 2,
+                 backoff_seconds: float = 0.25,
+                 pool_size: int = 20,
+                 connected_check_seconds: float = 30):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoint_uris = list(endpoint_uris)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.connected_check_seconds = connected_check_seconds
+
+        self._sessions = {}
+        for uri in self.endpoint_uris:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            self._sessions[uri] = session
+
+        self._active = 0
+        self._lock = threading.Lock()
+        self._latency: Dict[str, MethodLatency] = {}
+        self._endpoint_failures = {uri: 0 for uri in self.endpoint_uris}
+        self.failovers = 0
+        self._connected_at: Optional[float] = None
+
+    def __str__(self):
+        return f"Pooled RPC connection {self.endpoint_uri}"
+
+    @property
+    def endpoint_uri(self) -> str:
+        return self.endpoint_uris[self._active]
+
+    def _latency_for(self, method: str) -> MethodLatency:
+        with self._lock:
+            stats = self._latency.get(method)
+            if stats is None:
+                stats = self._latency[method] = MethodLatency()
+            return stats
+
+    def _post(self, uri: str, body: bytes) -> bytes:
+        response = self._sessions[uri].post(uri, data=body, timeout=self.timeout)
+        if response.status_code in RETRY_STATUS_CODES:
+            raise requests.HTTPError(f"{response.status_code} from {uri}", response=response)
+        response.raise_for_status()
+        return response.content
+
+    def _send(self, method: str, body: bytes) -> bytes:
+        """POST `body`, retrying with backoff and failing over across endpoints"""
+        stats = self._latency_for(method)
+        idempotent = method not in NON_IDEMPOTENT_METHODS
+        start_index = self._active
+        last_error: Optional[Exception] = None
+        started = time.perf_counter()
+
+        for offset in range(len(self.endpoint_uris)):
+            index = (start_index + offset) % len(self.endpoint_uris)
+            uri = self.endpoint_uris[index]
+            for attempt in range(self.retries + 1):
+                try:
+                    content = self._post(uri, body)
+                    if index != self._active:
+                        self._active = index
+                        self.failovers += 1
+                        print(f"⚠️  RPC failover to {uri}")
+                    stats.record((time.perf_counter() - started) * 1000, error=False)
+                    return content
+                except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                    last_error = e
+                    self._endpoint_failures[uri] += 1
+                    if not idempotent and not isinstance(e, requests.ConnectTimeout):
+                        stats.record((time.perf_counter() - started) * 1000, error=True)
+                        raise
+                    if attempt < self.retries:
+                        stats.retries += 1
+                        time.sleep(self.backoff_seconds * (2 ** attempt))
+
+        stats.record((time.perf_counter() - started) * 1000, error=True)
+        raise RPCUnavailable(f"All RPC endpoints failed for {method}: {last_error}")
+
+    def make_request(self, method, params):
+        body = self.encode_rpc_request(method, params)
+        return self.decode_rpc_response(self._send(method, body))
+
+    def make_batch_request(self, batch_requests: List[Tuple[Any, Any]]):
+        """Send several calls in one JSON-RPC batch; responses come back in request order"""
+        body = self.encode_batch_rpc_request(batch_requests)
+        responses = self.decode_rpc_response(self._send("batch", body))
+        if isinstance(responses, dict):
+            # Some nodes answer a rejected batch with a single error object
+            raise RPCUnavailable(f"Batch request rejected: {responses.get('error')}")
+        return sorted(responses, key=lambda response: response.get('id', 0))
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        # A recent successful check is good enough; avoids a round trip per call site
+        if self._connected_at is not None and time.time() - self._connected_at < self.connected_check_seconds:
+            return True
+        connected = super().is_connected(show_traceback)
+        self._connected_at = time.time() if connected else None
+        return connected
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {method: stats.summary() for method, stats in sorted(self._latency.items())}
+        return {
+            "active_endpoint": self.endpoint_uri,
+            "endpoints": self.endpoint_uris,
+            "endpoint_failures": dict(self._endpoint_failures),
+            "failovers": self.failovers,
+            "timeout_seconds": self.timeout,
+            "retries": self.retries,
+            "methods": methods
+        }
+
+
+def provider_from_env(default_url: str) -> PooledRPCProvider:
+    """Create a PooledRPCProvider from BLOCKCHAIN_RPC_URL (comma-separated for failover) and BLOCKCHAIN_RPC_* settings"""
+    urls = [url.strip() for url in os.getenv('BLOCKCHAIN_RPC_URL', default_url).split(',') if url.strip()]
+    return PooledRPCProvider(
+        urls,
+        timeout=float(os.getenv('BLOCKCHAIN_RPC_TIMEOUT_SECONDS', '10')),
+        retries=int(os.getenv('BLOCKCHAIN_RPC_RETRIES', '2')),
+        backoff_seconds=float(os.getenv('BLOCKCHAIN_RPC_BACKOFF_SECONDS', '0.25')),
+        pool_size=int(os.getenv('BLOCKCHAIN_RPC_POOL_SIZE', '20'))
+    )
@@ -0,0 +1,331 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Job lifecycle: pending -> submitted -> confirmed | failed
+PENDING = "pending"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+class AllocationWritePipeline:
+    """
+    Background writer for allocation transactions.
+
+    Requests enqueue a job and return straight away. A submit worker groups
+    queued jobs into recordAllocationsBatch transactions, flushing when the
+    batch is full or its oldest job reaches the age limit, and hands them to the
+    handler's nonce-managed submission queue. A single receipt tracker polls
+    every outstanding transaction each tick, so neither nonce lookups nor
+    receipt waits run on the request path. Blocking web3 calls go to the
+    default executor to keep the event loop free.
+
+    A reverted batch is split back into individual writes, so one bad
+    allocation (e.g. an applicant that is already recorded) fails on its own.
+
+    With a `job_store` (a state backend collection) every job state change is
+    written through, so any worker process can answer status lookups, by job
+    or by applicant. Those writes run in order on a dedicated thread, so a
+    contended SQLite write never stalls the event loop.
+    """
+
+    def __init__(self,
+                 handler,
+                 receipt_poll_seconds: float = 2.0,
+                 receipt_timeout_seconds: float = 120,
+                 max_batch_size: int = 20,
+                 max_batch_age_seconds: float = 2.0,
+                 max_jobs: int = 10000,
+                 max_resubmits: int = 3,
+                 job_store=None):
+        self.handler = handler
+        self.receipt_poll_seconds = receipt_poll_seconds
+        self.receipt_timeout_seconds = receipt_timeout_seconds
+        self.max_batch_size = max_batch_size
+        self.max_batch_age_seconds = max_batch_age_seconds
+        self.max_jobs = max_jobs
+        self.max_resubmits = max_resubmits
+        self.job_store = job_store.create_index("applicant_id") if job_store is not None else None
+        self._store_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store") if job_store is not None else None
+
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._latest_by_applicant: Dict[str, str] = {}
+        # transaction hash -> submission {jobs, nonce, submitted_at, retries}
+        self._outstanding: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        self.submitted = 0
+        self.transactions = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batch_fallbacks = 0
+
+    def _ensure_started(self):
+        # Workers are bound to the running loop, so they start with the first job. Only a worker
+        # that has stopped is restarted, so there is never more than one of each on the queue
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        for name, worker in (("submit", self._submit_worker), ("receipt", self._receipt_worker)):
+            task = self._workers.get(name)
+            if task is None or task.done():
+                self._workers[name] = loop.create_task(worker())
+
+    def enqueue(self, applicant_id: str, vulnerability_score: float, shelter_unit_id: str) -> Dict[str, Any]:
+        """Queue an allocation write and return its job record (status "pending")"""
+        self._ensure_started()
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "applicant_id": applicant_id,
+            "vulnerability_score": vulnerability_score,
+            "shelter_unit_id": shelter_unit_id,
+            "status": PENDING,
+            "created_at": time.time(),
+            "transaction_hash": None,
+            "nonce": None,
+            "batch_size": None,
+            "result": None,
+            "error": None
+        }
+        self.jobs[job["job_id"]] = job
+        self._latest_by_applicant[applicant_id] = job["job_id"]
+        self._publish(job)
+        self._trim()
+        self._queue.put_nowait(("job", job))
+        return job
+
+    def _trim(self):
+        # Forget the oldest finished jobs once the table is full
+        while len(self.jobs) > self.max_jobs:
+            job_id, job = next(iter(self.jobs.items()))
+            if job["status"] in (PENDING, SUBMITTED):
+                break
+            self.jobs.popitem(last=False)
+            if self.job_store is not None:
+                self._store_write(self.job_store.delete, job_id)
+            if self._latest_by_applicant.get(job["applicant_id"]) == job_id:
+                del self._latest_by_applicant[job["applicant_id"]]
+
+    async def _next_batch(self, first: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, Dict[str, Any]]]]:
+        """
+        Collect jobs behind `first` until the batch is full or `first` is too old.
+        Returns the batch and, if a retry item was pulled off the queue meanwhile, that item.
+        """
+        batch = [first]
+        deadline = first["created_at"] + self.max_batch_age_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining <= 0:
+                    kind, item = self._queue.get_nowait()
+                else:
+                    kind, item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            self._queue.task_done()
+            if kind != "job":
+                return batch, (kind, item)
+            batch.append(item)
+        return batch, None
+
+    async def _submit_worker(self):
+        while True:
+            kind, item = await self._queue.get()
+            self._queue.task_done()
+
+            carried = None
+            if kind == "job":
+                jobs, carried = await self._next_batch(item)
+                await self._submit({"jobs": jobs, "retries": 0})
+            else:
+                # Retries are sent as they are: a dropped submission at its old nonce, a split batch one by one
+                await self._submit(item)
+
+            if carried is not None:
+                await self._submit(carried[1])
+
+    async def _submit(self, submission: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        jobs = submission["jobs"]
+        replace_nonce = submission.get("replace_nonce")
+        try:
+            if len(jobs) == 1:
+                job = jobs[0]
+                txn_hash, nonce = await loop.run_in_executor(
+                    None, self.handler.submit_allocation,
+                    job["applicant_id"], job["vulnerability_score"], job["shelter_unit_id"], replace_nonce
+                )
+            else:
+                allocations = [
+                    {k: job[k] for k in ("applicant_id", "vulnerability_score", "shelter_unit_id")}
+                    for job in jobs
+                ]
+                txn_hash, nonce = await loop.run_in_executor(
+                    None, self.handler.submit_allocations_batch, allocations, replace_nonce
+                )
+        except Exception as e:
+            for job in jobs:
+                self._finish(job, FAILED, error=f"Blockchain error: {str(e)}")
+            print(f"⚠️  Allocation write failed for {len(jobs)} job(s): {e}")
+            return
+
+        now = time.time()
+        submission.update(nonce=nonce, submitted_at=now)
+        self._outstanding[txn_hash] = submission
+        for job in jobs:
+            job.update(status=SUBMITTED, transaction_hash=txn_hash, nonce=nonce, batch_size=len(jobs), submitted_at=now)
+            self._publish(job)
+        self.submitted += len(jobs)
+        self.transactions += 1
+
+    async def _receipt_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.receipt_poll_seconds)
+            if not self._outstanding:
+                continue
+
+            pending = list(self._outstanding.items())
+            receipts = await asyncio.gather(
+                *(loop.run_in_executor(None, self.handler.get_receipt, txn_hash) for txn_hash, _ in pending),
+                return_exceptions=True
+            )
+            now = time.time()
+            for (txn_hash, submission), receipt in zip(pending, receipts):
+                if isinstance(receipt, Exception) or receipt is None:
+                    if now - submission["submitted_at"] > self.receipt_timeout_seconds:
+                        await self._handle_timeout(txn_hash, submission)
+                    continue
+
+                del self._outstanding[txn_hash]
+                try:
+                    result = self.handler.allocation_result(txn_hash, receipt)
+                    if not result["success"] and len(submission["jobs"]) > 1:
+                        self._split(submission)
+                        continue
+                    for job in submission["jobs"]:
+                        self._finish(job, CONFIRMED if result["success"] else FAILED, result=result, error=result.get("error"))
+                except Exception as e:
+                    # One unreadable receipt must not stop tracking of every other transaction
+                    print(f"⚠️  Could not process receipt for {txn_hash}: {e}")
+                    for job in submission["jobs"]:
+                        if job["status"] == SUBMITTED:
+                            self._finish(job, FAILED, error=f"Receipt processing error: {str(e)}")
+
+    def _split(self, submission: Dict[str, Any]):
+        # The whole batch reverted; resend each allocation on its own so only the offenders fail
+        self.batch_fallbacks += 1
+        print(f"⚠️  Batch of {len(submission['jobs'])} allocations reverted, retrying individually")
+        for job in submission["jobs"]:
+            job.update(status=PENDING, transaction_hash=None, nonce=None, batch_size=None)
+            self._publish(job)
+            self._queue.put_nowait(("retry", {"jobs": [job], "retries": 0}))
+
+    async def _handle_timeout(self, txn_hash: str, submission: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        try:
+            known = await loop.run_in_executor(None, self.handler.transaction_known, txn_hash)
+        except Exception:
+            known = True
+
+        del self._outstanding[txn_hash]
+        if known:
+            # Still in the mempool but not mined: usually queued behind a nonce that was never sent
+            try:
+                await loop.run_in_executor(None, self.handler.resync_nonces)
+            except Exception as e:
+                print(f"⚠️  Nonce resync after timeout failed: {e}")
+        if known or submission["retries"] >= self.max_resubmits:
+            for job in submission["jobs"]:
+                self._finish(job, FAILED, error="Transaction confirmation timeout")
+            return
+
+        # Dropped from the mempool: later nonces are stuck behind the gap, so re-send at the same nonce
+        print(f"⚠️  Transaction {txn_hash} was dropped, re-sending at nonce {submission['nonce']}")
+        self.dropped += 1
+        for job in submission["jobs"]:
+            job.update(status=PENDING)
+            self._publish(job)
+        self._queue.put_nowait(("retry", {
+            "jobs": submission["jobs"],
+            "replace_nonce": submission["nonce"],
+            "retries": submission["retries"] + 1
+        }))
+
+    def _finish(self, job: Dict[str, Any], status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        job.update(status=status, result=result, error=error, finished_at=time.time())
+        self._publish(job)
+        if status == CONFIRMED:
+            self.confirmed += 1
+        else:
+            self.failed += 1
+
+    def _publish(self, job: Dict[str, Any]):
+        if self.job_store is not None:
+            self._store_write(self.job_store.put, job["job_id"], dict(job))
+
+    def _store_write(self, write, *args):
+        def run():
+            try:
+                write(*args)
+            except Exception as e:
+                print(f"⚠️  Job store write failed: {e}")
+        self._store_writer.submit(run)
+
+    def flush(self):
+        """Block until every job state change queued so far is in the job store"""
+        if self._store_writer is not None:
+            self._store_writer.submit(lambda: None).result()
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        # Queued by another worker process
+        return self.job_store.get(job_id) if self.job_store is not None else None
+
+    def status_for_applicant(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        job_id = self._latest_by_applicant.get(applicant_id)
+        jobs = [self.status(job_id)] if job_id is not None else []
+        if self.job_store is not None:
+            # The latest job may have been queued by another worker process (ours may not be written yet)
+            jobs += self.job_store.find("applicant_id", applicant_id)
+        return max(jobs, key=lambda job: job["created_at"]) if jobs else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "awaiting_receipt": sum(len(s["jobs"]) for s in self._outstanding.values()),
+            "submitted": self.submitted,
+            "transactions": self.transactions,
+            "avg_batch_size": round(self.submitted / self.transactions, 2) if self.transactions else 0,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "dropped_resubmitted": self.dropped,
+            "batch_fallbacks": self.batch_fallbacks,
+            "tracked_jobs": len(self.jobs),
+            "max_batch_size": self.max_batch_size,
+            "max_batch_age_seconds": self.max_batch_age_seconds,
+            "submission": self.handler.get_submission_stats(),
+            "workers_running": len(self._workers) == 2 and not any(w.done() for w in self._workers.values())
+        }
+
+
+def pipeline_from_env(handler, job_store=None) -> AllocationWritePipeline:
+    """Create an AllocationWritePipeline using the BLOCKCHAIN_RECEIPT_* / BLOCKCHAIN_BATCH_* environment settings"""
+    return AllocationWritePipeline(
+        handler,
+        receipt_poll_seconds=float(os.getenv("BLOCKCHAIN_RECEIPT_POLL_SECONDS", "2")),
+        receipt_timeout_seconds=float(os.getenv("BLOCKCHAIN_RECEIPT_TIMEOUT_SECONDS", "120")),
+        max_batch_size=int(os.getenv("BLOCKCHAIN_BATCH_MAX_SIZE", "20")),
+        max_batch_age_seconds=float(os.getenv("BLOCKCHAIN_BATCH_MAX_AGE_SECONDS", "2")),
+        job_store=job_store
+    )
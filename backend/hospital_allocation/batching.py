@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Tuple
+
+# Upper bounds (in requests per batch) of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class MicroBatcher:
+    """
+    Async micro-batcher in front of a model's predict().
+
+    Concurrent callers are collected for up to `max_wait_ms` (or until
+    `max_rows` rows are pending), their frames are stacked into a single
+    matrix for one predict() call, and each caller gets back its own slice
+    of the predictions.
+    """
+
+    def __init__(self,
+                 name: str,
+                 get_model: Callable[[], Any],
+                 max_wait_ms: float = 3.0,
+                 max_rows: int = 8192):
+        self.name = name
+        self.get_model = get_model
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_rows = max_rows
+
+        self._pending: List[Tuple[pd.DataFrame, asyncio.Future, float]] = []
+        self._pending_rows = 0
+        self._loop = None
+        self._worker = None
+        self._wakeup = None
+        self._full = None
+
+        # Metrics
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.batch_size_histogram = {str(b): 0 for b in BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram['+Inf'] = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.predict_ms_total = 0.0
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop):
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """Queue X for the next batch and wait for its predictions"""
+        if len(X) == 0:
+            return np.empty(0)
+
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+
+        future = loop.create_future()
+        self._pending.append((X, future, time.perf_counter()))
+        self._pending_rows += len(X)
+        if self._pending_rows >= self.max_rows:
+            self._full.set()
+        self._wakeup.set()
+
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+
+            # Hold the window open for more callers unless the batch fills up first
+            if self._pending_rows < self.max_rows:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch, self._pending, self._pending_rows = self._pending, [], 0
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[pd.DataFrame, asyncio.Future, float]]):
+        started = time.perf_counter()
+        frames = [X for X, _, _ in batch]
+        sizes = [len(X) for X in frames]
+
+        for _, _, enqueued_at in batch:
+            waited_ms = (started - enqueued_at) * 1000
+            self.wait_ms_total += waited_ms
+            self.wait_ms_max = max(self.wait_ms_max, waited_ms)
+        self._record_batch(len(batch), sum(sizes))
+
+        try:
+            stacked = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            loop = asyncio.get_running_loop()
+            predictions = await loop.run_in_executor(None, self.get_model().predict, stacked)
+            results = np.split(np.asarray(predictions), np.cumsum(sizes)[:-1])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.predict_ms_total += (time.perf_counter() - started) * 1000
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record_batch(self, request_count: int, row_count: int):
+        self.batches += 1
+        self.requests += request_count
+        self.rows += row_count
+        for bucket in BATCH_SIZE_BUCKETS:
+            if request_count <= bucket:
+                self.batch_size_histogram[str(bucket)] += 1
+                break
+        else:
+            self.batch_size_histogram['+Inf'] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, batch size histogram and added wait time"""
+        return {
+            "queue_depth": len(self._pending),
+            "queued_rows": self._pending_rows,
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0,
+            "batch_size_histogram": dict(self.batch_size_histogram),
+            "avg_wait_ms": round(self.wait_ms_total / self.requests, 3) if self.requests else 0,
+            "max_wait_ms": round(self.wait_ms_max, 3),
+            "avg_predict_ms": round(self.predict_ms_total / self.batches, 3) if self.batches else 0,
+            "window_ms": self.max_wait * 1000,
+            "max_rows": self.max_rows
+        }
+
+
+def batcher_from_env(name: str, get_model: Callable[[], Any]) -> MicroBatcher:
+    """Create a MicroBatcher using the INFERENCE_BATCH_* environment settings"""
+    return MicroBatcher(
+        name,
+        get_model,
+        max_wait_ms=float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "3")),
+        max_rows=int(os.getenv("INFERENCE_BATCH_MAX_ROWS", "8192"))
+    )
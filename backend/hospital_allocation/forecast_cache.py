@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+import numpy as np
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+
+class OccupancyForecastCache:
+    """
+    Next-day occupancy forecasts (gbm output) keyed by hospital and day.
+
+    The forecast only depends on hospital state and the day, so it is computed
+    once per hospital per day and reused by every patient request until it
+    expires or the hospital is updated. Entries are stored in arrays aligned
+    with the infra rows so a lookup for thousands of candidates is a handful of
+    vector operations.
+
+    Each row also has a generation that `invalidate`/`clear` bump. `lookup`
+    returns the generations it saw and `store` skips rows whose generation
+    moved since, so a forecast computed from state that was updated while the
+    model ran is not cached.
+    """
+
+    def __init__(self, hospital_ids: Sequence[str], ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.positions = {str(hospital_id): pos for pos, hospital_id in enumerate(hospital_ids)}
+        size = len(self.positions)
+        self.values = np.zeros(size)
+        self.days = np.full(size, -1, dtype=np.int64)
+        self.expires_at = np.zeros(size)
+        self.generations = np.zeros(size, dtype=np.int64)
+        # Updated from the event loop and from threadpool feed syncs
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    def lookup(self, positions: np.ndarray, day: int, now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return cached forecasts for the given rows, a boolean mask of the rows
+        that missed and the rows' generations (to pass back to `store`)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            missing = (self.days[positions] != day) | (self.expires_at[positions] <= now)
+            values, generations = self.values[positions].copy(), self.generations[positions].copy()
+
+            miss_count = int(missing.sum())
+            self.misses += miss_count
+            self.hits += len(positions) - miss_count
+        return values, missing, generations
+
+    def store(self, positions: np.ndarray, day: int, values: np.ndarray,
+              generations: Optional[np.ndarray] = None, now: Optional[float] = None):
+        """Cache forecasts for the given rows, except rows invalidated since `generations` was read"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if generations is not None:
+                current = self.generations[positions] == generations
+                self.stale_stores += int((~current).sum())
+                positions, values = positions[current], np.asarray(values)[current]
+            self.values[positions] = values
+            self.days[positions] = day
+            self.expires_at[positions] = now + self.ttl_seconds
+
+    def invalidate(self, hospital_id: str) -> bool:
+        """Drop the cached forecast for one hospital; returns False if the id is unknown"""
+        pos = self.positions.get(str(hospital_id))
+        if pos is None:
+            return False
+        with self._lock:
+            self.days[pos] = -1
+            self.generations[pos] += 1
+            self.invalidations += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.days[:] = -1
+            self.generations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hospitals": len(self.positions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "invalidations": self.invalidations,
+            "stale_stores": self.stale_stores,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+def forecast_cache_from_env(hospital_ids: Sequence[str]) -> OccupancyForecastCache:
+    """Create an OccupancyForecastCache using the OCCUPANCY_FORECAST_TTL_SECONDS setting"""
+    return OccupancyForecastCache(
+        hospital_ids,
+        ttl_seconds=float(os.getenv("OCCUPANCY_FORECAST_TTL_SECONDS", "3600"))
+    )
@@ -1,10 +1,12 @@
 import os
 import json
-from typing import List, Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from typing import List, Dict, Any, Tuple, AsyncIterator
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from startup import lazy_resource
+from .llm_cache import ranking_fingerprint, response_cache_from_env
+from .prompt_builder import estimate_tokens, prompt_builder_from_env
+from .stream_parser import RankingStreamParser
 
 # Load environment variables
 load_dotenv()
@@ -12,24 +14,39 @@ load_dotenv()
 class GeminiHospitalRankingService:
     def __init__(self):
         """Initialize the Gemini service with API key from environment"""
-        try:
-            self.api_key = os.getenv("GEMINI_API_KEY")
-            if not self.api_key:
-                print("Warning: GEMINI_API_KEY not found in environment variables")
-                self.llm = None
-                return
-            
-            # Initialize the Gemini model
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",  # Use a more stable model
-                google_api_key=self.api_key,
-                temperature=0.3,
-                max_tokens=2048
-            )
-            print("Gemini service initialized successfully")
-        except Exception as e:
-            print(f"Error initializing Gemini service: {e}")
-            self.llm = None
+        self.response_cache = response_cache_from_env()
+        self.prompt_builder = prompt_builder_from_env()
+        self.prompt_totals = {"requests": 0, "tokens": 0, "max_tokens": 0, "over_budget": 0}
+        self.cache_distance_bucket_km = float(os.getenv("GEMINI_CACHE_DISTANCE_BUCKET_KM", "1.0"))
+        self.api_key = os.getenv("GEMINI_API_KEY")
+        if not self.api_key:
+            print("Warning: GEMINI_API_KEY not found in environment variables")
+        # LangChain is imported and the client built on first use or by the startup warmup
+        self._llm = lazy_resource("gemini_llm", self._create_llm, required=False)
+
+    def _create_llm(self):
+        """Initialize the Gemini model (None without an API key)"""
+        if not self.api_key:
+            return None
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        llm = ChatGoogleGenerativeAI(
+            model="gemini-1.5-flash",  # Use a more stable model
+            google_api_key=self.api_key,
+            temperature=0.3,
+            max_tokens=2048
+        )
+        print("Gemini service initialized successfully")
+        return llm
+
+    @property
+    def llm(self):
+        return self._llm.get()
+
+    async def get_llm(self):
+        """The Gemini client, initialized off the event loop if the warmup hasn't done it yet"""
+        if self._llm.loaded:
+            return self._llm.get()
+        return await run_in_threadpool(self._llm.get)
 
     def create_ranking_prompt(self, 
                             ml_rankings: List[Dict[str, Any]], 
@@ -37,8 +54,62 @@ class GeminiHospitalRankingService:
                             ambulance_location: Dict[str, float],
                             patient_info: Dict[str, Any]) -> str:
         """Create a detailed prompt for the LLM to analyze and rank hospitals"""
+        prompt, _ = self.build_ranking_prompt(ml_rankings, live_hospital_data, ambulance_location, patient_info)
+        return prompt
+
+    def build_ranking_prompt(self, 
+                             ml_rankings: List[Dict[str, Any]], 
+                             live_hospital_data: Dict[str, List[Dict[str, Any]]], 
+                             ambulance_location: Dict[str, float],
+                             patient_info: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the ranking prompt within the token budget
         
-        prompt = f"""
+        Returns:
+            The prompt and its size stats (chars, estimated tokens, live rows included/dropped)
+        """
+        ml_table = self.prompt_builder.ml_table(ml_rankings)
+        relevant = self.prompt_builder.select_relevant(ml_rankings, live_hospital_data)
+
+        # Whatever the fixed instructions and ML table leave of the budget goes to live data
+        empty_sections = {section: "(none)" for section in relevant}
+        base_tokens = estimate_tokens(self._render_ranking_prompt(ml_table, empty_sections, ambulance_location, patient_info))
+        tables, section_counts = self.prompt_builder.fit_sections(relevant, self.prompt_builder.token_budget - base_tokens)
+
+        prompt = self._render_ranking_prompt(ml_table, tables, ambulance_location, patient_info)
+        prompt_tokens = estimate_tokens(prompt)
+        stats = {
+            "prompt_chars": len(prompt),
+            "prompt_tokens": prompt_tokens,
+            "token_budget": self.prompt_builder.token_budget,
+            "over_budget": prompt_tokens > self.prompt_builder.token_budget,
+            "ml_candidates": len(ml_rankings),
+            "live_rows": section_counts
+        }
+        self._record_prompt_stats(stats)
+        return prompt, stats
+
+    def _record_prompt_stats(self, stats: Dict[str, Any]):
+        self.prompt_totals["requests"] += 1
+        self.prompt_totals["tokens"] += stats["prompt_tokens"]
+        self.prompt_totals["max_tokens"] = max(self.prompt_totals["max_tokens"], stats["prompt_tokens"])
+        self.prompt_totals["over_budget"] += int(stats["over_budget"])
+
+    def get_prompt_stats(self) -> Dict[str, Any]:
+        """Aggregate prompt size stats across requests"""
+        requests = self.prompt_totals["requests"]
+        return {
+            **self.prompt_totals,
+            "avg_tokens": round(self.prompt_totals["tokens"] / requests, 1) if requests else 0,
+            "token_budget": self.prompt_builder.token_budget
+        }
+
+    def _render_ranking_prompt(self,
+                               ml_table: str,
+                               live_tables: Dict[str, str],
+                               ambulance_location: Dict[str, float],
+                               patient_info: Dict[str, Any]) -> str:
+        return f"""
 You are an advanced AI hospital allocation specialist with expertise in emergency medicine, hospital operations, and resource optimization. Your task is to analyze machine learning predictions combined with real-time hospital data to provide the most optimal hospital ranking for emergency patient allocation.
 
 ## PATIENT INFORMATION:
@@ -52,19 +123,19 @@ You are an advanced AI hospital allocation specialist with expertise in emergenc
 ## MACHINE LEARNING MODEL PREDICTIONS:
 The following hospitals have been ranked by our trained ML model based on historical data, distance, predicted bed availability, and suitability scores:
 
-{json.dumps(ml_rankings, indent=2)}
+{ml_table}
 
 ## REAL-TIME HOSPITAL DATA FROM USERS:
-This is live data provided by hospital administrators, doctors, and staff through our application:
+This is live data provided by hospital administrators, doctors, and staff through our application, limited to the ranked hospitals. Tables are pipe-separated with a header row.
 
 ### Hospital Updates:
-{json.dumps(live_hospital_data.get('hospitals', []), indent=2)}
+{live_tables['hospitals']}
 
 ### Doctor Availability:
-{json.dumps(live_hospital_data.get('doctors', []), indent=2)}
+{live_tables['doctors']}
 
 ### Current Patient Load:
-{json.dumps(live_hospital_data.get('patients', []), indent=2)}
+{live_tables['patients']}
 
 ## ANALYSIS REQUIREMENTS:
 
@@ -122,7 +193,6 @@ Provide your response as a structured JSON with the following format:
 
 Analyze carefully and provide the most clinically sound and operationally optimal ranking.
 """
-        return prompt
 
     async def get_intelligent_hospital_ranking(self, 
                                              ml_rankings: List[Dict[str, Any]], 
@@ -139,29 +209,45 @@ Analyze carefully and provide the most clinically sound and operationally optima
             patient_info: Patient severity and location data
             
         Returns:
-            Enhanced ranking with LLM analysis
+            Enhanced ranking with LLM analysis, with 'cache_status' set to
+            hit, coalesced or miss
         """
         # If Gemini service is not available, return fallback response
-        if self.llm is None:
+        if await self.get_llm() is None:
             return self._create_error_response(ml_rankings, "Gemini LLM service not available")
-            
+
+        # Near-identical requests share one cached or in-flight Gemini call
+        cache_key = ranking_fingerprint(
+            ml_rankings,
+            patient_info,
+            include_live_data=any(live_hospital_data.values()),
+            distance_bucket_km=self.cache_distance_bucket_km
+        )
+        result, cache_status = await self.response_cache.get_or_compute(
+            cache_key,
+            lambda: self._rank_with_llm(ml_rankings, live_hospital_data, ambulance_location, patient_info),
+            cacheable=lambda response: response.get('model_used') == 'gemini-pro'
+        )
+        result['cache_status'] = cache_status
+        return result
+
+    async def _rank_with_llm(self, 
+                             ml_rankings: List[Dict[str, Any]], 
+                             live_hospital_data: Dict[str, List[Dict[str, Any]]], 
+                             ambulance_location: Dict[str, float],
+                             patient_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one Gemini round trip and parse its ranking"""
         try:
             # Create the prompt
-            prompt = self.create_ranking_prompt(
+            prompt, prompt_stats = self.build_ranking_prompt(
                 ml_rankings, 
                 live_hospital_data, 
                 ambulance_location, 
                 patient_info
             )
             
-            # Create the chat template
-            chat_template = ChatPromptTemplate.from_messages([
-                SystemMessage(content="You are an expert AI hospital allocation specialist. Analyze all provided data carefully and provide the most optimal hospital ranking for emergency patient care."),
-                HumanMessage(content=prompt)
-            ])
-            
             # Get response from Gemini
-            response = await self.llm.ainvoke(chat_template.format_messages())
+            response = await self.llm.ainvoke(self._ranking_messages(prompt))
             
             # Extract JSON from response
             response_text = response.content
@@ -183,6 +269,7 @@ Analyze carefully and provide the most clinically sound and operationally optima
                 result['llm_response_raw'] = response_text
                 result['analysis_timestamp'] = self._get_timestamp()
                 result['model_used'] = 'gemini-pro'
+                result['prompt_stats'] = prompt_stats
                 
                 return result
                 
@@ -195,6 +282,83 @@ Analyze carefully and provide the most clinically sound and operationally optima
             print(f"Error in Gemini ranking service: {e}")
             return self._create_error_response(ml_rankings, str(e))
 
+    async def stream_intelligent_hospital_ranking(self, 
+                                                ml_rankings: List[Dict[str, Any]], 
+                                                live_hospital_data: Dict[str, List[Dict[str, Any]]], 
+                                                ambulance_location: Dict[str, float],
+                                                patient_info: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the Gemini ranking as it is generated
+        
+        Yields:
+            {"event": "ranking", "data": entry} for each final_ranking entry as soon
+            as it has been parsed, an optional {"event": "error", ...}, and finally
+            {"event": "complete", "data": result} with the full result
+        """
+        if await self.get_llm() is None:
+            result = self._create_error_response(ml_rankings, "Gemini LLM service not available")
+            for entry in result['final_ranking']:
+                yield {"event": "ranking", "data": entry}
+            yield {"event": "complete", "data": result}
+            return
+
+        cache_key = ranking_fingerprint(
+            ml_rankings,
+            patient_info,
+            include_live_data=any(live_hospital_data.values()),
+            distance_bucket_km=self.cache_distance_bucket_km
+        )
+        cached = self.response_cache.lookup(cache_key)
+        if cached is not None:
+            for entry in cached.get('final_ranking', []):
+                yield {"event": "ranking", "data": entry}
+            yield {"event": "complete", "data": {**cached, "cache_status": "hit"}}
+            return
+
+        parser = RankingStreamParser()
+        try:
+            prompt, prompt_stats = self.build_ranking_prompt(
+                ml_rankings, 
+                live_hospital_data, 
+                ambulance_location, 
+                patient_info
+            )
+            async for chunk in self.llm.astream(self._ranking_messages(prompt)):
+                content = chunk.content if isinstance(chunk.content, str) else ""
+                for entry in parser.feed(content):
+                    yield {"event": "ranking", "data": entry}
+        except Exception as e:
+            print(f"Error in Gemini ranking stream: {e}")
+            yield {"event": "error", "data": {"error": str(e), "entries_streamed": len(parser.entries)}}
+            yield {"event": "complete", "data": self._create_error_response(ml_rankings, str(e))}
+            return
+
+        result = parser.result()
+        if result is None:
+            result = self._create_fallback_response(ml_rankings, parser.text)
+        else:
+            result['llm_response_raw'] = parser.text
+            result['analysis_timestamp'] = self._get_timestamp()
+            result['model_used'] = 'gemini-pro'
+            result['prompt_stats'] = prompt_stats
+            self.response_cache.put(cache_key, result)
+
+        # Nothing was parsed incrementally (e.g. malformed output), so send the final ranking now
+        if not parser.entries:
+            for entry in result.get('final_ranking', []):
+                yield {"event": "ranking", "data": entry}
+        yield {"event": "complete", "data": {**result, "cache_status": "miss"}}
+
+    def _ranking_messages(self, prompt: str):
+        """Chat messages for a ranking prompt"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        from langchain_core.prompts import ChatPromptTemplate
+        chat_template = ChatPromptTemplate.from_messages([
+            SystemMessage(content="You are an expert AI hospital allocation specialist. Analyze all provided data carefully and provide the most optimal hospital ranking for emergency patient care."),
+            HumanMessage(content=prompt)
+        ])
+        return chat_template.format_messages()
+
     def _create_fallback_response(self, ml_rankings: List[Dict[str, Any]], llm_text: str) -> Dict[str, Any]:
         """Create a fallback response when LLM response can't be parsed"""
         
@@ -237,6 +401,10 @@ Analyze carefully and provide the most clinically sound and operationally optima
             "note": "LLM response could not be parsed, using enhanced ML rankings"
         }
 
+    def create_ml_only_response(self, ml_rankings: List[Dict[str, Any]], reason: str) -> Dict[str, Any]:
+        """ML-only ranking served when the LLM answer is not available in time"""
+        return self._create_error_response(ml_rankings, reason)
+
     def _create_error_response(self, ml_rankings: List[Dict[str, Any]], error_msg: str) -> Dict[str, Any]:
         """Create an error response when LLM service fails"""
         
@@ -291,8 +459,18 @@ except Exception as e:
     class FallbackGeminiService:
         def __init__(self):
             self.llm = None
+            self.response_cache = None
         
         async def get_intelligent_hospital_ranking(self, ml_rankings, live_hospital_data, ambulance_location, patient_info):
+            return self.create_ml_only_response(ml_rankings, "Gemini service unavailable")
+
+        async def stream_intelligent_hospital_ranking(self, ml_rankings, live_hospital_data, ambulance_location, patient_info):
+            result = self.create_ml_only_response(ml_rankings, "Gemini service unavailable")
+            for entry in result["final_ranking"]:
+                yield {"event": "ranking", "data": entry}
+            yield {"event": "complete", "data": result}
+
+        def create_ml_only_response(self, ml_rankings, reason):
             return {
                 "final_ranking": [
                     {
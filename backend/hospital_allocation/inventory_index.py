@@ -0,0 +1,156 @@
+import re
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Set, Tuple
+from state_backend import ChangeFollower
+
+# Substrings up to this length are indexed directly; longer queries intersect their n-grams
+MAX_GRAM = 3
+TOKEN = re.compile(r"\w+")
+
+
+def item_grams(name: str) -> Set[str]:
+    """Every substring of length 1..MAX_GRAM"""
+    return {name[i:i + n] for n in range(1, MAX_GRAM + 1) for i in range(len(name) - n + 1)}
+
+
+class InventoryIndex(ChangeFollower):
+    """
+    Inverted index over the inventory item names of warehouse_manager profiles.
+
+    Names are lowercased like the previous `in` check. The same names recur
+    across warehouses, so the n-grams index distinct names, and each name
+    maps to the warehouses stocking it. Every 1-3 character substring maps to
+    the names containing it: a short query is one lookup, and a longer one
+    intersects its trigram postings (smallest first) before confirming the
+    substring. Word tokens are also kept sorted for prefix search. Matching
+    item positions are only resolved for the warehouses a search returns.
+    Follows user_profiles through the change feed; the profile endpoints also
+    upsert into it directly.
+    """
+
+    def __init__(self, profiles, role: str = "warehouse_manager"):
+        super().__init__(profiles.backend, [profiles.name])
+        self.role = role
+        self.reset()
+
+    def reset(self):
+        self.grams: Dict[str, Set[str]] = {}
+        self.tokens: Dict[str, Set[str]] = {}
+        self.sorted_tokens: List[str] = []
+        # name -> warehouse id -> number of its items with that name
+        self.name_warehouses: Dict[str, Dict[str, int]] = {}
+        # warehouse id -> item names by inventory_items position (None for malformed items)
+        self.item_names: Dict[str, List[Optional[str]]] = {}
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        self.upsert(key, record)
+
+    def _add_name(self, name: str):
+        for gram in item_grams(name):
+            self.grams.setdefault(gram, set()).add(name)
+        for token in set(TOKEN.findall(name)):
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                insort(self.sorted_tokens, token)
+            self.tokens[token].add(name)
+
+    def _drop_name(self, name: str):
+        for gram in item_grams(name):
+            self._unpost(self.grams, gram, name)
+        for token in set(TOKEN.findall(name)):
+            if self._unpost(self.tokens, token, name):
+                del self.sorted_tokens[bisect_left(self.sorted_tokens, token)]
+
+    @staticmethod
+    def _unpost(postings: Dict[str, Set[str]], term: str, name: str) -> bool:
+        """Drop a name from a posting list; True if the term has no names left"""
+        names = postings.get(term)
+        if names is None:
+            return False
+        names.discard(name)
+        if not names:
+            del postings[term]
+            return True
+        return False
+
+    def _remove(self, warehouse_id: str):
+        for name in set(self.item_names.pop(warehouse_id, [])) - {None}:
+            warehouses = self.name_warehouses[name]
+            del warehouses[warehouse_id]
+            if not warehouses:
+                del self.name_warehouses[name]
+                self._drop_name(name)
+
+    def upsert(self, warehouse_id: str, profile: Optional[Dict[str, Any]]):
+        """(Re)index a profile's inventory; non-warehouse or deleted (None) profiles are dropped"""
+        with self._lock:
+            self._remove(warehouse_id)
+            if profile is None or profile.get("role") != self.role:
+                return
+            items = (profile.get("profile_data") or {}).get("inventory_items") or []
+            names = [str(item.get("name", "")).lower() if isinstance(item, dict) else None for item in items]
+            for name in names:
+                if name is None:
+                    continue
+                if name not in self.name_warehouses:
+                    self.name_warehouses[name] = {}
+                    self._add_name(name)
+                warehouses = self.name_warehouses[name]
+                warehouses[warehouse_id] = warehouses.get(warehouse_id, 0) + 1
+            if names:
+                self.item_names[warehouse_id] = names
+
+    def _substring(self, query: str) -> Set[str]:
+        if len(query) <= MAX_GRAM:
+            return set(self.grams.get(query, ()))
+        postings = sorted(
+            (self.grams.get(query[i:i + MAX_GRAM], set()) for i in range(len(query) - MAX_GRAM + 1)),
+            key=len
+        )
+        candidates = set(postings[0])
+        for names in postings[1:]:
+            if not candidates:
+                break
+            candidates &= names
+        return {name for name in candidates if query in name}
+
+    def _prefix(self, query: str) -> Set[str]:
+        # Every word of the query has to start some word of the item name
+        result: Optional[Set[str]] = None
+        for word in TOKEN.findall(query):
+            matched: Set[str] = set()
+            position = bisect_left(self.sorted_tokens, word)
+            while position < len(self.sorted_tokens) and self.sorted_tokens[position].startswith(word):
+                matched |= self.tokens[self.sorted_tokens[position]]
+                position += 1
+            result = matched if result is None else result & matched
+            if not result:
+                break
+        return result or set()
+
+    def search(self, query: str, match: str = "substring") -> Tuple[Set[str], Set[str]]:
+        """Ids of warehouses with a matching item, and the matching item names ("substring" or word "prefix" match)"""
+        self.sync()
+        query = query.lower()
+        with self._lock:
+            names = self._prefix(query) if match == "prefix" else self._substring(query)
+            warehouse_ids: Set[str] = set()
+            for name in names:
+                warehouse_ids.update(self.name_warehouses[name])
+        return warehouse_ids, names
+
+    def positions(self, warehouse_id: str, names: Set[str]) -> List[int]:
+        """Positions in a warehouse's inventory_items of the items named one of `names`"""
+        with self._lock:
+            return [position for position, name in enumerate(self.item_names.get(warehouse_id, [])) if name in names]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "warehouses": len(self.item_names),
+                "items": sum(len(names) for names in self.item_names.values()),
+                "distinct_names": len(self.name_warehouses),
+                "grams": len(self.grams),
+                "tokens": len(self.tokens)
+            }
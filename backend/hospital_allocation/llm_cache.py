@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def ranking_fingerprint(ml_rankings: List[Dict[str, Any]],
+                        patient_info: Dict[str, Any],
+                        include_live_data: bool = True,
+                        distance_bucket_km: float = 1.0) -> str:
+    """
+    Quantized cache key for an LLM ranking request: severity plus every
+    candidate sent in the prompt (so requests for a different number of
+    hospitals never share an answer), with distances bucketed so ambulances a
+    few hundred metres apart with the same case share one.
+    """
+    parts = [f"sev={patient_info.get('severity')}", f"live={int(include_live_data)}", f"n={len(ml_rankings)}"]
+    for hospital in ml_rankings:
+        bucket = int(float(hospital.get('distance_km', 0)) // distance_bucket_km)
+        parts.append(f"{hospital.get('hospital_id')}@{bucket}")
+    return "|".join(parts)
+
+
+class RankingResponseCache:
+    """
+    LRU + TTL cache for LLM ranking responses with single-flight coalescing.
+
+    Concurrent requests for the same key share one in-flight task. The task is
+    shielded from its callers, so a caller that stops waiting does not cancel
+    it and the result still lands in the cache.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 120):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """get() that also counts towards the hit/miss stats"""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def start(self,
+              key: str,
+              compute: Callable[[], Awaitable[Dict[str, Any]]],
+              cacheable: Callable[[Dict[str, Any]], bool]) -> Tuple[asyncio.Future, str]:
+        """
+        Return a future for `key` and how it was served: "hit", "coalesced"
+        (joined an in-flight call) or "miss" (started a new call).
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(cached)
+            return future, "hit"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task, "coalesced"
+
+        self.misses += 1
+        task = asyncio.ensure_future(compute())
+        self._inflight[key] = task
+
+        def _done(finished: asyncio.Task):
+            self._inflight.pop(key, None)
+            if not finished.cancelled() and finished.exception() is None and cacheable(finished.result()):
+                self.put(key, finished.result())
+
+        task.add_done_callback(_done)
+        return task, "miss"
+
+    async def get_or_compute(self,
+                             key: str,
+                             compute: Callable[[], Awaitable[Dict[str, Any]]],
+                             cacheable: Callable[[Dict[str, Any]], bool]) -> Tuple[Dict[str, Any], str]:
+        future, status = self.start(key, compute, cacheable)
+        result = await asyncio.shield(future)
+        return dict(result), status
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+def response_cache_from_env() -> RankingResponseCache:
+    """Create a RankingResponseCache using the GEMINI_CACHE_* environment settings"""
+    return RankingResponseCache(
+        max_entries=int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "120"))
+    )
@@ -0,0 +1,320 @@
+import time
+import uuid
+import zlib
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from state_backend import ChangeFollower
+
+HOURS_PER_DAY = 24
+WINDOW_HOURS = 7 * HOURS_PER_DAY
+# One extra day of history so the slot 7 days back is still readable
+HISTORY_HOURS = WINDOW_HOURS + HOURS_PER_DAY
+
+# Column order of OccupancyStore.features (the time-dependent part of NEXT_DAY_FEATURES)
+LIVE_FEATURES = ['occ_lag1', 'occ_lag7', 'occ_roll7', 'adm_roll7', 'adm_lag1', 'dis_lag1']
+
+
+def current_hour(now: Optional[float] = None) -> int:
+    """Absolute hour index (hours since the epoch)"""
+    return int((time.time() if now is None else now) // 3600)
+
+
+class OccupancyRingBuffer:
+    """
+    Hourly occupancy, admissions and discharges for one hospital.
+
+    Slots are addressed by absolute hour modulo the capacity. Running sums for
+    the 24h and 7-day windows are adjusted as values enter and leave them, so a
+    new observation or an hour rolling over costs O(1).
+    """
+
+    __slots__ = ('occupancy', 'admissions', 'discharges', 'start_hour', 'hour',
+                 'occ_sum_7d', 'adm_sum_7d', 'adm_sum_1d', 'dis_sum_1d')
+
+    def __init__(self, hour: int, occupancy: float):
+        self.occupancy = np.zeros(HISTORY_HOURS)
+        self.admissions = np.zeros(HISTORY_HOURS)
+        self.discharges = np.zeros(HISTORY_HOURS)
+        self.start_hour = hour
+        self.hour = hour
+        self.occupancy[hour % HISTORY_HOURS] = occupancy
+        self.occ_sum_7d = float(occupancy)
+        self.adm_sum_7d = 0.0
+        self.adm_sum_1d = 0.0
+        self.dis_sum_1d = 0.0
+
+    def _recorded(self, hour: int) -> bool:
+        return self.start_hour <= hour <= self.hour
+
+    def advance(self, hour: int):
+        """Roll the buffer forward to `hour`, carrying the last occupancy into the new slots"""
+        if hour <= self.hour:
+            return
+
+        # A gap longer than the history leaves nothing worth sliding through
+        if hour - self.hour >= HISTORY_HOURS:
+            last_occupancy = self.occupancy[self.hour % HISTORY_HOURS]
+            self.occupancy[:] = last_occupancy
+            self.admissions[:] = 0
+            self.discharges[:] = 0
+            self.start_hour = hour - HISTORY_HOURS + 1
+            self.hour = hour
+            self.occ_sum_7d = float(last_occupancy) * WINDOW_HOURS
+            self.adm_sum_7d = self.adm_sum_1d = self.dis_sum_1d = 0.0
+            return
+
+        while self.hour < hour:
+            last_occupancy = self.occupancy[self.hour % HISTORY_HOURS]
+            self.hour += 1
+
+            leaving_week = self.hour - WINDOW_HOURS
+            if self._recorded(leaving_week):
+                slot = leaving_week % HISTORY_HOURS
+                self.occ_sum_7d -= self.occupancy[slot]
+                self.adm_sum_7d -= self.admissions[slot]
+
+            leaving_day = self.hour - HOURS_PER_DAY
+            if self._recorded(leaving_day):
+                slot = leaving_day % HISTORY_HOURS
+                self.adm_sum_1d -= self.admissions[slot]
+                self.dis_sum_1d -= self.discharges[slot]
+
+            slot = self.hour % HISTORY_HOURS
+            self.occupancy[slot] = last_occupancy
+            self.admissions[slot] = 0
+            self.discharges[slot] = 0
+            self.occ_sum_7d += last_occupancy
+
+    def record(self, hour: int, occupancy: float, admissions: float = 0, discharges: float = 0):
+        """Record an observation for `hour` (observations older than the head are ignored)"""
+        self.advance(hour)
+        if hour < self.hour:
+            return
+
+        slot = hour % HISTORY_HOURS
+        self.occ_sum_7d += occupancy - self.occupancy[slot]
+        self.occupancy[slot] = occupancy
+        self.admissions[slot] += admissions
+        self.discharges[slot] += discharges
+        self.adm_sum_7d += admissions
+        self.adm_sum_1d += admissions
+        self.dis_sum_1d += discharges
+
+    def features(self) -> List[float]:
+        """Feature values in LIVE_FEATURES order"""
+        occ_lag1 = self.occupancy[self.hour % HISTORY_HOURS]
+        week_ago = self.hour - (WINDOW_HOURS - HOURS_PER_DAY)
+        occ_lag7 = self.occupancy[week_ago % HISTORY_HOURS] if self._recorded(week_ago) else occ_lag1 * 0.95
+
+        hours_in_week = min(self.hour - self.start_hour + 1, WINDOW_HOURS)
+        days_in_week = max(1.0, hours_in_week / HOURS_PER_DAY)
+        return [
+            occ_lag1,
+            occ_lag7,
+            self.occ_sum_7d / hours_in_week,
+            self.adm_sum_7d / days_in_week,
+            self.adm_sum_1d,
+            self.dis_sum_1d
+        ]
+
+
+class OccupancyStore:
+    """
+    In-memory live occupancy time series for all hospitals.
+
+    Each hospital gets a row in `features`, refreshed whenever its ring buffer
+    changes, so building the gbm input at query time is a single array gather.
+    Only registered hospitals (the infra rows) are tracked; observations for
+    any other id are refused. Buffers are only touched under the store lock,
+    since updates arrive from threadpool endpoints while queries roll the
+    hour forward.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, int] = {}
+        self.buffers: List[OccupancyRingBuffer] = []
+        self.features = np.zeros((0, len(LIVE_FEATURES)))
+        self.hour = current_hour()
+        self._lock = threading.RLock()
+
+    def __contains__(self, hospital_id: str) -> bool:
+        with self._lock:
+            return str(hospital_id) in self.rows
+
+    def _add(self, hospital_id: str, buffer: OccupancyRingBuffer) -> int:
+        row = len(self.buffers)
+        self.rows[hospital_id] = row
+        self.buffers.append(buffer)
+        if row >= len(self.features):
+            grown = np.zeros((max(16, 2 * len(self.features)), len(LIVE_FEATURES)))
+            grown[:len(self.features)] = self.features
+            self.features = grown
+        self.features[row] = buffer.features()
+        return row
+
+    @staticmethod
+    def _simulated(hospital_id: str, hour: int) -> OccupancyRingBuffer:
+        """A buffer holding one simulated observation, the same in every process for a given hospital and hour"""
+        rng = np.random.default_rng(zlib.crc32(hospital_id.encode()))
+        occupancy = int(rng.integers(10, 80))
+        buffer = OccupancyRingBuffer(hour, occupancy)
+        buffer.record(hour, occupancy, rng.uniform(0, 10), rng.uniform(0, 10))
+        return buffer
+
+    def record(self,
+               hospital_id: str,
+               occupancy: float,
+               admissions: float = 0,
+               discharges: float = 0,
+               now: Optional[float] = None) -> int:
+        """Feed one observation for a registered hospital and refresh its feature row (KeyError if unknown)"""
+        hospital_id = str(hospital_id)
+        hour = current_hour(now)
+        with self._lock:
+            self.advance(hour)
+            row = self.rows[hospital_id]
+            buffer = self.buffers[row]
+            buffer.record(hour, occupancy, admissions, discharges)
+            self.features[row] = buffer.features()
+            return row
+
+    def advance(self, hour: Optional[int] = None):
+        """Roll every buffer forward when the hour changes (once per hour, not per query)"""
+        hour = current_hour() if hour is None else hour
+        with self._lock:
+            if hour <= self.hour:
+                return
+            self.hour = hour
+            for row, buffer in enumerate(self.buffers):
+                buffer.advance(hour)
+                self.features[row] = buffer.features()
+
+    def row_for(self, hospital_ids: Sequence[str]) -> np.ndarray:
+        """Feature rows for the given hospitals (must already be registered)"""
+        with self._lock:
+            return np.array([self.rows[str(hospital_id)] for hospital_id in hospital_ids], dtype=np.intp)
+
+    def feature_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Current live feature matrix for the given rows, in LIVE_FEATURES order"""
+        with self._lock:
+            self.advance()
+            return self.features[rows]
+
+    def register(self, hospital_ids: Sequence[str]):
+        """
+        Track exactly these hospitals: buffers of hospitals no longer listed are dropped, and new
+        ones get a single simulated observation so they can be ranked until live data arrives
+        """
+        hospital_ids = [str(hospital_id) for hospital_id in hospital_ids]
+        with self._lock:
+            kept = [(hospital_id, self.buffers[self.rows[hospital_id]]) for hospital_id in hospital_ids if hospital_id in self.rows]
+            if len(kept) < len(self.rows):
+                self.rows = {}
+                self.buffers = []
+                self.features = np.zeros((0, len(LIVE_FEATURES)))
+                for hospital_id, buffer in kept:
+                    self._add(hospital_id, buffer)
+
+            for hospital_id in hospital_ids:
+                if hospital_id not in self.rows:
+                    self._add(hospital_id, self._simulated(hospital_id, self.hour))
+
+    def restart(self, hour: int):
+        """Drop all live history: every hospital starts over from its simulated observation at `hour`"""
+        with self._lock:
+            self.hour = hour
+            for hospital_id, row in self.rows.items():
+                self.buffers[row] = self._simulated(hospital_id, hour)
+                self.features[row] = self.buffers[row].features()
+
+
+class OccupancyFeed(ChangeFollower):
+    """
+    Live occupancy observations shared by every worker process.
+
+    update_hospital writes each observation, with its timestamp, to a state
+    backend collection instead of recording it directly. Every process
+    replays that collection from the change feed into its own
+    OccupancyStore, so all of them build the same ring buffers and gbm
+    features. A reload starts the store over from the shared epoch hour
+    (when live history began) and replays every observation kept.
+    Once an hour one worker deletes the observations that fell out of the
+    history window, except the last one before it per hospital, whose
+    occupancy is still carried forward into the window. `on_change` is called with the hospital id after each applied
+    observation, and with None after a reload, so caches derived from the
+    store (the forecasts) can be dropped.
+    """
+
+    def __init__(self, observations, store: OccupancyStore, on_change: Optional[Callable[[Optional[str]], None]] = None):
+        super().__init__(observations.backend, [observations.name])
+        self.observations = observations.create_index("hospital_id")
+        self._meta = observations.backend.collection(f"{observations.name}_meta")
+        self._pruned_hour = f"{observations.name}_pruned_hour"
+        self.store = store
+        self.on_change = on_change
+        self.reset()
+
+    def _epoch_hour(self) -> int:
+        # The first process to get here fixes the epoch for all of them
+        self._meta.seed([("epoch", {"hour": current_hour()})])
+        return self._meta.get("epoch")["hour"]
+
+    def reset(self):
+        self._applied = set()
+        self.store.restart(self._epoch_hour())
+        if self.on_change is not None:
+            self.on_change(None)
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        if record is None:
+            self._applied.discard(key)
+            return
+        # A rebuild can read an observation and then see it again in the feed
+        if key in self._applied:
+            return
+        self._applied.add(key)
+        hospital_id = record["hospital_id"]
+        if hospital_id not in self.store:
+            # Observation for a row of another infra table
+            return
+        self.store.record(hospital_id, record["occupancy"], record["admissions"], record["discharges"], now=record["at"])
+        if self.on_change is not None:
+            self.on_change(hospital_id)
+
+    def record(self, hospital_id: str, occupancy: float, admissions: float = 0, discharges: float = 0):
+        """Publish an observation to every process and apply it here before returning"""
+        observation_id = uuid.uuid4().hex
+        now = time.time()
+        self.observations.put(observation_id, {
+            "observation_id": observation_id,
+            "hospital_id": str(hospital_id),
+            "occupancy": occupancy,
+            "admissions": admissions,
+            "discharges": discharges,
+            "at": now
+        })
+        self.sync()
+        self._maybe_prune(now)
+
+    def _maybe_prune(self, now: float):
+        # Once per hour across all workers: whoever moves the shared marker first prunes, off the request path
+        hour, pruned = current_hour(now), self.backend.counter(self._pruned_hour)
+        if pruned < hour and self.backend.compare_and_set(self._pruned_hour, pruned, hour):
+            threading.Thread(target=self.prune, args=(now,), name="occupancy-prune", daemon=True).start()
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete observations that fell out of the history window; returns how many were deleted"""
+        oldest_hour = current_hour(now) - HISTORY_HOURS
+        expired: Dict[str, List[Dict[str, Any]]] = {}
+        for _, observation in self.observations.items():
+            if current_hour(observation["at"]) < oldest_hour:
+                expired.setdefault(observation["hospital_id"], []).append(observation)
+
+        deleted = 0
+        for observations in expired.values():
+            observations.sort(key=lambda observation: observation["at"])
+            # The newest expired observation still sets the occupancy carried into the window
+            for observation in observations[:-1]:
+                deleted += self.observations.delete(observation["observation_id"])
+        return deleted
@@ -0,0 +1,256 @@
+import os
+import math
+import numpy as np
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Tuple
+from state_backend import ChangeFollower
+from .scoring import haversine_vec, EARTH_RADIUS_KM
+
+# Profile fields a role can report its position in (drivers send their current location)
+LOCATION_FIELDS = (("location_lat", "location_lon"), ("current_location_lat", "current_location_lon"))
+
+Cell = Tuple[int, int]
+
+
+def profile_location(profile_data: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    for lat_field, lon_field in LOCATION_FIELDS:
+        if lat_field in profile_data and lon_field in profile_data:
+            return float(profile_data[lat_field]), float(profile_data[lon_field])
+    return None
+
+
+class GeoGrid:
+    """
+    Points bucketed into fixed-size latitude/longitude cells.
+
+    Queries walk rings of cells outward from the query point's cell and stop
+    as soon as nothing in the unvisited rings can be closer than the radius
+    (or than the k-th nearest hit found so far), so a lookup only touches the
+    cells around the point. Distances are exact haversine on those candidates.
+    """
+
+    def __init__(self, cell_deg: float = 0.1):
+        self.cell_deg = cell_deg
+        self.n_lon = int(math.ceil(360 / cell_deg))
+        self.cells: Dict[Cell, Dict[str, Tuple[float, float]]] = {}
+        self.points: Dict[str, Cell] = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.points
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return int(math.floor((lat + 90) / self.cell_deg)), int(math.floor((lon + 180) / self.cell_deg)) % self.n_lon
+
+    def add(self, key: str, lat: float, lon: float):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, {})[key] = (lat, lon)
+        self.points[key] = cell
+
+    def remove(self, key: str):
+        cell = self.points.pop(key, None)
+        if cell is not None:
+            bucket = self.cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self.cells[cell]
+
+    def among(self, keys: Collection[str], lat: float, lon: float, radius_km: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Tuple[float, str]]:
+        """Like nearby, but only over the given keys (distances computed directly, for small candidate sets)"""
+        located = [key for key in keys if key in self.points]
+        if not located or limit == 0:
+            return []
+        coords = np.array([self.cells[self.points[key]][key] for key in located])
+        dist = haversine_vec(lon, lat, coords[:, 1], coords[:, 0])
+        hits = np.flatnonzero(dist <= radius_km) if radius_km is not None else np.arange(len(located))
+        order = hits[np.argsort(dist[hits], kind="stable")][:limit]
+        return [(float(dist[i]), located[i]) for i in order]
+
+    def _ring(self, cy: int, cx: int, r: int) -> Iterator[Cell]:
+        if r == 0:
+            yield cy, cx
+            return
+        for dx in range(-r, r + 1):
+            yield cy - r, (cx + dx) % self.n_lon
+            yield cy + r, (cx + dx) % self.n_lon
+        for dy in range(-r + 1, r):
+            yield cy + dy, (cx - r) % self.n_lon
+            yield cy + dy, (cx + r) % self.n_lon
+
+    def _beyond(self, cy: int, cx: int, r: int) -> Iterator[Cell]:
+        """Occupied cells r or more rings away (used once walking rings costs more than a scan)"""
+        for y, x in self.cells:
+            dx = abs(x - cx)
+            if max(abs(y - cy), min(dx, self.n_lon - dx)) >= r:
+                yield y, x
+
+    def _unvisited_bound_km(self, lat: float, r: int) -> float:
+        """Lower bound on the distance from a point in the centre cell to anything outside rings 0..r"""
+        gap = math.radians(r * self.cell_deg)
+        # Cells beside the visited square (not above/below it) lie within this latitude band
+        band = math.radians(min(90.0, abs(lat) + (r + 1) * self.cell_deg))
+        lon_gap = 2 * math.asin(min(1.0, math.cos(band) * math.sin(gap / 2)))
+        return EARTH_RADIUS_KM * min(gap, lon_gap)
+
+    def nearby(self, lat: float, lon: float, radius_km: Optional[float] = None,
+               limit: Optional[int] = None) -> List[Tuple[float, str]]:
+        """(distance_km, key) pairs within radius_km of (lat, lon), nearest first, at most `limit`"""
+        if not self.points or limit == 0:
+            return []
+        cy, cx = self._cell(lat, lon)
+        distances: List[float] = []
+        keys: List[str] = []
+        visited = 0
+        r = 0
+        while True:
+            last = 2 * r + 1 >= self.n_lon or 8 * r > len(self.cells)
+            ring_keys, ring_lat, ring_lon = [], [], []
+            for cell in (self._beyond(cy, cx, r) if last else self._ring(cy, cx, r)):
+                bucket = self.cells.get(cell)
+                if bucket:
+                    for key, (point_lat, point_lon) in bucket.items():
+                        ring_keys.append(key)
+                        ring_lat.append(point_lat)
+                        ring_lon.append(point_lon)
+            visited += len(ring_keys)
+
+            if ring_keys:
+                dist = haversine_vec(lon, lat, np.array(ring_lon), np.array(ring_lat))
+                hits = np.flatnonzero(dist <= radius_km) if radius_km is not None else range(len(ring_keys))
+                for i in hits:
+                    distances.append(float(dist[i]))
+                    keys.append(ring_keys[i])
+
+            if last or visited >= len(self.points):
+                break
+            bound = self._unvisited_bound_km(lat, r)
+            if radius_km is not None and bound > radius_km:
+                break
+            if limit is not None and len(distances) >= limit and np.partition(distances, limit - 1)[limit - 1] <= bound:
+                break
+            r += 1
+
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [(distances[i], keys[i]) for i in order]
+
+
+class ProfileGeoIndex(ChangeFollower):
+    """
+    Role-partitioned grid index over the user profiles collection.
+
+    `update_user_profile` upserts into it directly; `sync` applies the state
+    backend's change feed, so writes made by other workers (or any other
+    writer) are picked up before each query, and a trimmed feed triggers a
+    full rebuild. Profiles without a location stay listed by role but are not
+    in the grid.
+    """
+
+    def __init__(self, profiles, cell_deg: float = 0.1):
+        super().__init__(profiles.backend, [profiles.name])
+        self.cell_deg = cell_deg
+        self.reset()
+
+    def reset(self):
+        self.grids: Dict[str, GeoGrid] = {}
+        self.by_role: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.role_of: Dict[str, str] = {}
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        if record is None:
+            self._remove(key)
+        else:
+            self.upsert(key, record)
+
+    def _remove(self, key: str):
+        role = self.role_of.pop(key, None)
+        if role is not None:
+            self.by_role[role].pop(key, None)
+            if role in self.grids:
+                self.grids[role].remove(key)
+
+    def upsert(self, key: str, profile: Dict[str, Any]):
+        with self._lock:
+            self._remove(key)
+            role = profile.get("role")
+            self.role_of[key] = role
+            self.by_role.setdefault(role, {})[key] = profile
+            location = profile_location(profile.get("profile_data") or {})
+            if location is not None:
+                self.grids.setdefault(role, GeoGrid(self.cell_deg)).add(key, *location)
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def nearby(self, role: str, lat: float, lon: float, radius_km: float, limit: Optional[int] = None,
+               where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               among: Optional[Collection[str]] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        (distance_km, profile) for `role` profiles within radius_km passing `where`, nearest first.
+        `among` restricts the search to those profile keys (e.g. the hits of another index).
+        """
+        self.sync()
+        with self._lock:
+            grid = self.grids.get(role)
+            if grid is None:
+                return []
+            profiles = self.by_role[role]
+            if among is not None and len(among) * 8 <= len(grid):
+                # Few candidates: measure them directly rather than walking the grid for them
+                hits = grid.among(among, lat, lon, radius_km, None if where is not None else limit)
+                return [(distance, profiles[key]) for distance, key in hits if where is None or where(profiles[key])][:limit]
+
+            def accept(key):
+                return (among is None or key in among) and (where is None or where(profiles[key]))
+
+            # With a filter, fetch the nearest in growing batches until enough of them pass
+            filtered = where is not None or among is not None
+            fetch = limit if filtered else None
+            while True:
+                hits = grid.nearby(lat, lon, radius_km, limit if not filtered else fetch)
+                rows = [(distance, profiles[key]) for distance, key in hits if accept(key)]
+                if not filtered or fetch is None or len(rows) >= limit or len(hits) < fetch:
+                    return rows[:limit]
+                fetch = fetch * 4 if fetch * 4 < len(grid) else None
+
+    def members(self, role: str, where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                located: Optional[bool] = None, among: Optional[Collection[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Profiles with `role` passing `where` (and among the given keys); `located` restricts to
+        profiles with (True) or without (False) a location
+        """
+        self.sync()
+        with self._lock:
+            grid = self.grids.get(role)
+            profiles = self.by_role.get(role, {})
+            keys = profiles if among is None else [key for key in profiles if key in among]
+            return [
+                profiles[key] for key in keys
+                if (located is None or (grid is not None and key in grid) == located)
+                and (where is None or where(profiles[key]))
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "cell_deg": self.cell_deg,
+                "rebuilds": self.rebuilds,
+                "changes_applied": self.changes_applied,
+                "roles": {
+                    role: {
+                        "profiles": len(profiles),
+                        "located": len(self.grids[role]) if role in self.grids else 0,
+                        "cells": len(self.grids[role].cells) if role in self.grids else 0
+                    }
+                    for role, profiles in self.by_role.items()
+                }
+            }
+
+
+def profile_index_from_env(profiles) -> ProfileGeoIndex:
+    """Create a ProfileGeoIndex with PROFILE_INDEX_CELL_DEG-sized grid cells (default 0.1°, about 11 km)"""
+    return ProfileGeoIndex(profiles, cell_deg=float(os.getenv("PROFILE_INDEX_CELL_DEG", "0.1")))
@@ -0,0 +1,134 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Rough characters-per-token ratio for Gemini-style tokenizers on English/tabular text
+CHARS_PER_TOKEN = 4
+
+ML_RANKING_COLUMNS = [
+    ('rank', None), ('hospital_id', 'hospital_id'), ('name', 'hospital_name'),
+    ('dist_km', 'distance_km'), ('pred_beds', 'predicted_beds_available'),
+    ('suitability', 'suitability_score'), ('beds', 'total_beds'), ('icu', 'icu_beds'),
+    ('wait_est', 'wait_time_estimate')
+]
+HOSPITAL_COLUMNS = [
+    ('hospital_id', 'hospital_id'), ('name', 'name'), ('avail_beds', 'available_beds'),
+    ('beds', 'total_beds'), ('avail_icu', 'available_icu_beds'), ('icu', 'icu_beds'),
+    ('occupancy', 'current_occupancy'), ('specialties', 'specialties'), ('updated', 'last_updated')
+]
+DOCTOR_COLUMNS = [
+    ('hospital_id', 'hospital_id'), ('name', 'name'), ('specialization', 'specialization'),
+    ('status', 'status'), ('exp_years', 'experience_years')
+]
+PATIENT_COLUMNS = [
+    ('patient_id', 'patient_id'), ('assigned_hospital', 'assigned_hospital'),
+    ('severity', 'severity'), ('status', 'status')
+]
+
+# Sections are filled in this order, so under a tight budget patients are dropped first
+LIVE_SECTIONS = [('hospitals', HOSPITAL_COLUMNS), ('doctors', DOCTOR_COLUMNS), ('patients', PATIENT_COLUMNS)]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count without a round trip to the model's tokenizer"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(v) for v in value) or "-"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def name_key(name: Any) -> str:
+    """Normalized facility name used to link live hospitals to infra rows"""
+    return str(name or "").strip().lower()
+
+
+def linked_infra_id(hospital: Dict[str, Any], ids_by_name: Dict[str, str]) -> Optional[str]:
+    """A live hospital's infra row: its explicit infra_id, else the row whose facility name matches"""
+    if hospital.get('infra_id') is not None:
+        return str(hospital['infra_id'])
+    return ids_by_name.get(name_key(hospital.get('name')))
+
+
+def table_header(columns: Sequence[Tuple[str, Any]]) -> str:
+    return "|".join(name for name, _ in columns)
+
+
+def table_row(record: Dict[str, Any], columns: Sequence[Tuple[str, Any]]) -> str:
+    return "|".join(_cell(record.get(key)) for _, key in columns if key is not None)
+
+
+class CompactPromptBuilder:
+    """
+    Serializes the ranking inputs as compact pipe-separated tables.
+
+    Only live records that refer to the ML candidates are included, and rows
+    are added section by section until the configured token budget is used up,
+    so prompt size follows the top-K candidates instead of the whole dataset.
+    """
+
+    def __init__(self, token_budget: int = 4000):
+        self.token_budget = token_budget
+
+    def ml_table(self, ml_rankings: List[Dict[str, Any]]) -> str:
+        lines = [table_header(ML_RANKING_COLUMNS)]
+        for rank, hospital in enumerate(ml_rankings, start=1):
+            lines.append(f"{rank}|{table_row(hospital, ML_RANKING_COLUMNS)}")
+        return "\n".join(lines)
+
+    def select_relevant(self,
+                        ml_rankings: List[Dict[str, Any]],
+                        live_hospital_data: Dict[str, List[Dict[str, Any]]],
+                        infra_id_of: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Keep only live hospitals linked to a ranked candidate, and the doctors and patients of those.
+        Candidates are infra rows, so a live hospital is linked through `infra_id_of` (by default its
+        infra_id, else a facility name match); live hospital ids never match candidate ids directly.
+        """
+        candidate_ids = {str(h.get('hospital_id')) for h in ml_rankings}
+        if infra_id_of is None:
+            ids_by_name = {name_key(h.get('hospital_name')): str(h.get('hospital_id')) for h in ml_rankings}
+            infra_id_of = lambda hospital: linked_infra_id(hospital, ids_by_name)
+
+        hospitals = [h for h in live_hospital_data.get('hospitals', []) if infra_id_of(h) in candidate_ids]
+        hospital_ids = {str(h.get('hospital_id')) for h in hospitals}
+
+        doctors = [d for d in live_hospital_data.get('doctors', []) if str(d.get('hospital_id')) in hospital_ids]
+        patients = [p for p in live_hospital_data.get('patients', []) if str(p.get('assigned_hospital')) in hospital_ids]
+
+        return {"hospitals": hospitals, "doctors": doctors, "patients": patients}
+
+    def fit_sections(self,
+                     relevant: Dict[str, List[Dict[str, Any]]],
+                     token_allowance: int) -> Tuple[Dict[str, str], Dict[str, Dict[str, int]]]:
+        """Render each live section as a table, adding rows while they fit in token_allowance"""
+        tables = {}
+        counts = {}
+        remaining = token_allowance
+
+        for section, columns in LIVE_SECTIONS:
+            records = relevant.get(section, [])
+            header = table_header(columns)
+            lines = []
+            if records and estimate_tokens(header) + 1 <= remaining:
+                remaining -= estimate_tokens(header) + 1
+                for record in records:
+                    line = table_row(record, columns)
+                    cost = estimate_tokens(line) + 1
+                    if cost > remaining:
+                        break
+                    lines.append(line)
+                    remaining -= cost
+
+            tables[section] = "\n".join([header] + lines) if lines else "(none)"
+            counts[section] = {"included": len(lines), "dropped": len(records) - len(lines)}
+
+        return tables, counts
+
+
+def prompt_builder_from_env() -> CompactPromptBuilder:
+    """Create a CompactPromptBuilder using the GEMINI_PROMPT_TOKEN_BUDGET setting"""
+    return CompactPromptBuilder(token_budget=int(os.getenv("GEMINI_PROMPT_TOKEN_BUDGET", "4000")))
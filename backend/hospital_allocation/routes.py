@@ -1,16 +1,32 @@
 import os
-import pickle
+import json
+import time
+import asyncio
 import pandas as pd
 import numpy as np
-from math import radians, cos, sin, asin, sqrt
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import random
 from huggingface_hub import hf_hub_download
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from enum import Enum
 from .gemini_service import gemini_service
+from .scoring import CandidateScorer, SUITABILITY_FEATURES
+from .spatial_index import HospitalSpatialIndex
+from .batching import batcher_from_env
+from .forecast_cache import forecast_cache_from_env
+from .occupancy_store import OccupancyStore, OccupancyFeed
+from .profile_index import profile_index_from_env
+from .inventory_index import InventoryIndex
+from .prompt_builder import name_key
+from model_artifacts import artifact_store_from_env, lazy_model
+from startup import lazy_resource
+from state_backend import state_backend
+from aggregates import RunningTotals, conditional_response, count_all, count_where, field_sum
+from live_updates import live_channel_from_env, serve_websocket, sse_response
 
 # Create an API Router for this module
 router = APIRouter()
@@ -40,11 +56,14 @@ class HospitalInput(BaseModel):
     longitude: float
     specialties: List[str]
     admin_id: str
+    infra_id: Optional[str] = None  # row of the infra table this hospital is; matched by name if omitted
 
 class HospitalUpdateInput(BaseModel):
     available_beds: int
     available_icu_beds: int
     current_occupancy: int
+    admissions: Optional[int] = None  # since last update; derived from the occupancy change if omitted
+    discharges: Optional[int] = None
 
 # Role-specific data models
 class DoctorProfileInput(BaseModel):
@@ -127,6 +146,7 @@ class WarehouseManagerInput(BaseModel):
     storage_types: List[str]  # dry, cold, frozen, hazardous
     inventory_items: List[Dict[str, Any]]
     contact_info: str
+    user_id: Optional[str] = None  # store on this warehouse_manager profile (searchable via search-inventory)
 
 class HousingAuthorityInput(BaseModel):
     authority_name: str
@@ -162,6 +182,7 @@ class IntelligentHospitalRankingInput(BaseModel):
     include_live_data: bool = True
     max_hospitals: int = 5
     radius_km: float = 50.0
+    latency_budget_ms: Optional[int] = None  # defaults to LLM_LATENCY_BUDGET_MS; no deadline if neither is set
 
 class HospitalRankingResponse(BaseModel):
     rank: int
@@ -185,12 +206,19 @@ class IntelligentRankingResponse(BaseModel):
     overall_assessment: str
     analysis_timestamp: str
     model_used: str
+    served_by: str = "llm"  # llm, llm_cache, llm_coalesced, ml_fast_path or ml_fallback
+    latency_ms: float = 0.0
+    prompt_stats: Dict[str, Any] = {}
 
 # --- Load all necessary data and models from your Model Hub repository ---
-# This will run only once when the server starts
+# Models are converted once into local LightGBM text artifacts and loaded lazily
+# (or by a background warmup), so startup doesn't wait on downloads or unpickling
+HF_REPO_ID = "kesavan2006/chennai-hospital-optimizer-models"
+artifact_store = artifact_store_from_env()
 gbm = None
 clf = None
 infra = None
+infra_is_mock = False
 
 # Create mock data if models can't be loaded
 def create_mock_hospital_data():
@@ -210,259 +238,349 @@ def create_mock_hospital_data():
     }
     return pd.DataFrame(mock_data)
 
-try:
-    print("Attempting to load ML models from Hugging Face Hub...")
-    # IMPORTANT: Replace "your-username" with your actual Hugging Face username
-    repo_id = "kesavan2006/chennai-hospital-optimizer-models" 
-
-    # Download each file and get its local path
-    gbm_path = hf_hub_download(repo_id=repo_id, filename="hospital_nextday_lgbm.pkl")
-    clf_path = hf_hub_download(repo_id=repo_id, filename="hospital_suitability_lgbm.pkl")
-    infra_path = hf_hub_download(repo_id=repo_id, filename="chennai_infra_used.csv")
-    
-    # Load the models and data from the downloaded paths
-    # Note: Using pickle since that's what was used to save them
-    with open(gbm_path, "rb") as f:
-        gbm = pickle.load(f)
-    with open(clf_path, "rb") as f:
-        clf = pickle.load(f)
-    infra = pd.read_csv(infra_path)
-    
-    print("✅ ML models loaded successfully from Hugging Face Hub")
-
-except Exception as e:
-    print(f"⚠️ Error loading files from Hugging Face Hub: {e}")
-    print("🔄 Using mock data for demo purposes...")
-    
-    # Create mock models and data for demonstration
-    infra = create_mock_hospital_data()
-    
-    # Create simple mock models
-    class MockModel:
-        def predict(self, X):
-            # Simple mock prediction based on distance (lower distance = higher score)
-            if hasattr(X, 'iloc'):
-                # DataFrame input
-                if 'dist_km' in X.columns:
-                    return np.random.uniform(0.3, 0.9, len(X))
-                else:
-                    return np.random.uniform(30, 80, len(X))
+# Simple mock model used when the real models can't be loaded
+class MockModel:
+    def predict(self, X):
+        # Simple mock prediction based on distance (lower distance = higher score)
+        if hasattr(X, 'iloc'):
+            # DataFrame input
+            if 'dist_km' in X.columns:
+                return np.random.uniform(0.3, 0.9, len(X))
             else:
-                # Array input
                 return np.random.uniform(30, 80, len(X))
-    
-    gbm = MockModel()
-    clf = MockModel()
-    
-    print("✅ Mock models and data created successfully")
+        else:
+            # Array input
+            return np.random.uniform(30, 80, len(X))
+
+def hub_file(filename: str):
+    """Source fetcher for the artifact store: download `filename` from the Model Hub repo"""
+    return lambda: hf_hub_download(repo_id=HF_REPO_ID, filename=filename)
+
+def load_hub_model(name: str, filename: str):
+    hospital_data.get()
+    if infra_is_mock:
+        # The real models expect features from the real infra table
+        raise RuntimeError("infra data unavailable, using mock models")
+    return artifact_store.load(name, "lightgbm", hub_file(filename))
+
+def load_infra() -> pd.DataFrame:
+    """Load the infra table (cached artifact, Hub download or mock) and build the scoring structures"""
+    global infra_is_mock
+    try:
+        print("Attempting to load hospital infra data from the artifact cache / Hugging Face Hub...")
+        data, _ = artifact_store.load("chennai_infra_used", "csv", hub_file("chennai_infra_used.csv"))
+        print("✅ Hospital infra data loaded successfully")
+
+    except Exception as e:
+        print(f"⚠️ Error loading files from Hugging Face Hub: {e}")
+        print("🔄 Using mock data for demo purposes...")
+        data = create_mock_hospital_data()
+        infra_is_mock = True
+        print("✅ Mock data created successfully (models will fall back to mocks)")
+
+    set_infra(data)
+    index_hospital_names()
+    return data
+
+# Array-backed scoring engine and spatial index over infra, shared by both ranking endpoints
+candidate_scorer = None
+hospital_index = None
+forecast_cache = None
+occupancy_rows = None
+# Normalized facility name -> infra row id, to match live hospitals to their infra row
+infra_ids_by_name: Dict[str, str] = {}
+
+# Live hourly occupancy/admissions/discharges per hospital, fed by update_hospital through
+# the shared observation log (so every worker ranks with the same live data)
+occupancy_store = OccupancyStore()
+
+def invalidate_forecast(infra_id: Optional[str]):
+    """A hospital's live data changed (None: all of them), so its next-day forecast must be recomputed"""
+    if forecast_cache is None:
+        return
+    if infra_id is None:
+        forecast_cache.clear()
+    else:
+        forecast_cache.invalidate(infra_id)
+
+occupancy_feed = OccupancyFeed(state_backend.collection("occupancy_observations"), occupancy_store, on_change=invalidate_forecast)
+
+def set_infra(data: pd.DataFrame):
+    """Swap in a new infra table and rebuild the scorer arrays, spatial index and forecast cache"""
+    global infra, candidate_scorer, hospital_index, forecast_cache, occupancy_rows, infra_ids_by_name
+    infra = data
+    candidate_scorer = CandidateScorer(data)
+    hospital_index = HospitalSpatialIndex(candidate_scorer.latitude, candidate_scorer.longitude)
+
+    hospital_ids = [str(idx) for idx in data.index]
+    infra_ids_by_name = {name_key(name): hospital_id for hospital_id, name in zip(hospital_ids, data['facility_name'])}
+    forecast_cache = forecast_cache_from_env(hospital_ids)
+    occupancy_store.register(hospital_ids)
+    # Replay the shared observations onto the (possibly new) set of hospitals
+    occupancy_feed.rebuild()
+    occupancy_rows = occupancy_store.row_for(hospital_ids)
+
+def infra_id_for(hospital: Dict[str, Any]) -> Optional[str]:
+    """The infra row a managed hospital corresponds to: its infra_id if set, else a facility name match"""
+    hospital_data.get()
+    infra_id = hospital.get("infra_id")
+    if infra_id is not None:
+        return str(infra_id) if str(infra_id) in occupancy_store else None
+    return infra_ids_by_name.get(name_key(hospital.get("name")))
+
+def index_hospital_names():
+    """Add the indexed name_key to hospitals stored before it existed (once per process, at infra load)"""
+    for hospital_id, hospital in hospitals_db.items():
+        if "name_key" not in hospital:
+            hospitals_db.update(hospital_id, {"name_key": name_key(hospital.get("name"))})
+
+def live_data_for(ml_rankings: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Live hospitals linked to the ranked infra candidates, plus their doctors and patients,
+    fetched through the hash indexes so the cost follows the candidates, not the dataset
+    """
+    hospitals = {}
+    for candidate in ml_rankings:
+        infra_id = candidate["hospital_id"]
+        for hospital in hospitals_db.find("infra_id", infra_id) + hospitals_db.find("name_key", name_key(candidate["hospital_name"])):
+            if infra_id_for(hospital) == infra_id:
+                hospitals[hospital["hospital_id"]] = hospital
+    return {
+        "hospitals": list(hospitals.values()),
+        "doctors": [doctor for hospital_id in hospitals for doctor in doctors_db.find("hospital_id", hospital_id)],
+        "patients": [patient for hospital_id in hospitals for patient in patients_db.find("assigned_hospital", hospital_id)]
+    }
 
-# --- Helper Function for Haversine Distance ---
-def haversine(lon1, lat1, lon2, lat2):
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    return 6371 * c
+# Infra table and models load in the startup warmup (or on first use), not at import
+hospital_data = lazy_resource("hospital_infra", load_infra)
+gbm = lazy_model("hospital_nextday_lgbm", lambda: load_hub_model("hospital_nextday_lgbm", "hospital_nextday_lgbm.pkl"), fallback=MockModel)
+clf = lazy_model("hospital_suitability_lgbm", lambda: load_hub_model("hospital_suitability_lgbm", "hospital_suitability_lgbm.pkl"), fallback=MockModel)
+
+async def ensure_hospital_data():
+    """Wait (off the event loop) until the infra table, scorer and spatial index are built"""
+    await run_in_threadpool(hospital_data.get)
+
+# Micro-batchers coalescing concurrent predict() calls into one call per window
+gbm_batcher = batcher_from_env("gbm", lambda: gbm)
+clf_batcher = batcher_from_env("clf", lambda: clf)
+
+async def forecast_next_day_occupancy(positions: np.ndarray = None) -> np.ndarray:
+    """Next-day occupancy per hospital, served from the per-day cache and filled by gbm on a miss"""
+    selected = np.arange(len(candidate_scorer)) if positions is None else positions
+    day = datetime.now().date().toordinal()
+    # Pick up observations recorded by other workers (invalidating their forecasts)
+    await run_in_threadpool(occupancy_feed.sync)
+
+    pred_next_occ, missing, generations = forecast_cache.lookup(selected, day)
+    if missing.any():
+        missing_positions = selected[missing]
+        live_features = occupancy_store.feature_rows(occupancy_rows[missing_positions])
+        forecast = await gbm_batcher.predict(candidate_scorer.next_day_features(live_features, missing_positions))
+        # Rows updated while gbm ran keep missing, so the next request forecasts from the new state
+        forecast_cache.store(missing_positions, day, forecast, generations[missing])
+        pred_next_occ[missing] = forecast
+    return pred_next_occ
+
+async def rank_hospitals(patient: PatientInput, top_k: int, radius_km: float = 0) -> pd.DataFrame:
+    """Score infra hospitals for this patient and return the top_k by suitability"""
+    await ensure_hospital_data()
+    positions = None
+
+    # Narrow to hospitals within the radius before building features or running models
+    if radius_km > 0:
+        positions = hospital_index.query_radius(patient.patient_lat, patient.patient_lon, radius_km)
+        if len(positions) == 0:
+            return pd.DataFrame()
+
+    pred_next_occ = await forecast_next_day_occupancy(positions)
+    candidates = candidate_scorer.candidate_features(
+        patient.patient_lon, patient.patient_lat, patient.severity, pred_next_occ, positions
+    )
+
+    # The tree works on the unit sphere, so re-check the boundary with the exact distances
+    if radius_km > 0:
+        candidates = candidates[candidates['dist_km'] <= radius_km]
+    if candidates.empty:
+        return candidates
+
+    ml_prob = await clf_batcher.predict(candidates[SUITABILITY_FEATURES])
+    return candidate_scorer.rank(candidates, ml_prob, top_k)
 
 # --- The API endpoint using the Router decorator ---
 @router.post("/find_hospital")
-def find_hospital(patient: PatientInput):
+async def find_hospital(patient: PatientInput):
+    await ensure_hospital_data()
     if gbm is None or clf is None or infra is None:
         return {"error": "Models or data not loaded."}, 500
-        
-    req_icu = True if patient.severity >= 4 else False
-    
-    # Simulating real-time data for the prediction logic
-    latest_rows_data = infra.copy()
-    latest_rows_data['occupied'] = np.random.randint(10, 80, size=len(latest_rows_data))
-    
-    X_live = pd.DataFrame({
-        'occ_lag1': latest_rows_data['occupied'],
-        'occ_lag7': latest_rows_data['occupied'].shift(7).fillna(latest_rows_data['occupied'] * 0.95),
-        'occ_roll7': latest_rows_data['occupied'].rolling(window=7, min_periods=1).mean().shift(1).fillna(0),
-        'adm_roll7': np.random.uniform(0, 10, size=len(infra)),
-        'adm_lag1': np.random.uniform(0, 10, size=len(infra)),
-        'dis_lag1': np.random.uniform(0, 10, size=len(infra)),
-        'dow': pd.to_datetime('today').dayofweek,
-        'total_beds': infra['total_beds']
-    })
-    
-    features = ['occ_lag1','occ_lag7','occ_roll7','adm_roll7','adm_lag1','dis_lag1','dow','total_beds']
-    X_live = X_live[features].fillna(0)
-    
-    pred_next_occ = gbm.predict(X_live)
-    latest_rows_data['pred_next_occupied'] = pred_next_occ
-    latest_rows_data['pred_beds_available'] = latest_rows_data['total_beds'] - latest_rows_data['pred_next_occupied']
-    latest_rows_data['staffed_rate'] = np.random.uniform(0.8,1.2,size=len(latest_rows_data))
-    latest_rows_data['wait_time_est'] = latest_rows_data['pred_next_occupied'] / (latest_rows_data['total_beds'] * latest_rows_data['staffed_rate'] + 1e-6)
-    
-    rows = []
-    for idx, h in latest_rows_data.iterrows():
-        dist = haversine(patient.patient_lon, patient.patient_lat, h['longitude'], h['latitude'])
-        
-        suit_features_dict = {
-            "dist_km": dist,
-            "pred_beds_available": max(0, h['pred_beds_available']),
-            "wait_time_est": h['wait_time_est'],
-            "severity": patient.severity,
-            "req_icu": int(req_icu),
-            "hospital_total_beds": h['total_beds'],
-            "hospital_icu_beds": h['icu_beds']
-        }
-        rows.append(suit_features_dict)
 
-    candidates_df = pd.DataFrame(rows)
-    
-    suit_features = ['dist_km','pred_beds_available','wait_time_est','severity','req_icu','hospital_total_beds','hospital_icu_beds']
-    candidates_df['ml_prob'] = clf.predict(candidates_df[suit_features])
-    
-    ranked_hospitals = candidates_df.sort_values('ml_prob', ascending=False).head(5)
-    
+    ranked_hospitals = await rank_hospitals(patient, top_k=5)
+
     output = []
-    for _, row in ranked_hospitals.iterrows():
-        hospital_info = infra.loc[row.name]
+    for row in ranked_hospitals.to_dict('records'):
         output.append({
-            "hospital_name": hospital_info['facility_name'],
+            "hospital_name": row['facility_name'],
             "distance_km": round(row['dist_km'], 2),
             "predicted_beds_available": int(max(0, round(row['pred_beds_available']))),
             "suitability_score": round(row['ml_prob'], 3),
-            "hospital_latitude": hospital_info['latitude'],
-            "hospital_longitude": hospital_info['longitude']
+            "hospital_latitude": row['latitude'],
+            "hospital_longitude": row['longitude']
         })
     
     return output
 
+@router.get("/inference/metrics")
+def get_inference_metrics():
+    """Micro-batching and forecast cache metrics for the occupancy (gbm) and suitability (clf) models"""
+    return {
+        "gbm": gbm_batcher.metrics(),
+        "clf": clf_batcher.metrics(),
+        "forecast_cache": forecast_cache.stats() if forecast_cache is not None else None
+    }
+
+@router.get("/models/status")
+def get_models_status():
+    """Load state, source (artifact cache, fresh conversion or fallback) and load timings of the hospital models"""
+    return {
+        "gbm": gbm.status(),
+        "clf": clf.status(),
+        "infra": hospital_data.status(),
+        "infra_source": ("mock" if infra_is_mock else "artifact") if hospital_data.loaded else None,
+        "artifact_dir": artifact_store.root
+    }
+
+@router.get("/llm/cache-stats")
+def get_llm_cache_stats():
+    """Hit/miss counters of the Gemini ranking response cache"""
+    response_cache = getattr(gemini_service, "response_cache", None)
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@router.get("/llm/prompt-stats")
+def get_llm_prompt_stats():
+    """Prompt size per request (estimated tokens) against the configured budget"""
+    if not hasattr(gemini_service, "get_prompt_stats"):
+        return {"enabled": False}
+    return {"enabled": True, **gemini_service.get_prompt_stats()}
+
 # --- Enhanced Intelligent Hospital Ranking Endpoint ---
+_budget_env = os.getenv("LLM_LATENCY_BUDGET_MS")
+DEFAULT_LLM_LATENCY_BUDGET_MS = int(_budget_env) if _budget_env else None
+
+# LLM calls that outlived their request's budget; referenced here so they are not garbage collected
+_background_llm_calls = set()
+
+def _keep_in_background(task: asyncio.Future):
+    _background_llm_calls.add(task)
+    task.add_done_callback(_background_llm_calls.discard)
+
+def _llm_served_by(llm_result: Dict[str, Any]) -> str:
+    """Which path produced an LLM service result"""
+    if llm_result.get('model_used') != 'gemini-pro':
+        return "ml_fallback"
+    return {"hit": "llm_cache", "coalesced": "llm_coalesced"}.get(llm_result.get('cache_status'), "llm")
+
+async def prepare_llm_inputs(request: IntelligentHospitalRankingInput):
+    """Run the ML ranking and collect everything the LLM needs for an intelligent ranking request"""
+    patient = request.patient_info
+    ambulance_location = request.ambulance_location
+    
+    # Step 1: Get ML model rankings (same as find_hospital)
+    ranked_hospitals = await rank_hospitals(patient, top_k=request.max_hospitals, radius_km=request.radius_km)
+    
+    if ranked_hospitals.empty:
+        raise HTTPException(status_code=404, detail="No hospitals found within specified radius")
+    
+    # Step 2: Format ML rankings for LLM
+    ml_rankings = []
+    for hospital_id, row in zip(ranked_hospitals.index, ranked_hospitals.to_dict('records')):
+        ml_rankings.append({
+            "hospital_name": row['facility_name'],
+            "hospital_id": str(hospital_id),
+            "distance_km": round(row['dist_km'], 2),
+            "predicted_beds_available": int(max(0, round(row['pred_beds_available']))),
+            "suitability_score": round(row['ml_prob'], 3),
+            "hospital_latitude": row['latitude'],
+            "hospital_longitude": row['longitude'],
+            "total_beds": int(row['total_beds']),
+            "icu_beds": int(row['icu_beds']),
+            "wait_time_estimate": round(row['wait_time_est'], 2)
+        })
+    
+    # Step 3: Gather live hospital data if requested
+    if request.include_live_data:
+        live_hospital_data = await run_in_threadpool(live_data_for, ml_rankings)
+    else:
+        live_hospital_data = {"hospitals": [], "doctors": [], "patients": []}
+    
+    # Step 4: Prepare ambulance location and patient info for LLM
+    ambulance_location_dict = {
+        "lat": ambulance_location.lat,
+        "lon": ambulance_location.lon
+    }
+    
+    patient_info_dict = {
+        "patient_lat": patient.patient_lat,
+        "patient_lon": patient.patient_lon,
+        "severity": patient.severity
+    }
+    
+    return ml_rankings, live_hospital_data, ambulance_location_dict, patient_info_dict
+
+def format_hospital_ranking(hospital_ranking: Dict[str, Any]) -> HospitalRankingResponse:
+    """Normalize one LLM ranking entry to the response model"""
+    return HospitalRankingResponse(
+        rank=hospital_ranking.get('rank', 0),
+        hospital_name=hospital_ranking.get('hospital_name', 'Unknown Hospital'),
+        hospital_id=hospital_ranking.get('hospital_id', 'unknown'),
+        distance_km=hospital_ranking.get('distance_km', 0.0),
+        ml_suitability_score=hospital_ranking.get('ml_suitability_score', 0.0),
+        real_time_score=hospital_ranking.get('real_time_score', 0.0),
+        final_score=hospital_ranking.get('final_score', 0.0),
+        reasoning=hospital_ranking.get('reasoning', 'No reasoning provided'),
+        estimated_wait_time_minutes=hospital_ranking.get('estimated_wait_time_minutes', 0),
+        bed_availability_status=hospital_ranking.get('bed_availability_status', 'Unknown'),
+        icu_availability=hospital_ranking.get('icu_availability', 'Unknown'),
+        specialist_match=hospital_ranking.get('specialist_match', 'Unknown'),
+        risk_level=hospital_ranking.get('risk_level', 'Medium')
+    )
+
 @router.post("/find_hospital_intelligent", response_model=IntelligentRankingResponse)
 async def find_hospital_intelligent(request: IntelligentHospitalRankingInput):
     """Find hospitals using ML model + live data + Gemini LLM analysis"""
+    started = time.perf_counter()
     try:
         # Models and data should now be loaded (either real or mock)
         print(f"🔍 Processing intelligent hospital ranking request...")
         print(f"Models status: gbm={gbm is not None}, clf={clf is not None}, infra={infra is not None}")
         
-        patient = request.patient_info
-        ambulance_location = request.ambulance_location
-        
-        # Step 1: Get ML model rankings (same as find_hospital)
-        req_icu = True if patient.severity >= 4 else False
-        
-        # Simulating real-time data for the prediction logic
-        latest_rows_data = infra.copy()
-        latest_rows_data['occupied'] = np.random.randint(10, 80, size=len(latest_rows_data))
-        
-        X_live = pd.DataFrame({
-            'occ_lag1': latest_rows_data['occupied'],
-            'occ_lag7': latest_rows_data['occupied'].shift(7).fillna(latest_rows_data['occupied'] * 0.95),
-            'occ_roll7': latest_rows_data['occupied'].rolling(window=7, min_periods=1).mean().shift(1).fillna(0),
-            'adm_roll7': np.random.uniform(0, 10, size=len(infra)),
-            'adm_lag1': np.random.uniform(0, 10, size=len(infra)),
-            'dis_lag1': np.random.uniform(0, 10, size=len(infra)),
-            'dow': pd.to_datetime('today').dayofweek,
-            'total_beds': infra['total_beds']
-        })
-        
-        features = ['occ_lag1','occ_lag7','occ_roll7','adm_roll7','adm_lag1','dis_lag1','dow','total_beds']
-        X_live = X_live[features].fillna(0)
-        
-        pred_next_occ = gbm.predict(X_live)
-        latest_rows_data['pred_next_occupied'] = pred_next_occ
-        latest_rows_data['pred_beds_available'] = latest_rows_data['total_beds'] - latest_rows_data['pred_next_occupied']
-        latest_rows_data['staffed_rate'] = np.random.uniform(0.8,1.2,size=len(latest_rows_data))
-        latest_rows_data['wait_time_est'] = latest_rows_data['pred_next_occupied'] / (latest_rows_data['total_beds'] * latest_rows_data['staffed_rate'] + 1e-6)
-        
-        rows = []
-        for idx, h in latest_rows_data.iterrows():
-            dist = haversine(patient.patient_lon, patient.patient_lat, h['longitude'], h['latitude'])
-            
-            # Filter by radius if specified
-            if request.radius_km > 0 and dist > request.radius_km:
-                continue
-                
-            suit_features_dict = {
-                "dist_km": dist,
-                "pred_beds_available": max(0, h['pred_beds_available']),
-                "wait_time_est": h['wait_time_est'],
-                "severity": patient.severity,
-                "req_icu": int(req_icu),
-                "hospital_total_beds": h['total_beds'],
-                "hospital_icu_beds": h['icu_beds']
-            }
-            rows.append(suit_features_dict)
-
-        candidates_df = pd.DataFrame(rows)
-        
-        if candidates_df.empty:
-            raise HTTPException(status_code=404, detail="No hospitals found within specified radius")
-        
-        suit_features = ['dist_km','pred_beds_available','wait_time_est','severity','req_icu','hospital_total_beds','hospital_icu_beds']
-        candidates_df['ml_prob'] = clf.predict(candidates_df[suit_features])
-        
-        ranked_hospitals = candidates_df.sort_values('ml_prob', ascending=False).head(request.max_hospitals)
-        
-        # Step 2: Format ML rankings for LLM
-        ml_rankings = []
-        for _, row in ranked_hospitals.iterrows():
-            hospital_info = infra.loc[row.name]
-            ml_rankings.append({
-                "hospital_name": hospital_info['facility_name'],
-                "hospital_id": str(row.name),
-                "distance_km": round(row['dist_km'], 2),
-                "predicted_beds_available": int(max(0, round(row['pred_beds_available']))),
-                "suitability_score": round(row['ml_prob'], 3),
-                "hospital_latitude": hospital_info['latitude'],
-                "hospital_longitude": hospital_info['longitude'],
-                "total_beds": int(hospital_info['total_beds']),
-                "icu_beds": int(hospital_info['icu_beds']),
-                "wait_time_estimate": round(row['wait_time_est'], 2)
-            })
+        # Steps 1-4: ML ranking, live data, ambulance and patient info
+        ml_rankings, live_hospital_data, ambulance_location_dict, patient_info_dict = await prepare_llm_inputs(request)
         
-        # Step 3: Gather live hospital data if requested
-        live_hospital_data = {
-            "hospitals": list(hospitals_db.values()) if request.include_live_data else [],
-            "doctors": list(doctors_db.values()) if request.include_live_data else [],
-            "patients": list(patients_db.values()) if request.include_live_data else []
-        }
-        
-        # Step 4: Prepare ambulance location and patient info for LLM
-        ambulance_location_dict = {
-            "lat": ambulance_location.lat,
-            "lon": ambulance_location.lon
-        }
-        
-        patient_info_dict = {
-            "patient_lat": patient.patient_lat,
-            "patient_lon": patient.patient_lon,
-            "severity": patient.severity
-        }
-        
-        # Step 5: Get intelligent ranking from Gemini LLM
-        llm_result = await gemini_service.get_intelligent_hospital_ranking(
+        # Step 5: Get intelligent ranking from Gemini LLM within the latency budget
+        llm_call = asyncio.ensure_future(gemini_service.get_intelligent_hospital_ranking(
             ml_rankings=ml_rankings,
             live_hospital_data=live_hospital_data,
             ambulance_location=ambulance_location_dict,
             patient_info=patient_info_dict
-        )
+        ))
+        budget_ms = request.latency_budget_ms if request.latency_budget_ms is not None else DEFAULT_LLM_LATENCY_BUDGET_MS
+        try:
+            if budget_ms is not None and budget_ms > 0:
+                llm_result = await asyncio.wait_for(asyncio.shield(llm_call), timeout=budget_ms / 1000)
+            else:
+                llm_result = await llm_call
+            served_by = _llm_served_by(llm_result)
+        except asyncio.TimeoutError:
+            # Answer with the ML ranking now; the LLM call finishes in the background and fills the cache
+            _keep_in_background(llm_call)
+            llm_result = gemini_service.create_ml_only_response(
+                ml_rankings, f"LLM latency budget of {budget_ms} ms exceeded"
+            )
+            served_by = "ml_fast_path"
         
         # Step 6: Format response according to Pydantic model
-        formatted_rankings = []
-        for hospital_ranking in llm_result.get('final_ranking', []):
-            formatted_rankings.append(HospitalRankingResponse(
-                rank=hospital_ranking.get('rank', 0),
-                hospital_name=hospital_ranking.get('hospital_name', 'Unknown Hospital'),
-                hospital_id=hospital_ranking.get('hospital_id', 'unknown'),
-                distance_km=hospital_ranking.get('distance_km', 0.0),
-                ml_suitability_score=hospital_ranking.get('ml_suitability_score', 0.0),
-                real_time_score=hospital_ranking.get('real_time_score', 0.0),
-                final_score=hospital_ranking.get('final_score', 0.0),
-                reasoning=hospital_ranking.get('reasoning', 'No reasoning provided'),
-                estimated_wait_time_minutes=hospital_ranking.get('estimated_wait_time_minutes', 0),
-                bed_availability_status=hospital_ranking.get('bed_availability_status', 'Unknown'),
-                icu_availability=hospital_ranking.get('icu_availability', 'Unknown'),
-                specialist_match=hospital_ranking.get('specialist_match', 'Unknown'),
-                risk_level=hospital_ranking.get('risk_level', 'Medium')
-            ))
+        formatted_rankings = [format_hospital_ranking(entry) for entry in llm_result.get('final_ranking', [])]
         
         return IntelligentRankingResponse(
             final_ranking=formatted_rankings,
@@ -470,7 +588,10 @@ async def find_hospital_intelligent(request: IntelligentHospitalRankingInput):
             recommendations=llm_result.get('recommendations', {}),
             overall_assessment=llm_result.get('overall_assessment', 'Analysis completed'),
             analysis_timestamp=llm_result.get('analysis_timestamp', datetime.now().isoformat()),
-            model_used=llm_result.get('model_used', 'gemini-pro')
+            model_used=llm_result.get('model_used', 'gemini-pro'),
+            served_by=served_by,
+            prompt_stats=llm_result.get('prompt_stats', {}),
+            latency_ms=round((time.perf_counter() - started) * 1000, 2)
         )
         
     except HTTPException:
@@ -479,20 +600,81 @@ async def find_hospital_intelligent(request: IntelligentHospitalRankingInput):
         print(f"Error in intelligent hospital ranking: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-# --- In-memory storage for demo purposes (in production, use a database) ---
-hospitals_db = {}
-doctors_db = {}
-patients_db = {}
+def _sse(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/find_hospital_intelligent/stream")
+async def find_hospital_intelligent_stream(request: IntelligentHospitalRankingInput):
+    """
+    Server-sent events version of find_hospital_intelligent.
+    Emits the ML ranking first, then one "ranking" event per hospital as soon as the
+    LLM has produced it, and a final "complete" event with the rest of the analysis.
+    """
+    started = time.perf_counter()
+    # Resolve the ML ranking before streaming starts so a 404 is still a normal HTTP error
+    ml_rankings, live_hospital_data, ambulance_location_dict, patient_info_dict = await prepare_llm_inputs(request)
+
+    async def events():
+        yield _sse("ml_ranking", {"ml_rankings": ml_rankings})
+        try:
+            async for event in gemini_service.stream_intelligent_hospital_ranking(
+                ml_rankings=ml_rankings,
+                live_hospital_data=live_hospital_data,
+                ambulance_location=ambulance_location_dict,
+                patient_info=patient_info_dict
+            ):
+                if event["event"] == "ranking":
+                    yield _sse("ranking", format_hospital_ranking(event["data"]).dict())
+                elif event["event"] == "complete":
+                    result = event["data"]
+                    yield _sse("complete", {
+                        "critical_factors": result.get('critical_factors', []),
+                        "recommendations": result.get('recommendations', {}),
+                        "overall_assessment": result.get('overall_assessment', 'Analysis completed'),
+                        "analysis_timestamp": result.get('analysis_timestamp', datetime.now().isoformat()),
+                        "model_used": result.get('model_used', 'gemini-pro'),
+                        "served_by": _llm_served_by(result),
+                        "prompt_stats": result.get('prompt_stats', {}),
+                        "latency_ms": round((time.perf_counter() - started) * 1000, 2)
+                    })
+                else:
+                    yield _sse(event["event"], event["data"])
+        except Exception as e:
+            print(f"Error in intelligent hospital ranking stream: {e}")
+            yield _sse("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Shared storage (in-process or SQLite, see state_backend.py) so every worker sees the same data ---
+hospitals_db = state_backend.collection("hospitals")
+# Live hospitals are linked to infra rows by infra_id or normalized name (see live_data_for)
+for field in ("infra_id", "name_key"):
+    hospitals_db.create_index(field)
+# Hash indexes on the fields the lookup and dashboard endpoints filter on
+doctors_db = state_backend.collection("doctors")
+for field in ("hospital_id", "status", "specialization"):
+    doctors_db.create_index(field)
+patients_db = state_backend.collection("patients")
+for field in ("status", "assigned_hospital"):
+    patients_db.create_index(field)
 
 # --- Hospital Management Endpoints ---
 @router.post("/hospitals")
 def create_hospital(hospital: HospitalInput):
     """Create a new hospital entry"""
-    hospitals_db[hospital.hospital_id] = {
+    if hospital.infra_id is not None and infra_id_for(hospital.dict()) is None:
+        raise HTTPException(status_code=422, detail=f"No infra hospital with id {hospital.infra_id}")
+    hospitals_db.put(hospital.hospital_id, {
         **hospital.dict(),
+        "name_key": name_key(hospital.name),
         "created_at": datetime.now().isoformat(),
         "last_updated": datetime.now().isoformat()
-    }
+    })
     return {"message": "Hospital created successfully", "hospital_id": hospital.hospital_id}
 
 @router.get("/hospitals")
@@ -503,41 +685,58 @@ def get_all_hospitals():
 @router.get("/hospitals/{hospital_id}")
 def get_hospital(hospital_id: str):
     """Get specific hospital details"""
-    if hospital_id not in hospitals_db:
+    hospital = hospitals_db.get(hospital_id)
+    if hospital is None:
         raise HTTPException(status_code=404, detail="Hospital not found")
-    return hospitals_db[hospital_id]
+    return hospital
 
 @router.put("/hospitals/{hospital_id}")
 def update_hospital(hospital_id: str, update_data: HospitalUpdateInput):
     """Update hospital availability"""
-    if hospital_id not in hospitals_db:
+    hospital = hospitals_db.get(hospital_id)
+    if hospital is None:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
-    hospitals_db[hospital_id].update({
-        **update_data.dict(),
+    previous_occupancy = hospital.get("current_occupancy")
+    if hospitals_db.update(hospital_id, {
+        # Admissions/discharges are per-update counts for the time series, not hospital state
+        **update_data.dict(exclude={"admissions", "discharges"}),
         "last_updated": datetime.now().isoformat()
-    })
-    return {"message": "Hospital updated successfully"}
+    }) is None:
+        raise HTTPException(status_code=404, detail="Hospital not found")
+
+    # The ranking models only know infra hospitals, so live data is fed under the matching infra row
+    infra_id = infra_id_for(hospital)
+    if infra_id is None:
+        print(f"⚠️ Hospital {hospital_id} matches no infra row, live occupancy not recorded")
+        return {"message": "Hospital updated successfully", "live_occupancy_recorded": False}
+
+    # Feed the live time series; without explicit counts, the occupancy change stands in for them
+    change = update_data.current_occupancy - previous_occupancy if previous_occupancy is not None else 0
+    admissions = update_data.admissions if update_data.admissions is not None else max(change, 0)
+    discharges = update_data.discharges if update_data.discharges is not None else max(-change, 0)
+    # Applying the observation (here and in every other worker) invalidates the next-day forecast
+    occupancy_feed.record(infra_id, update_data.current_occupancy, admissions, discharges)
+    return {"message": "Hospital updated successfully", "live_occupancy_recorded": True}
 
 @router.delete("/hospitals/{hospital_id}")
 def delete_hospital(hospital_id: str):
     """Delete a hospital"""
-    if hospital_id not in hospitals_db:
+    if not hospitals_db.delete(hospital_id):
         raise HTTPException(status_code=404, detail="Hospital not found")
-    
-    del hospitals_db[hospital_id]
+
     return {"message": "Hospital deleted successfully"}
 
 # --- Doctor Management Endpoints ---
 @router.post("/doctors")
 def create_doctor(doctor: DoctorInput):
     """Create a new doctor entry"""
-    doctors_db[doctor.doctor_id] = {
+    doctors_db.put(doctor.doctor_id, {
         **doctor.dict(),
         "created_at": datetime.now().isoformat(),
         "last_updated": datetime.now().isoformat(),
         "status": "available"
-    }
+    })
     return {"message": "Doctor created successfully", "doctor_id": doctor.doctor_id}
 
 @router.get("/doctors")
@@ -548,24 +747,24 @@ def get_all_doctors():
 @router.get("/doctors/{doctor_id}")
 def get_doctor(doctor_id: str):
     """Get specific doctor details"""
-    if doctor_id not in doctors_db:
+    doctor = doctors_db.get(doctor_id)
+    if doctor is None:
         raise HTTPException(status_code=404, detail="Doctor not found")
-    return doctors_db[doctor_id]
+    return doctor
 
 @router.get("/doctors/hospital/{hospital_id}")
 def get_doctors_by_hospital(hospital_id: str):
     """Get all doctors in a specific hospital"""
-    hospital_doctors = [doc for doc in doctors_db.values() if doc["hospital_id"] == hospital_id]
-    return {"doctors": hospital_doctors}
+    return {"doctors": doctors_db.find("hospital_id", hospital_id)}
 
 @router.put("/doctors/{doctor_id}/availability")
 def update_doctor_availability(doctor_id: str, available_hours: List[str]):
     """Update doctor's available hours"""
-    if doctor_id not in doctors_db:
+    if doctors_db.update(doctor_id, {
+        "available_hours": available_hours,
+        "last_updated": datetime.now().isoformat()
+    }) is None:
         raise HTTPException(status_code=404, detail="Doctor not found")
-    
-    doctors_db[doctor_id]["available_hours"] = available_hours
-    doctors_db[doctor_id]["last_updated"] = datetime.now().isoformat()
     return {"message": "Doctor availability updated successfully"}
 
 @router.put("/doctors/{doctor_id}/status")
@@ -578,23 +777,27 @@ def update_doctor_status(doctor_id: str, status: str):
     if status not in valid_statuses:
         raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
     
-    doctors_db[doctor_id]["status"] = status
-    doctors_db[doctor_id]["last_updated"] = datetime.now().isoformat()
+    if doctors_db.update(doctor_id, {
+        "status": status,
+        "last_updated": datetime.now().isoformat()
+    }) is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
     return {"message": "Doctor status updated successfully"}
 
 # --- Patient Management Endpoints ---
 @router.post("/patients")
 def create_patient(patient: PatientInput):
     """Create a new patient entry"""
-    patient_id = f"P{len(patients_db) + 1:06d}"
-    patients_db[patient_id] = {
+    # Numbered from a shared counter so concurrent workers never hand out the same ID
+    patient_id = f"P{state_backend.incr('patient_id'):06d}"
+    patients_db.put(patient_id, {
         **patient.dict(),
         "patient_id": patient_id,
         "created_at": datetime.now().isoformat(),
         "status": "waiting",
         "assigned_hospital": None,
         "assigned_doctor": None
-    }
+    })
     return {"message": "Patient created successfully", "patient_id": patient_id}
 
 @router.get("/patients")
@@ -605,38 +808,63 @@ def get_all_patients():
 @router.get("/patients/{patient_id}")
 def get_patient(patient_id: str):
     """Get specific patient details"""
-    if patient_id not in patients_db:
+    patient = patients_db.get(patient_id)
+    if patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return patients_db[patient_id]
+    return patient
 
 # --- Analytics and Dashboard Endpoints ---
+# Updated by each write instead of recomputed on every dashboard poll
+dashboard_totals = RunningTotals(state_backend, {
+    "total_hospitals": ("hospitals", count_all),
+    "available_beds": ("hospitals", field_sum("available_beds")),
+    "total_beds": ("hospitals", field_sum("total_beds")),
+    "total_doctors": ("doctors", count_all),
+    "available_doctors": ("doctors", count_where("status", "available")),
+    "busy_doctors": ("doctors", count_where("status", "busy")),
+    "total_patients": ("patients", count_all),
+    "waiting_patients": ("patients", count_where("status", "waiting")),
+})
+
 @router.get("/dashboard/stats")
-def get_dashboard_stats():
-    """Get dashboard statistics"""
-    total_hospitals = len(hospitals_db)
-    total_doctors = len(doctors_db)
-    total_patients = len(patients_db)
-    
-    available_beds = sum(h["available_beds"] for h in hospitals_db.values())
-    total_beds = sum(h["total_beds"] for h in hospitals_db.values())
-    occupancy_rate = ((total_beds - available_beds) / total_beds * 100) if total_beds > 0 else 0
-    
-    available_doctors = len([d for d in doctors_db.values() if d["status"] == "available"])
-    busy_doctors = len([d for d in doctors_db.values() if d["status"] == "busy"])
-    
-    waiting_patients = len([p for p in patients_db.values() if p["status"] == "waiting"])
-    
-    return {
-        "total_hospitals": total_hospitals,
-        "total_doctors": total_doctors,
-        "total_patients": total_patients,
-        "available_beds": available_beds,
-        "total_beds": total_beds,
-        "occupancy_rate": round(occupancy_rate, 2),
-        "available_doctors": available_doctors,
-        "busy_doctors": busy_doctors,
-        "waiting_patients": waiting_patients
-    }
+def get_dashboard_stats(request: Request):
+    """Get dashboard statistics (304 when If-None-Match has the current ETag)"""
+    totals, digest = dashboard_totals.snapshot()
+
+    def build():
+        total_beds = totals["total_beds"]
+        available_beds = totals["available_beds"]
+        occupancy_rate = ((total_beds - available_beds) / total_beds * 100) if total_beds > 0 else 0
+        return {
+            "total_hospitals": totals["total_hospitals"],
+            "total_doctors": totals["total_doctors"],
+            "total_patients": totals["total_patients"],
+            "available_beds": available_beds,
+            "total_beds": total_beds,
+            "occupancy_rate": round(occupancy_rate, 2),
+            "available_doctors": totals["available_doctors"],
+            "busy_doctors": totals["busy_doctors"],
+            "waiting_patients": totals["waiting_patients"]
+        }
+
+    return conditional_response(request, digest, build)
+
+# Pushes coalesced hospital/doctor/patient deltas and dashboard totals instead of clients polling
+live_dashboard = live_channel_from_env("hospital", state_backend, ["hospitals", "doctors", "patients"], dashboard_totals)
+
+@router.websocket("/dashboard/live")
+async def dashboard_live(websocket: WebSocket):
+    """Live dashboard over WebSocket: a snapshot of the totals, then one delta event per tick with changes"""
+    await serve_websocket(websocket, live_dashboard)
+
+@router.get("/dashboard/events")
+async def dashboard_events():
+    """Live dashboard as server-sent events (same events as /dashboard/live)"""
+    return sse_response(live_dashboard)
+
+@router.get("/dashboard/live/stats")
+def dashboard_live_stats():
+    return live_dashboard.stats()
 
 @router.get("/dashboard/occupancy-trends")
 def get_occupancy_trends():
@@ -660,43 +888,47 @@ def get_occupancy_trends():
 @router.get("/dashboard/specialty-distribution")
 def get_specialty_distribution():
     """Get doctor distribution by specialty"""
-    specialty_count = {}
-    for doctor in doctors_db.values():
-        specialty = doctor["specialization"]
-        specialty_count[specialty] = specialty_count.get(specialty, 0) + 1
-    
+    specialty_count = doctors_db.value_counts("specialization")
     return {
         "specialties": list(specialty_count.keys()),
         "counts": list(specialty_count.values())
     }
 
 # --- Role-specific profile management ---
-user_profiles_db = {}  # Store role-specific user profiles
+user_profiles_db = state_backend.collection("user_profiles").create_index("role")  # Store role-specific user profiles
+# Grid index per role for the nearby/search endpoints, following user_profiles_db through the change feed
+profile_index = profile_index_from_env(user_profiles_db)
+# Item-name n-gram/token index over warehouse inventories, for search-inventory
+inventory_index = InventoryIndex(user_profiles_db)
+NEARBY_LIMIT = Query(100, ge=1, le=1000)
 
 @router.post("/profiles/update")
 def update_user_profile(profile_update: UserProfileUpdate):
     """Update user profile with role-specific data"""
-    user_profiles_db[profile_update.user_id] = {
+    profile = {
         "user_id": profile_update.user_id,
         "role": profile_update.role,
         "profile_data": profile_update.profile_data,
         "created_at": datetime.now().isoformat(),
         "last_updated": datetime.now().isoformat()
     }
+    user_profiles_db.put(profile_update.user_id, profile)
+    profile_index.upsert(profile_update.user_id, profile)
+    inventory_index.upsert(profile_update.user_id, profile)
     return {"message": "Profile updated successfully", "user_id": profile_update.user_id}
 
 @router.get("/profiles/{user_id}")
 def get_user_profile(user_id: str):
     """Get user profile by ID"""
-    if user_id not in user_profiles_db:
+    profile = user_profiles_db.get(user_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return user_profiles_db[user_id]
+    return profile
 
 @router.get("/profiles/role/{role}")
 def get_profiles_by_role(role: str):
     """Get all profiles by role"""
-    role_profiles = [profile for profile in user_profiles_db.values() if profile["role"] == role]
-    return {"profiles": role_profiles}
+    return {"profiles": user_profiles_db.find("role", role)}
 
 # Role-specific endpoints
 @router.post("/ambulance/update-status")
@@ -711,21 +943,13 @@ def update_farmer_crops(farmer_data: FarmerInput):
     return {"message": "Farmer crops updated", "data": farmer_data.dict()}
 
 @router.get("/farmer/nearby")
-def get_nearby_farmers(lat: float, lon: float, radius_km: float = 10.0):
-    """Get farmers within specified radius"""
-    nearby_farmers = []
-    for profile in user_profiles_db.values():
-        if profile["role"] == "farmer":
-            farmer_data = profile["profile_data"]
-            if "location_lat" in farmer_data and "location_lon" in farmer_data:
-                distance = haversine(lon, lat, farmer_data["location_lon"], farmer_data["location_lat"])
-                if distance <= radius_km:
-                    nearby_farmers.append({
-                        **profile,
-                        "distance_km": round(distance, 2)
-                    })
-    
-    return {"farmers": sorted(nearby_farmers, key=lambda x: x["distance_km"])}
+def get_nearby_farmers(lat: float, lon: float, radius_km: float = 10.0, limit: int = NEARBY_LIMIT):
+    """Get farmers within specified radius, nearest first"""
+    nearby_farmers = [
+        {**profile, "distance_km": round(distance, 2)}
+        for distance, profile in profile_index.nearby("farmer", lat, lon, radius_km, limit)
+    ]
+    return {"farmers": nearby_farmers}
 
 @router.post("/logistics/update-availability")
 def update_logistics_availability(logistics_data: LogisticsDriverInput):
@@ -733,23 +957,16 @@ def update_logistics_availability(logistics_data: LogisticsDriverInput):
     return {"message": "Logistics availability updated", "data": logistics_data.dict()}
 
 @router.get("/logistics/nearby")
-def get_nearby_logistics_drivers(lat: float, lon: float, radius_km: float = 50.0):
-    """Get available logistics drivers within specified radius"""
-    nearby_drivers = []
-    for profile in user_profiles_db.values():
-        if profile["role"] == "logistics_driver":
-            driver_data = profile["profile_data"]
-            if ("current_location_lat" in driver_data and 
-                "current_location_lon" in driver_data and
-                driver_data.get("availability_status") == "available"):
-                distance = haversine(lon, lat, driver_data["current_location_lon"], driver_data["current_location_lat"])
-                if distance <= radius_km:
-                    nearby_drivers.append({
-                        **profile,
-                        "distance_km": round(distance, 2)
-                    })
-    
-    return {"drivers": sorted(nearby_drivers, key=lambda x: x["distance_km"])}
+def get_nearby_logistics_drivers(lat: float, lon: float, radius_km: float = 50.0, limit: int = NEARBY_LIMIT):
+    """Get available logistics drivers within specified radius, nearest first"""
+    def is_available(profile):
+        return profile["profile_data"].get("availability_status") == "available"
+
+    nearby_drivers = [
+        {**profile, "distance_km": round(distance, 2)}
+        for distance, profile in profile_index.nearby("logistics_driver", lat, lon, radius_km, limit, where=is_available)
+    ]
+    return {"drivers": nearby_drivers}
 
 @router.post("/shelter/update-capacity")
 def update_shelter_capacity(shelter_data: ShelterManagerInput):
@@ -757,59 +974,71 @@ def update_shelter_capacity(shelter_data: ShelterManagerInput):
     return {"message": "Shelter capacity updated", "data": shelter_data.dict()}
 
 @router.get("/shelter/available")
-def get_available_shelters(lat: float = None, lon: float = None, radius_km: float = 25.0):
-    """Get available shelters, optionally filtered by location"""
-    available_shelters = []
-    for profile in user_profiles_db.values():
-        if profile["role"] == "shelter_manager":
-            shelter_data = profile["profile_data"]
-            if shelter_data.get("available_capacity", 0) > 0:
-                shelter_info = {**profile}
-                if lat and lon and "location_lat" in shelter_data and "location_lon" in shelter_data:
-                    distance = haversine(lon, lat, shelter_data["location_lon"], shelter_data["location_lat"])
-                    if distance <= radius_km:
-                        shelter_info["distance_km"] = round(distance, 2)
-                        available_shelters.append(shelter_info)
-                else:
-                    available_shelters.append(shelter_info)
-    
-    if lat and lon:
-        available_shelters = sorted(available_shelters, key=lambda x: x.get("distance_km", float('inf')))
-    
-    return {"shelters": available_shelters}
+def get_available_shelters(lat: float = None, lon: float = None, radius_km: float = 25.0, limit: int = NEARBY_LIMIT):
+    """Get available shelters, optionally filtered by location (nearest first, then shelters without a location)"""
+    def has_capacity(profile):
+        return profile["profile_data"].get("available_capacity", 0) > 0
+
+    if not (lat and lon):
+        return {"shelters": profile_index.members("shelter_manager", where=has_capacity)[:limit]}
+
+    available_shelters = [
+        {**profile, "distance_km": round(distance, 2)}
+        for distance, profile in profile_index.nearby("shelter_manager", lat, lon, radius_km, limit, where=has_capacity)
+    ]
+    if len(available_shelters) < limit:
+        available_shelters += profile_index.members("shelter_manager", where=has_capacity, located=False)
+    return {"shelters": available_shelters[:limit]}
 
 @router.post("/warehouse/update-inventory")
 def update_warehouse_inventory(warehouse_data: WarehouseManagerInput):
-    """Update warehouse inventory and capacity"""
+    """Update warehouse inventory and capacity; with a user_id it is saved on that warehouse's profile"""
+    if warehouse_data.user_id is not None:
+        existing = user_profiles_db.get(warehouse_data.user_id) or {}
+        if existing.get("role", "warehouse_manager") != "warehouse_manager":
+            raise HTTPException(status_code=409, detail="Profile belongs to a different role")
+        now = datetime.now().isoformat()
+        profile = {
+            "user_id": warehouse_data.user_id,
+            "role": "warehouse_manager",
+            "profile_data": {**existing.get("profile_data", {}), **warehouse_data.dict(exclude={"user_id"})},
+            "created_at": existing.get("created_at", now),
+            "last_updated": now
+        }
+        user_profiles_db.put(warehouse_data.user_id, profile)
+        profile_index.upsert(warehouse_data.user_id, profile)
+        inventory_index.upsert(warehouse_data.user_id, profile)
     return {"message": "Warehouse inventory updated", "data": warehouse_data.dict()}
 
 @router.get("/warehouse/search-inventory")
-def search_warehouse_inventory(item_name: str = None, lat: float = None, lon: float = None, radius_km: float = 50.0):
-    """Search for specific items in warehouses"""
-    matching_warehouses = []
-    for profile in user_profiles_db.values():
-        if profile["role"] == "warehouse_manager":
-            warehouse_data = profile["profile_data"]
-            # Check if item is in inventory
-            if item_name:
-                inventory_items = warehouse_data.get("inventory_items", [])
-                has_item = any(item_name.lower() in item.get("name", "").lower() for item in inventory_items)
-                if not has_item:
-                    continue
-            
-            warehouse_info = {**profile}
-            if lat and lon and "location_lat" in warehouse_data and "location_lon" in warehouse_data:
-                distance = haversine(lon, lat, warehouse_data["location_lon"], warehouse_data["location_lat"])
-                if distance <= radius_km:
-                    warehouse_info["distance_km"] = round(distance, 2)
-                    matching_warehouses.append(warehouse_info)
-            else:
-                matching_warehouses.append(warehouse_info)
-    
-    if lat and lon:
-        matching_warehouses = sorted(matching_warehouses, key=lambda x: x.get("distance_km", float('inf')))
-    
-    return {"warehouses": matching_warehouses}
+def search_warehouse_inventory(item_name: str = None, lat: float = None, lon: float = None, radius_km: float = 50.0,
+                               match: str = Query("substring", pattern="^(substring|prefix)$"),
+                               limit: int = NEARBY_LIMIT):
+    """
+    Search for specific items in warehouses (nearest first, then warehouses without a location).
+    `match=prefix` matches item names with a word starting with each word of item_name.
+    """
+    # Warehouses stocking a matching item and the matching item names; None means no item filter
+    matches, matched_names = inventory_index.search(item_name, match) if item_name else (None, None)
+
+    def with_items(warehouse):
+        if matched_names is None:
+            return warehouse
+        items = warehouse["profile_data"].get("inventory_items", [])
+        positions = inventory_index.positions(warehouse["user_id"], matched_names)
+        # The two indexes may have synced a write apart, so skip positions the profile no longer has
+        return {**warehouse, "matched_items": [items[p] for p in positions if p < len(items)]}
+
+    if not (lat and lon):
+        return {"warehouses": [with_items(w) for w in profile_index.members("warehouse_manager", among=matches)[:limit]]}
+
+    matching_warehouses = [
+        {**profile, "distance_km": round(distance, 2)}
+        for distance, profile in profile_index.nearby("warehouse_manager", lat, lon, radius_km, limit, among=matches)
+    ]
+    if len(matching_warehouses) < limit:
+        matching_warehouses += profile_index.members("warehouse_manager", located=False, among=matches)
+    return {"warehouses": [with_items(w) for w in matching_warehouses[:limit]]}
 
 @router.post("/housing-authority/update-properties")
 def update_housing_authority_properties(housing_data: HousingAuthorityInput):
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+from .occupancy_store import LIVE_FEATURES
+
+# Feature order expected by the next-day occupancy model (gbm)
+NEXT_DAY_FEATURES = ['occ_lag1', 'occ_lag7', 'occ_roll7', 'adm_roll7', 'adm_lag1', 'dis_lag1', 'dow', 'total_beds']
+
+# Feature order expected by the hospital suitability model (clf)
+SUITABILITY_FEATURES = ['dist_km', 'pred_beds_available', 'wait_time_est', 'severity', 'req_icu', 'hospital_total_beds', 'hospital_icu_beds']
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_vec(lon1, lat1, lon2, lat2):
+    """Haversine distance in km, broadcasting over NumPy arrays"""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+
+class CandidateScorer:
+    """
+    NumPy-backed scoring engine shared by the hospital ranking endpoints.
+
+    The infra columns are materialised as arrays once, so each request computes
+    distances, suitability features and model inputs for every candidate in a
+    single pass instead of iterating over DataFrame rows.
+    """
+
+    def __init__(self, infra: pd.DataFrame):
+        self.infra = infra
+        self.index = infra.index
+        self.latitude = infra['latitude'].to_numpy(dtype=float)
+        self.longitude = infra['longitude'].to_numpy(dtype=float)
+        self.total_beds = infra['total_beds'].to_numpy()
+        self.icu_beds = infra['icu_beds'].to_numpy()
+
+    def __len__(self):
+        return len(self.index)
+
+    def _select(self, positions: Optional[np.ndarray], values: np.ndarray) -> np.ndarray:
+        return values if positions is None else values[positions]
+
+    def next_day_features(self, live_features: np.ndarray, positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Build the gbm input matrix from live occupancy features (LIVE_FEATURES order) for the selected rows"""
+        X_live = pd.DataFrame(
+            live_features,
+            columns=LIVE_FEATURES,
+            index=self._select(positions, self.index)
+        )
+        X_live['dow'] = pd.to_datetime('today').dayofweek
+        X_live['total_beds'] = self._select(positions, self.total_beds)
+
+        return X_live[NEXT_DAY_FEATURES].fillna(0)
+
+    def candidate_features(self,
+                           patient_lon: float,
+                           patient_lat: float,
+                           severity: int,
+                           pred_next_occ: np.ndarray,
+                           positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Build the clf input matrix (plus distance/wait columns) for the selected infra rows"""
+        total_beds = self._select(positions, self.total_beds)
+        req_icu = True if severity >= 4 else False
+
+        pred_next_occ = np.asarray(pred_next_occ, dtype=float)
+        staffed_rate = np.random.uniform(0.8, 1.2, size=len(total_beds))
+        wait_time_est = pred_next_occ / (total_beds * staffed_rate + 1e-6)
+
+        dist_km = haversine_vec(
+            patient_lon, patient_lat,
+            self._select(positions, self.longitude),
+            self._select(positions, self.latitude)
+        )
+
+        return pd.DataFrame({
+            'dist_km': dist_km,
+            'pred_beds_available': np.maximum(0, total_beds - pred_next_occ),
+            'wait_time_est': wait_time_est,
+            'severity': severity,
+            'req_icu': int(req_icu),
+            'hospital_total_beds': total_beds,
+            'hospital_icu_beds': self._select(positions, self.icu_beds)
+        }, index=self._select(positions, self.index))
+
+    def rank(self, candidates: pd.DataFrame, ml_prob: np.ndarray, top_k: int) -> pd.DataFrame:
+        """Attach model scores, keep the top_k candidates and join the infra columns needed for output"""
+        candidates = candidates.assign(ml_prob=ml_prob)
+        ranked = candidates.sort_values('ml_prob', ascending=False).head(top_k)
+        return ranked.join(self.infra[['facility_name', 'latitude', 'longitude', 'total_beds', 'icu_beds']])
@@ -0,0 +1,47 @@
+import numpy as np
+from .scoring import haversine_vec, EARTH_RADIUS_KM
+
+
+def _ball_tree_class():
+    # Imported on first index build: scikit-learn takes over a second to import
+    try:
+        from sklearn.neighbors import BallTree
+    except ImportError:
+        return None
+    return BallTree
+
+
+class HospitalSpatialIndex:
+    """
+    Haversine BallTree over the infra latitude/longitude columns.
+
+    Radius queries return infra row positions (ascending), so callers can slice
+    the scorer arrays before any feature building or model inference. Falls back
+    to a vectorized full scan when scikit-learn is unavailable.
+    """
+
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray, leaf_size: int = 40):
+        self.latitude = np.asarray(latitude, dtype=float)
+        self.longitude = np.asarray(longitude, dtype=float)
+        self.tree = None
+        BallTree = _ball_tree_class() if len(self.latitude) > 0 else None
+        if BallTree is not None:
+            coords = np.radians(np.column_stack([self.latitude, self.longitude]))
+            self.tree = BallTree(coords, leaf_size=leaf_size, metric='haversine')
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Return positions of rows within radius_km of (lat, lon)"""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        if self.tree is None:
+            dist = haversine_vec(lon, lat, self.longitude, self.latitude)
+            return np.flatnonzero(dist <= radius_km)
+
+        point = np.radians([[lat, lon]])
+        positions = self.tree.query_radius(point, r=radius_km / EARTH_RADIUS_KM)[0]
+        positions.sort()
+        return positions
@@ -0,0 +1,106 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+class RankingStreamParser:
+    """
+    Incremental parser for a streamed LLM ranking response.
+
+    Text chunks are fed as they arrive. As soon as an object inside the
+    "final_ranking" array is complete it is decoded and returned, without
+    waiting for the rest of the analysis. Strings and escapes are tracked so
+    braces inside reasoning text do not confuse the scan.
+    """
+
+    KEY = '"final_ranking"'
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._state = "seek_key"  # seek_key -> seek_array -> in_array -> done
+        self._entry_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.entries: List[Dict[str, Any]] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk and return any ranking entries completed by it"""
+        self.text += chunk
+        completed = []
+
+        while self._pos < len(self.text) and self._state != "done":
+            if self._state == "seek_key":
+                idx = self.text.find(self.KEY, self._pos)
+                if idx == -1:
+                    # Keep enough tail to match a key split across chunks
+                    self._pos = max(self._pos, len(self.text) - len(self.KEY))
+                    break
+                self._pos = idx + len(self.KEY)
+                self._state = "seek_array"
+
+            elif self._state == "seek_array":
+                idx = self.text.find('[', self._pos)
+                if idx == -1:
+                    self._pos = len(self.text)
+                    break
+                self._pos = idx + 1
+                self._state = "in_array"
+
+            else:
+                entry = self._scan_array()
+                if entry is not None:
+                    completed.append(entry)
+
+        self.entries.extend(completed)
+        return completed
+
+    def _scan_array(self) -> Optional[Dict[str, Any]]:
+        text = self.text
+        while self._pos < len(text):
+            char = text[self._pos]
+            self._pos += 1
+
+            if self._entry_start is None:
+                if char == '{':
+                    self._entry_start = self._pos - 1
+                    self._depth = 1
+                elif char == ']':
+                    self._state = "done"
+                    return None
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = text[self._entry_start:self._pos]
+                    self._entry_start = None
+                    try:
+                        return json.loads(raw)
+                    except json.JSONDecodeError:
+                        return None
+        return None
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Parse the complete response once the stream has ended"""
+        start_idx = self.text.find('{')
+        end_idx = self.text.rfind('}') + 1
+        if start_idx == -1 or end_idx <= start_idx:
+            return None
+        try:
+            return json.loads(self.text[start_idx:end_idx])
+        except json.JSONDecodeError:
+            return None
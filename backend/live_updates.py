@@ -0,0 +1,227 @@
+import os
+import json
+import asyncio
+from typing import Any, Dict, Iterable, Optional, Set
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from state_backend import ChangeFollower, StateBackend
+from aggregates import RunningTotals
+
+# Idle connections get a ping/comment this often, so dead clients are noticed
+KEEPALIVE_SECONDS = 15
+
+
+class Subscriber:
+    """One connected client: a bounded queue of events waiting to be sent"""
+
+    __slots__ = ("queue", "overflows")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflows = 0
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queue an event. If the client fell behind, its backlog is replaced by a single resync event"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "reason": "client fell behind, refetch the dashboard"})
+            return False
+
+
+def _value_hash(value: Any) -> int:
+    try:
+        return hash(value)
+    except TypeError:
+        # Lists/dicts: hash their JSON form
+        return hash(json.dumps(value, sort_keys=True, default=str))
+
+
+def _fingerprint(record: Dict[str, Any]) -> Dict[str, int]:
+    """Hash of each field's value: enough to tell which fields a later write changed"""
+    return {field: _value_hash(value) for field, value in record.items()}
+
+
+class LiveChannel(ChangeFollower):
+    """
+    Pushes dashboard changes to WebSocket/SSE subscribers.
+
+    Writes reach the channel through the state backend change feed (so writes
+    handled by other workers are pushed too). Once per tick, every record
+    change since the last tick is coalesced into one delta event: only the
+    fields that changed, the full record for a new one and null for a delete,
+    plus the dashboard totals that moved. Ticks only run while someone is
+    subscribed. A slow client never holds up the others: its queue is bounded,
+    and on overflow its backlog is replaced by a "resync" event.
+
+    Only a per-field hash of each record is kept to work out the deltas, not
+    the records themselves.
+    """
+
+    def __init__(self, name: str, backend: StateBackend, collections: Iterable[str],
+                 totals: Optional[RunningTotals] = None, tick_seconds: float = 0.5, queue_size: int = 32):
+        super().__init__(backend, collections)
+        self.name = name
+        self.totals = totals
+        self.tick_seconds = tick_seconds
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_totals: Dict[str, Any] = {}
+        self._needs_resync = False
+        self.events_published = 0
+        self.slow_client_resyncs = 0
+        self.reset()
+
+    def reset(self):
+        self._fingerprints: Dict[str, Dict[str, Dict[str, int]]] = {collection: {} for collection in self.collections}
+        self._pending: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+
+    def rebuild(self):
+        initial = self.version is None
+        super().rebuild()
+        # Loading the records is not a change; after a trimmed feed clients have to refetch instead
+        self._pending = {}
+        self._needs_resync = not initial
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        fingerprints = self._fingerprints[collection]
+        old = fingerprints.get(key)
+        if record is None:
+            if old is None:
+                return
+            del fingerprints[key]
+        else:
+            new = fingerprints[key] = _fingerprint(record)
+        pending = self._pending.setdefault(collection, {})
+        if old is None or record is None:
+            pending[key] = record
+            return
+        delta = {field: value for field, value in record.items() if old.get(field) != new[field]}
+        if delta:
+            # Coalesce with earlier writes to the same record in this tick
+            pending[key] = {**(pending.get(key) or {}), **delta}
+
+    async def _totals(self) -> Dict[str, Any]:
+        if self.totals is None:
+            return {}
+        totals, _ = await run_in_threadpool(self.totals.snapshot)
+        return totals
+
+    async def subscribe(self) -> Subscriber:
+        idle = not self.subscribers
+        if idle:
+            # Nobody was listening, so the feed wasn't followed: catch up now. The new
+            # subscriber starts from the snapshot, so what happened meanwhile isn't sent
+            await run_in_threadpool(self.sync)
+            with self._lock:
+                self._pending = {}
+                self._needs_resync = False
+        totals = await self._totals()
+        if idle:
+            self._last_totals = totals
+        subscriber = Subscriber(self.queue_size)
+        subscriber.offer({"type": "snapshot", "channel": self.name, "version": self.version, "totals": totals})
+        self.subscribers.add(subscriber)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        try:
+            while self.subscribers:
+                await asyncio.sleep(self.tick_seconds)
+                try:
+                    await self.publish()
+                except Exception as e:
+                    print(f"⚠️ Live channel {self.name} failed to publish: {e}")
+        finally:
+            self._task = None
+
+    async def publish(self):
+        """Send one coalesced delta with everything that changed since the last tick"""
+        await run_in_threadpool(self.sync)
+        with self._lock:
+            changes, self._pending = self._pending, {}
+            resync, self._needs_resync = self._needs_resync, False
+        totals = await self._totals()
+        totals_delta = {name: value for name, value in totals.items() if self._last_totals.get(name) != value}
+        self._last_totals = totals
+
+        if resync:
+            event = {"type": "resync", "channel": self.name, "reason": "change feed trimmed, refetch the dashboard"}
+        elif changes or totals_delta:
+            event = {"type": "delta", "channel": self.name, "version": self.version, "changes": changes, "totals": totals_delta}
+        else:
+            return
+        for subscriber in list(self.subscribers):
+            if not subscriber.offer(event):
+                self.slow_client_resyncs += 1
+        self.events_published += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.name,
+            "subscribers": len(self.subscribers),
+            "version": self.version,
+            "events_published": self.events_published,
+            "slow_client_resyncs": self.slow_client_resyncs,
+            "tick_seconds": self.tick_seconds
+        }
+
+
+async def serve_websocket(websocket: WebSocket, channel: LiveChannel):
+    """Stream channel events to a WebSocket client as JSON messages until it disconnects"""
+    await websocket.accept()
+    subscriber = await channel.subscribe()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            await websocket.send_json(event)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        channel.unsubscribe(subscriber)
+
+
+def sse_response(channel: LiveChannel) -> StreamingResponse:
+    """Stream channel events as server-sent events (event name = event type)"""
+    async def events():
+        subscriber = await channel.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            channel.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def live_channel_from_env(name: str, backend: StateBackend, collections: Iterable[str],
+                          totals: Optional[RunningTotals] = None) -> LiveChannel:
+    """Create a LiveChannel using LIVE_TICK_SECONDS / LIVE_QUEUE_SIZE"""
+    return LiveChannel(
+        name, backend, collections, totals,
+        tick_seconds=float(os.getenv("LIVE_TICK_SECONDS", "0.5")),
+        queue_size=int(os.getenv("LIVE_QUEUE_SIZE", "32"))
+    )
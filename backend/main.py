@@ -1,21 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import os
 import uvicorn
-from hospital_allocation.routes import router as hospital_router
-from shelter_allocation.routes import router as shelter_router
+from startup import startup_profiler
+from state_backend import state_backend
+
+# Routers only define routes and register their heavy resources (models, LLM clients,
+# blockchain connection) as lazy; those initialize in the background after startup
+with startup_profiler.track("hospital_allocation.routes"):
+    from hospital_allocation.routes import router as hospital_router
+with startup_profiler.track("shelter_allocation.routes"):
+    from shelter_allocation.routes import router as shelter_router
 
 # Dynamically import waste-optimizer.routes as waste_optimizer_router
 try:
     import sys
     import importlib.util
-    import os
-
-    waste_optimizer_path = os.path.join(os.path.dirname(__file__), 'waste-optimizer')
-    if waste_optimizer_path not in sys.path:
-        sys.path.insert(0, waste_optimizer_path)
-    spec = importlib.util.spec_from_file_location("waste_optimizer.routes", os.path.join(waste_optimizer_path, "routes.py"))
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+
+    with startup_profiler.track("waste_optimizer.routes"):
+        waste_optimizer_path = os.path.join(os.path.dirname(__file__), 'waste-optimizer')
+        if waste_optimizer_path not in sys.path:
+            sys.path.insert(0, waste_optimizer_path)
+        spec = importlib.util.spec_from_file_location("waste_optimizer.routes", os.path.join(waste_optimizer_path, "routes.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
     waste_optimizer_router = module.router
     waste_optimizer_enabled = True
 except Exception as e:
@@ -23,11 +33,20 @@ except Exception as e:
     waste_optimizer_router = None
     waste_optimizer_enabled = False
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warmups run in daemon threads, so the server starts accepting requests right away
+    startup_profiler.start_warmups()
+    yield
+
+
 # Create the main FastAPI application instance
 app = FastAPI(
     title="Food & Supply Chain Optimizer API",
     description="API for optimizing food distribution and reducing waste.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS setup for frontend access
@@ -57,7 +76,42 @@ def root():
     return {"message": "Food & Supply Chain Optimizer API is running successfully"}
 
 
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+def readiness():
+    """503 until every required resource (models, infra data, blockchain, agent) has initialized"""
+    pending = startup_profiler.pending()
+    if pending:
+        return JSONResponse(status_code=503, content={"status": "starting", "pending": pending})
+    return {"status": "ready"}
+
+
+@app.get("/health/startup")
+def startup_report():
+    """Import time per router module and init time/source of each lazily initialized resource"""
+    return startup_profiler.report()
+
+
+@app.get("/health/state")
+def state_report():
+    """Which state backend this worker uses, its change-feed version and collection sizes"""
+    return {"pid": os.getpid(), **state_backend.stats()}
+
+
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        # Workers are separate processes: they have to share state through SQLite, and
+        # uvicorn needs an import string to start the app in each of them
+        if os.environ.get("STATE_BACKEND", "memory").lower() == "memory":
+            print("⚠️ STATE_BACKEND=memory cannot be shared between workers, using sqlite")
+            os.environ["STATE_BACKEND"] = "sqlite"
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
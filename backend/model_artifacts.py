@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import threading
+import numpy as np
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+from startup import LazyResource, startup_profiler
+
+MANIFEST_FILE = "manifest.json"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class NativeLGBMModel:
+    """
+    LightGBM booster loaded from the text model format, predicting like the
+    estimator it was converted from (labels for a classifier, values for a
+    regressor, raw booster output otherwise).
+    """
+
+    def __init__(self, booster, kind: str, classes: Optional[list] = None):
+        self.booster = booster
+        self.kind = kind
+        self.classes = np.asarray(classes) if classes is not None else None
+
+    def predict_proba(self, X) -> np.ndarray:
+        proba = self.booster.predict(X)
+        if proba.ndim == 1:
+            return np.column_stack([1 - proba, proba])
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        if self.kind == "classifier":
+            return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+        return self.booster.predict(X)
+
+
+# --- formats: artifact suffix, convert(source, artifact) -> meta, load(artifact, meta) -> object ---
+
+def _convert_lightgbm(source_path: str, artifact_path: str) -> Dict[str, Any]:
+    import lightgbm as lgb
+    with open(source_path, "rb") as f:
+        estimator = pickle.load(f)
+    if isinstance(estimator, lgb.Booster):
+        booster, kind, classes = estimator, "booster", None
+    elif isinstance(estimator, lgb.LGBMClassifier):
+        booster, kind, classes = estimator.booster_, "classifier", estimator.classes_.tolist()
+    elif isinstance(estimator, lgb.LGBMModel):
+        booster, kind, classes = estimator.booster_, "regressor", None
+    else:
+        raise TypeError(f"Not a LightGBM model: {type(estimator).__name__}")
+    with open(artifact_path, "w") as f:
+        f.write(booster.model_to_string())
+    return {"kind": kind, "classes": classes, "estimator": type(estimator).__name__}
+
+
+def _load_lightgbm(artifact_path: str, meta: Dict[str, Any]) -> NativeLGBMModel:
+    import lightgbm as lgb
+    return NativeLGBMModel(lgb.Booster(model_file=artifact_path), meta["kind"], meta.get("classes"))
+
+
+def _convert_joblib(source_path: str, artifact_path: str) -> Dict[str, Any]:
+    import joblib
+    estimator = joblib.load(source_path)
+    # Uncompressed, so the estimator's numpy arrays can be memory-mapped on load
+    joblib.dump(estimator, artifact_path)
+    return {"estimator": type(estimator).__name__}
+
+
+def _load_joblib(artifact_path: str, meta: Dict[str, Any]) -> Any:
+    import joblib
+    return joblib.load(artifact_path, mmap_mode="r")
+
+
+def _convert_copy(source_path: str, artifact_path: str) -> Dict[str, Any]:
+    shutil.copyfile(source_path, artifact_path)
+    return {}
+
+
+def _load_csv(artifact_path: str, meta: Dict[str, Any]) -> Any:
+    import pandas as pd
+    return pd.read_csv(artifact_path)
+
+
+FORMATS = {
+    "lightgbm": (".txt", _convert_lightgbm, _load_lightgbm),
+    "joblib_mmap": (".joblib", _convert_joblib, _load_joblib),
+    "csv": (".csv", _convert_copy, _load_csv),
+}
+
+
+class ArtifactStore:
+    """
+    Local cache of converted model artifacts with a checksum manifest.
+
+    The first load of an artifact fetches its source (a pickle download,
+    local file, ...), converts it once into a fast-loading format and records
+    the sha256 of both files. Later loads come straight from the cache without
+    touching the network and only after the artifact checksum matches; a
+    corrupted or missing artifact is rebuilt from its source. LightGBM models
+    are stored in the native text format, so a cached load never unpickles.
+    With `refresh` the source is always re-fetched, but it is only converted
+    again when its checksum changed.
+    """
+
+    def __init__(self, root: str, refresh: bool = False):
+        self.root = root
+        self.refresh = refresh
+        os.makedirs(root, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.root, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _record(self, name: str, entry: Dict[str, Any]):
+        """Add an entry to the manifest, merging with entries other stores or workers wrote meanwhile"""
+        self._manifest = {**self._manifest, **self._read_manifest(), name: entry}
+        path = os.path.join(self.root, MANIFEST_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _verified(self, name: str, fmt: str) -> Optional[Dict[str, Any]]:
+        """Manifest entry for `name` if its artifact exists and matches the recorded checksum"""
+        entry = self._manifest.get(name)
+        if entry is None or entry.get("format") != fmt:
+            return None
+        path = os.path.join(self.root, entry["artifact"])
+        if not os.path.exists(path):
+            return None
+        if file_sha256(path) != entry["artifact_sha256"]:
+            print(f"⚠️  Checksum mismatch for cached artifact {name}, rebuilding from source")
+            return None
+        return entry
+
+    def ensure(self, name: str, fmt: str, fetch_source: Callable[[], str]) -> Tuple[str, Dict[str, Any], str]:
+        """Path and manifest entry of a verified artifact, plus where it came from ("cache" or "converted")"""
+        suffix, convert, _ = FORMATS[fmt]
+        with self._locks[name]:
+            entry = self._verified(name, fmt)
+            if entry is not None and not self.refresh:
+                return os.path.join(self.root, entry["artifact"]), entry, "cache"
+
+            source_path = fetch_source()
+            source_sha256 = file_sha256(source_path)
+            if entry is not None and entry["source_sha256"] == source_sha256:
+                return os.path.join(self.root, entry["artifact"]), entry, "cache"
+
+            artifact = name + suffix
+            path = os.path.join(self.root, artifact)
+            started = time.perf_counter()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            meta = convert(source_path, tmp_path)
+            os.replace(tmp_path, path)
+            entry = {
+                "format": fmt,
+                "artifact": artifact,
+                "artifact_sha256": file_sha256(path),
+                "source": os.path.basename(source_path),
+                "source_sha256": source_sha256,
+                "meta": meta,
+                "converted_at": time.time(),
+                "convert_ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+            self._record(name, entry)
+            print(f"✅ Converted {entry['source']} to {fmt} artifact {artifact}")
+            return path, entry, "converted"
+
+    def load(self, name: str, fmt: str, fetch_source: Callable[[], str]) -> Tuple[Any, Dict[str, Any]]:
+        """Load an artifact (converting it first if needed); returns the object and load details"""
+        started = time.perf_counter()
+        path, entry, origin = self.ensure(name, fmt, fetch_source)
+        ready = time.perf_counter()
+        obj = FORMATS[fmt][2](path, entry.get("meta", {}))
+        done = time.perf_counter()
+        return obj, {
+            "origin": origin,
+            "format": fmt,
+            "artifact": path,
+            "artifact_sha256": entry["artifact_sha256"],
+            "fetch_convert_ms": round((ready - started) * 1000, 2),
+            "deserialize_ms": round((done - ready) * 1000, 2)
+        }
+
+
+class LazyModel(LazyResource):
+    """
+    Stand-in for a model that loads it on first use (or in a background
+    warmup) and records how long that took. If loading fails the fallback
+    model is used instead; without a fallback the proxy is falsy, so
+    `if model:` checks keep working. That check loads the model if it is not
+    ready yet, so async code should wait via run_in_threadpool(model.get).
+    """
+
+    def __init__(self, name: str, load: Callable[[], Tuple[Any, Dict[str, Any]]], fallback: Optional[Callable[[], Any]] = None):
+        super().__init__(name, load, fallback)
+        self.details: Dict[str, Any] = {}
+
+    def _create(self) -> Any:
+        model, self.details = self._factory()
+        self.source = self.details.get("origin", "loaded")
+        return model
+
+    # predict/transform are resolved without loading, so the load happens where they are called
+    def predict(self, X):
+        return self.get().predict(X)
+
+    def transform(self, X):
+        return self.get().transform(X)
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+    def __bool__(self):
+        return self.get() is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **super().status(),
+            "model_type": type(self._value).__name__ if self._loaded and self._value is not None else None,
+            **self.details
+        }
+
+
+def lazy_model(name: str, load: Callable[[], Tuple[Any, Dict[str, Any]]], fallback: Optional[Callable[[], Any]] = None) -> LazyModel:
+    """Create a LazyModel and register it for startup warmup and readiness"""
+    return startup_profiler.register(LazyModel(name, load, fallback))
+
+
+def artifact_store_from_env() -> ArtifactStore:
+    """Create an ArtifactStore from MODEL_ARTIFACT_DIR / MODEL_ARTIFACTS_REFRESH"""
+    return ArtifactStore(
+        os.getenv("MODEL_ARTIFACT_DIR", "models/artifacts"),
+        refresh=os.getenv("MODEL_ARTIFACTS_REFRESH", "false").lower() in ("1", "true", "yes")
+    )
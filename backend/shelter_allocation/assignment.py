@@ -0,0 +1,471 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from state_backend import ChangeFollower
+
+
+# Placeholder for a command result that hasn't been applied yet
+_PENDING = object()
+
+
+class ShelterUnit:
+    __slots__ = ('unit_id', 'capacity', 'occupants')
+
+    def __init__(self, unit_id: str, capacity: int):
+        self.unit_id = unit_id
+        self.capacity = capacity
+        self.occupants = set()
+
+    @property
+    def free(self) -> int:
+        return self.capacity - len(self.occupants)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "shelter_unit_id": self.unit_id,
+            "capacity": self.capacity,
+            "occupied": len(self.occupants),
+            "free": max(0, self.free)
+        }
+
+
+class AssignmentEngine:
+    """
+    Assigns queued applicants to shelter units in vulnerability order.
+
+    Pending applicants sit in a max-heap keyed by score (ties go to whoever
+    queued first). Re-scoring or withdrawing an applicant pushes a new entry
+    or marks the old one stale instead of searching the heap, so every queue
+    operation is O(log n); stale entries are skipped when they reach the top.
+    Units are kept in a second heap ordered by free capacity, so each
+    assignment goes to the emptiest unit in O(log m).
+    """
+
+    def __init__(self):
+        self.units: Dict[str, ShelterUnit] = {}
+        self._unit_heap: List = []
+
+        self._heap: List = []
+        self._entries: Dict[str, List] = {}
+        self._counter = itertools.count()
+        self.assignments: Dict[str, Dict[str, Any]] = {}
+
+        self.assigned_total = 0
+        self.stale_skipped = 0
+
+    # --- units ---
+
+    def _push_unit(self, unit: ShelterUnit):
+        if unit.free > 0:
+            heapq.heappush(self._unit_heap, (-unit.free, unit.unit_id))
+
+    def set_unit(self, unit_id: str, capacity: int) -> ShelterUnit:
+        """Create a unit or change its capacity (existing occupants stay)"""
+        unit = self.units.get(unit_id)
+        if unit is None:
+            unit = self.units[unit_id] = ShelterUnit(unit_id, capacity)
+        else:
+            unit.capacity = capacity
+        self._push_unit(unit)
+        return unit
+
+    def _take_unit(self) -> Optional[ShelterUnit]:
+        while self._unit_heap:
+            neg_free, unit_id = self._unit_heap[0]
+            unit = self.units.get(unit_id)
+            if unit is None or unit.free != -neg_free:
+                # Capacity changed since this entry was pushed
+                heapq.heappop(self._unit_heap)
+                continue
+            heapq.heappop(self._unit_heap)
+            return unit
+        return None
+
+    def free_capacity(self) -> int:
+        return sum(max(0, unit.free) for unit in self.units.values())
+
+    # --- queue ---
+
+    def enqueue(self, applicant_id: str, score: float, priority: str, applicant_data: Optional[Dict[str, Any]] = None,
+                now: Optional[float] = None) -> bool:
+        """Add an applicant, or re-prioritize one already queued. Returns False if already assigned"""
+        if applicant_id in self.assignments:
+            return False
+        self._invalidate(applicant_id)
+        entry = [-score, next(self._counter), applicant_id, {
+            "vulnerability_score": score,
+            "priority": priority,
+            "applicant_data": applicant_data or {},
+            "queued_at": time.time() if now is None else now
+        }]
+        self._entries[applicant_id] = entry
+        heapq.heappush(self._heap, entry)
+        self.compact()
+        return True
+
+    def _invalidate(self, applicant_id: str) -> Optional[List]:
+        entry = self._entries.pop(applicant_id, None)
+        if entry is not None:
+            entry[2] = None
+        return entry
+
+    def withdraw(self, applicant_id: str) -> bool:
+        """Remove a pending applicant from the queue"""
+        return self._invalidate(applicant_id) is not None
+
+    def _pop_applicant(self) -> Optional[List]:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[2] is not None:
+                del self._entries[entry[2]]
+                return entry
+            self.stale_skipped += 1
+        return None
+
+    def peek(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Highest-priority pending applicants (O(n log k), for inspection only)"""
+        top = heapq.nsmallest(limit, self._entries.values())
+        return [{"applicant_id": entry[2], **entry[3]} for entry in top]
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- assignment ---
+
+    def assign(self, max_assignments: Optional[int] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Assign pending applicants in priority order while any unit has room"""
+        now = time.time() if now is None else now
+        made = []
+        while max_assignments is None or len(made) < max_assignments:
+            if not self._entries:
+                break
+            unit = self._take_unit()
+            if unit is None:
+                break
+            entry = self._pop_applicant()
+            if entry is None:
+                self._push_unit(unit)
+                break
+
+            applicant_id, details = entry[2], entry[3]
+            unit.occupants.add(applicant_id)
+            self._push_unit(unit)
+
+            assignment = {
+                "applicant_id": applicant_id,
+                "shelter_unit_id": unit.unit_id,
+                "vulnerability_score": details["vulnerability_score"],
+                "priority": details["priority"],
+                "assigned_at": now
+            }
+            self.assignments[applicant_id] = assignment
+            made.append(assignment)
+
+        self.assigned_total += len(made)
+        return made
+
+    def release(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        """Free the unit place held by an assigned applicant (e.g. on check-out)"""
+        assignment = self.assignments.pop(applicant_id, None)
+        if assignment is None:
+            return None
+        unit = self.units.get(assignment["shelter_unit_id"])
+        if unit is not None:
+            unit.occupants.discard(applicant_id)
+            self._push_unit(unit)
+            self.compact()
+        return assignment
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._entries),
+            "heap_entries": len(self._heap),
+            "stale_skipped": self.stale_skipped,
+            "assigned_current": len(self.assignments),
+            "assigned_total": self.assigned_total,
+            "units": len(self.units),
+            "free_capacity": self.free_capacity()
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-able copy of the units, queue and assignments (restored by `from_state`)"""
+        return {
+            "units": [[unit.unit_id, unit.capacity, sorted(unit.occupants)] for unit in self.units.values()],
+            "queue": [list(entry) for entry in self._entries.values()],
+            # Only the order of the tie-break counters matters, so new entries just have to come after these
+            "next_counter": next(self._counter),
+            "assignments": list(self.assignments.values()),
+            "assigned_total": self.assigned_total,
+            "stale_skipped": self.stale_skipped
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "AssignmentEngine":
+        engine = cls()
+        for unit_id, capacity, occupants in state["units"]:
+            unit = engine.units[unit_id] = ShelterUnit(unit_id, capacity)
+            unit.occupants.update(occupants)
+            engine._push_unit(unit)
+        for entry in state["queue"]:
+            # Copied: the memory backend hands out the stored snapshot itself
+            entry = list(entry)
+            engine._entries[entry[2]] = entry
+            engine._heap.append(entry)
+        heapq.heapify(engine._heap)
+        engine._counter = itertools.count(state["next_counter"])
+        engine.assignments = {assignment["applicant_id"]: dict(assignment) for assignment in state["assignments"]}
+        engine.assigned_total = state["assigned_total"]
+        engine.stale_skipped = state["stale_skipped"]
+        return engine
+
+    def compact(self):
+        """Drop stale heap entries once they outnumber live ones"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+        if len(self._unit_heap) > 2 * len(self.units) + 64:
+            self._unit_heap = [(-unit.free, unit.unit_id) for unit in self.units.values() if unit.free > 0]
+            heapq.heapify(self._unit_heap)
+
+
+class SharedAssignmentEngine(ChangeFollower):
+    """
+    AssignmentEngine whose state is shared by every worker process.
+
+    Operations are not applied directly: each one is written as a command to
+    a log collection in the state backend, and every process replays the log
+    from the change feed into its own AssignmentEngine. All processes apply
+    the same commands in the same order, so they hold the same queue, units
+    and assignments. Two workers assigning at once get consistent results,
+    because their assign commands are ordered in the feed. The caller waits
+    until its own command is applied and gets that command's result.
+    Timestamps are fixed when the command is written, so replays match.
+
+    After every `snapshot_every` commands, the worker that wrote the last one
+    saves the engine state as a snapshot and deletes the commands the
+    previous snapshot covered, so the log holds at most about two rounds of
+    commands. A process that joins later, or whose change feed was trimmed,
+    loads that previous snapshot and replays the commands after it. So does
+    one that finds a command deleted before it could apply it. Trimming one
+    snapshot behind keeps the recent commands (and a waiting caller's own)
+    in the log.
+    """
+
+    def __init__(self, commands, snapshot_every: int = 1000):
+        self.commands = commands
+        self.snapshots = commands.backend.collection(f"{commands.name}_snapshots")
+        super().__init__(commands.backend, [commands.name, self.snapshots.name])
+        # Version of the latest snapshot; only ever raised
+        self._snapshot_pointer = f"{commands.name}_snapshot_version"
+        self.snapshot_every = snapshot_every
+        # Commands written by this process whose results are still to be picked up
+        self._waiting: Dict[str, Any] = {}
+        self._snapshotting = False
+        self.snapshots_taken = 0
+        self.reset()
+
+    def reset(self):
+        self.engine = AssignmentEngine()
+        # Keys of logged commands reflected in the engine: applied here, or covered by the loaded snapshot.
+        # Both shrink as the commands are deleted from the log
+        self._applied = set()
+        self._covered = set()
+        # Commands reflected in the engine since the log began, the same in every process at the same point
+        self._sequence = 0
+        self._snapshot_sequence = 0
+        self._missed = False
+
+    def rebuild(self):
+        with self._lock:
+            version = self.backend.version()
+            commands = self.commands.items()
+            # Read after the log: a command missing from it was deleted behind this snapshot or an older one
+            snapshot = self._base_snapshot()
+            self.reset()
+            if snapshot is not None:
+                self.engine = AssignmentEngine.from_state(snapshot["state"])
+                self._covered = set(snapshot["commands"])
+                self._sequence = self._snapshot_sequence = snapshot["sequence"]
+            for key, record in commands:
+                self.apply(self.commands.name, key, record)
+            self.version = version
+            self.rebuilds += 1
+
+    def sync(self):
+        with self._lock:
+            super().sync()
+            if self._missed:
+                print("⚠️ Assignment commands were compacted before this worker applied them, reloading from the snapshot")
+                self.rebuild()
+
+    def _base_snapshot(self) -> Optional[Dict[str, Any]]:
+        """The snapshot the log was trimmed behind (None while nothing was trimmed)"""
+        while True:
+            latest = self.backend.counter(self._snapshot_pointer)
+            if latest == 0:
+                return None
+            snapshot = self.snapshots.get(f"v{latest}")
+            if snapshot is not None and snapshot["previous"] == 0:
+                return None
+            base = self.snapshots.get(f"v{snapshot['previous']}") if snapshot is not None else None
+            if base is not None:
+                return base
+            # Replaced by a newer snapshot between the reads
+
+    def apply_change(self, change: Dict[str, Any]):
+        if change["collection"] == self.commands.name and change["op"] == "put":
+            record = self.commands.get(change["key"])
+            if record is None and change["key"] not in self._applied and change["key"] not in self._covered:
+                # Deleted from the log before this process got to apply it
+                self._missed = True
+                return
+            self.apply(change["collection"], change["key"], record)
+            return
+        super().apply_change(change)
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        if collection == self.snapshots.name:
+            if record is not None:
+                self._snapshot_sequence = max(self._snapshot_sequence, record["sequence"])
+            return
+        if record is None:
+            self._applied.discard(key)
+            self._covered.discard(key)
+            return
+        # A rebuild can read a command and then see it again in the feed; each is applied once
+        if self._missed or key in self._applied or key in self._covered:
+            return
+        self._applied.add(key)
+        self._sequence += 1
+        result = self._run(record)
+        if key in self._waiting:
+            self._waiting[key] = result
+
+    def _run(self, command: Dict[str, Any]) -> Any:
+        engine = self.engine
+        op = command["op"]
+        if op == "set_units":
+            return [engine.set_unit(unit_id, capacity).to_dict() for unit_id, capacity in command["units"]]
+        if op == "enqueue":
+            return [
+                engine.enqueue(applicant_id, score, priority, applicant_data, now=command["at"])
+                for applicant_id, score, priority, applicant_data in command["applicants"]
+            ]
+        if op == "withdraw":
+            return engine.withdraw(command["applicant_id"])
+        if op == "assign":
+            return [dict(assignment) for assignment in engine.assign(command["max_assignments"], now=command["at"])]
+        if op == "release":
+            released = engine.release(command["applicant_id"])
+            return dict(released) if released is not None else None
+        print(f"⚠️ Skipping unknown assignment command {op!r}")
+        return None
+
+    def _execute(self, op: str, **fields) -> Any:
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._waiting[key] = _PENDING
+        try:
+            self.commands.put(key, {"op": op, "at": time.time(), **fields})
+            self.sync()
+            with self._lock:
+                result = self._waiting[key]
+        finally:
+            with self._lock:
+                self._waiting.pop(key, None)
+        if result is _PENDING:
+            # Only if this worker fell two snapshots behind its own command
+            raise RuntimeError(f"Assignment {op} was compacted into a snapshot before its result was read")
+        self._maybe_snapshot()
+        return result
+
+    # --- compaction ---
+
+    def _maybe_snapshot(self):
+        with self._lock:
+            if self._snapshotting or self._sequence - self._snapshot_sequence < self.snapshot_every:
+                return
+            self._snapshotting = True
+            snapshot = {
+                "version": self.version,
+                "sequence": self._sequence,
+                "commands": sorted(self._applied | self._covered),
+                "state": self.engine.to_state()
+            }
+        threading.Thread(target=self._write_snapshot, args=(snapshot,), name="assignment-snapshot", daemon=True).start()
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        version = snapshot["version"]
+        try:
+            previous = self.backend.counter(self._snapshot_pointer)
+            latest = self.snapshots.get(f"v{previous}") if previous else None
+            if previous >= version or (latest is not None and snapshot["sequence"] - latest["sequence"] < self.snapshot_every):
+                # Another worker just saved one; snapshots stay a full round apart
+                return
+            snapshot["previous"] = previous
+            # Stored before the pointer moves to it, and commands are only deleted after that
+            self.snapshots.put(f"v{version}", snapshot)
+            if not self.backend.compare_and_set(self._snapshot_pointer, previous, version):
+                # Another worker saved one meanwhile
+                self.snapshots.delete(f"v{version}")
+                return
+            if latest is not None:
+                for key in latest["commands"]:
+                    self.commands.delete(key)
+            for key, older in self.snapshots.items():
+                if older["version"] < previous:
+                    self.snapshots.delete(key)
+            self.snapshots_taken += 1
+        except Exception as e:
+            print(f"⚠️ Assignment snapshot failed: {e}")
+        finally:
+            self._snapshotting = False
+
+    # --- operations (applied by every process) ---
+
+    def set_units(self, units: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        """Create units or change their capacity; returns the units"""
+        return self._execute("set_units", units=[list(unit) for unit in units])
+
+    def enqueue_many(self, applicants: List[Tuple[str, float, str, Dict[str, Any]]]) -> List[bool]:
+        """Queue or re-prioritize (applicant_id, score, priority, applicant_data); False where already assigned"""
+        return self._execute("enqueue", applicants=[list(applicant) for applicant in applicants])
+
+    def withdraw(self, applicant_id: str) -> bool:
+        return self._execute("withdraw", applicant_id=applicant_id)
+
+    def assign(self, max_assignments: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._execute("assign", max_assignments=max_assignments)
+
+    def release(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        return self._execute("release", applicant_id=applicant_id)
+
+    # --- reads (current as of the latest command) ---
+
+    def units(self) -> List[Dict[str, Any]]:
+        self.sync()
+        with self._lock:
+            return [unit.to_dict() for unit in self.engine.units.values()]
+
+    def free_capacity(self) -> int:
+        self.sync()
+        with self._lock:
+            return self.engine.free_capacity()
+
+    def peek(self, limit: int = 10) -> List[Dict[str, Any]]:
+        self.sync()
+        with self._lock:
+            return self.engine.peek(limit)
+
+    def stats(self) -> Dict[str, Any]:
+        self.sync()
+        with self._lock:
+            return {
+                **self.engine.stats(),
+                "log_commands": len(self._applied) + len(self._covered),
+                "snapshots_taken": self.snapshots_taken,
+                "rebuilds": self.rebuilds
+            }
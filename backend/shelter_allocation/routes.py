@@ -1,19 +1,54 @@
 import os
 import json
-import joblib
 import gdown
 import numpy as np
-from fastapi import APIRouter, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
-try:
-    from blockchain import blockchain_handler
-except ImportError:
-    blockchain_handler = None
-
+from typing import Dict, Any, List, Optional, Tuple
+from .scoring import feature_matrix, fallback_scores, model_scores, priority_levels
+from .assignment import SharedAssignmentEngine
+from model_artifacts import artifact_store_from_env, lazy_model
+from startup import lazy_resource
+from state_backend import state_backend
 # Create router
 router = APIRouter()
 
+# Blockchain connection, write pipeline and AllocationRecorded indexer; set up by the
+# startup warmup or on first use, so importing this module never waits on the RPC
+blockchain_handler = None
+allocation_pipeline = None
+allocation_indexer = None
+
+def init_blockchain():
+    """Connect to the chain; with a live chain, start the write pipeline and the event indexer"""
+    global blockchain_handler, allocation_pipeline, allocation_indexer
+    try:
+        from blockchain import get_blockchain_handler
+        from blockchain.write_pipeline import pipeline_from_env
+        from blockchain.indexer import indexer_from_env
+    except ImportError as e:
+        print(f"⚠️  Blockchain module unavailable: {e}")
+        return None
+
+    handler = get_blockchain_handler()
+    if not getattr(handler, 'offline', False):
+        allocation_pipeline = pipeline_from_env(handler, job_store=state_backend.collection("allocation_jobs"))
+        allocation_indexer = indexer_from_env(handler)
+        allocation_indexer.start()
+    blockchain_handler = handler
+    return handler
+
+blockchain_init = lazy_resource("blockchain", init_blockchain)
+
+async def require_blockchain():
+    """Route dependency: wait (off the event loop) until the blockchain setup has run"""
+    await run_in_threadpool(blockchain_init.get)
+
+# Largest intake upload accepted by the batch endpoints
+MAX_BATCH_APPLICANTS = int(os.getenv("SHELTER_MAX_BATCH_APPLICANTS", "5000"))
+
 # Pydantic models
 class ShelterAllocationInput(BaseModel):
     applicant_id: str = Field(..., description="Unique ID for the applicant")
@@ -28,6 +63,34 @@ class ShelterAllocationOutput(BaseModel):
     blockchain_transaction: Dict[str, Any]
     verification_url: str
 
+class AllocationLookupInput(BaseModel):
+    applicant_ids: List[str] = Field(..., min_length=1, max_length=500, description="Applicant IDs to look up")
+
+class ApplicantScoreInput(BaseModel):
+    applicant_id: Optional[str] = Field(None, description="Optional ID echoed back in the result")
+    applicant_data: Dict[str, Any] = Field(..., description="Applicant data for vulnerability assessment")
+
+class BatchScoreInput(BaseModel):
+    applicants: List[ApplicantScoreInput] = Field(..., min_length=1, max_length=MAX_BATCH_APPLICANTS)
+
+class BatchAllocationInput(BaseModel):
+    allocations: List[ShelterAllocationInput] = Field(..., min_length=1, max_length=MAX_BATCH_APPLICANTS)
+
+class ShelterUnitInput(BaseModel):
+    shelter_unit_id: str = Field(..., description="ID of the shelter unit")
+    capacity: int = Field(..., ge=0, description="Number of applicants the unit can house")
+
+class ShelterUnitsInput(BaseModel):
+    units: List[ShelterUnitInput] = Field(..., min_length=1)
+
+class QueueApplicantInput(BaseModel):
+    applicant_id: str = Field(..., description="Unique ID for the applicant")
+    applicant_data: Dict[str, Any] = Field(..., description="Applicant data for vulnerability assessment")
+
+class QueueApplicantsInput(BaseModel):
+    applicants: List[QueueApplicantInput] = Field(..., min_length=1, max_length=MAX_BATCH_APPLICANTS)
+    auto_assign: bool = Field(False, description="Run an assignment round after queueing")
+
 class ApplicantData(BaseModel):
     poverty_level: float = Field(..., ge=0, le=100, description="Poverty level (0-100%)")
     unemployment_duration: int = Field(..., ge=0, description="Months unemployed")
@@ -38,54 +101,45 @@ class ApplicantData(BaseModel):
     minority_status: bool = Field(False, description="Belongs to minority group")
     special_circumstances: list = Field([], description="Special circumstances list")
 
-# Load ML model from Google Drive
-def load_ml_model():
+# ML model sources: the local pickle if present, otherwise downloaded from Google Drive
+MODEL_SOURCES = {
+    "shelter_allocation_model": ("models/shelter_allocation_model.pkl", "https://drive.google.com/uc?id=1iVKD9_F8LaMR65QOipPCWkGDqjoSNCmK"),
+    "feature_scaler": ("models/feature_scaler.pkl", "https://drive.google.com/uc?id=1feFnueGcCW_BPCULAc5imo7a4URQwrjq"),
+}
+artifact_store = artifact_store_from_env()
+
+def model_source(name: str):
+    """Source fetcher for the artifact store; only called when the cached artifact is missing or stale"""
+    path, url = MODEL_SOURCES[name]
+
+    def fetch() -> str:
+        if not os.path.exists(path):
+            print(f"🔄 Attempting to download {name} from Google Drive...")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            gdown.download(url, path, quiet=True, timeout=30)
+        return path
+    return fetch
+
+def load_ml_model(name: str):
     """
-    Load the trained ML model from Google Drive or local fallback
+    Load a trained model from its memory-mapped artifact, converting the pickle on first use
     """
-    try:
-        os.makedirs("models", exist_ok=True)
-        model_path = "models/shelter_allocation_model.pkl"
-        scaler_path = "models/feature_scaler.pkl"
-        
-        # Check if models exist locally first
-        if os.path.exists(model_path) and os.path.exists(scaler_path):
-            try:
-                model = joblib.load(model_path)
-                scaler = joblib.load(scaler_path)
-                print("✅ ML models loaded successfully from local files")
-                return model, scaler
-            except Exception as e:
-                print(f"⚠️ Failed to load local models: {e}")
-                # Continue to try downloading
-        
-        # Try to download from Google Drive
-        print("🔄 Attempting to download ML models from Google Drive...")
-        model_url = "https://drive.google.com/uc?id=1iVKD9_F8LaMR65QOipPCWkGDqjoSNCmK"
-        scaler_url = "https://drive.google.com/uc?id=1feFnueGcCW_BPCULAc5imo7a4URQwrjq"
+    return artifact_store.load(name, "joblib_mmap", model_source(name))
 
-        # Download files with timeout and error handling
-        try:
-            gdown.download(model_url, model_path, quiet=True, timeout=30)
-            gdown.download(scaler_url, scaler_path, quiet=True, timeout=30)
-            
-            # Load downloaded models
-            model = joblib.load(model_path)
-            scaler = joblib.load(scaler_path)
-            
-            print("✅ ML models downloaded and loaded successfully from Google Drive")
-            return model, scaler
-        except Exception as download_error:
-            print(f"⚠️ Failed to download ML models: {download_error}")
-            raise download_error
+# Initialize ML model (loaded in the background; None if it fails, so scoring falls back)
+model = lazy_model("shelter_allocation_model", lambda: load_ml_model("shelter_allocation_model"))
+scaler = lazy_model("feature_scaler", lambda: load_ml_model("feature_scaler"))
 
-    except Exception as e:
-        print(f"⚠️ Failed to load ML models: {e}")
-        print("⚠️ Using fallback scoring system")
-        return None, None
+async def ml_models_ready() -> bool:
+    """Wait (off the event loop) until the model and scaler have loaded; False if either is unavailable"""
+    return await run_in_threadpool(lambda: model.get() is not None and scaler.get() is not None)
 
-# Initialize ML model
-model, scaler = load_ml_model()
+# Shelter unit capacities and the pending-applicant priority queue, shared by every worker
+# (snapshotted and trimmed every ASSIGNMENT_SNAPSHOT_EVERY commands)
+assignment_engine = SharedAssignmentEngine(
+    state_backend.collection("shelter_assignment_log"),
+    snapshot_every=int(os.getenv("ASSIGNMENT_SNAPSHOT_EVERY", "1000"))
+)
 
 def predict_vulnerability_ml(applicant_data: Dict[str, Any]) -> float:
     """
@@ -156,15 +210,58 @@ def get_priority_level(score: float) -> str:
     else:
         return "LOW"
 
+def predict_vulnerability_batch(applicants: List[Dict[str, Any]], use_ml: bool) -> Tuple[np.ndarray, str]:
+    """
+    Score many applicants with one feature matrix and a single scaler/model call
+    (use_ml: the result of ml_models_ready())
+    Returns: (scores in input order, prediction method)
+    """
+    X = feature_matrix(applicants)
+    if use_ml:
+        try:
+            return model_scores(model, scaler, X), "ML Model"
+        except Exception as e:
+            print(f"ML batch prediction failed: {e}")
+    return fallback_scores(X), "Fallback"
+
+def record_allocation_on_chain(applicant_id: str, vulnerability_score: float, shelter_unit_id: str) -> Dict[str, Any]:
+    """Queue (or, offline, stub) the blockchain record for one allocation"""
+    if allocation_pipeline:
+        job = allocation_pipeline.enqueue(
+            applicant_id=applicant_id,
+            vulnerability_score=vulnerability_score,
+            shelter_unit_id=shelter_unit_id
+        )
+        return {
+            'success': True,
+            'status': job['status'],
+            'job_id': job['job_id'],
+            'status_url': f"/shelter/allocation-status/{job['job_id']}",
+            'verification_url': ''
+        }
+    elif blockchain_handler:
+        # Offline handler: nothing is written, keep the previous response shape
+        return blockchain_handler.record_allocation(
+            applicant_id=applicant_id,
+            vulnerability_score=vulnerability_score,
+            shelter_unit_id=shelter_unit_id
+        )
+    return {
+        'success': True,
+        'transaction_hash': 'N/A - Blockchain disabled',
+        'verification_url': 'N/A - Blockchain disabled',
+        'blockchain_disabled': True
+    }
+
 # API Endpoints
-@router.post("/allocate", response_model=ShelterAllocationOutput)
+@router.post("/allocate", response_model=ShelterAllocationOutput, dependencies=[Depends(require_blockchain)])
 async def allocate_shelter(input_data: ShelterAllocationInput):
     """
     Allocate shelter based on AI prediction and record on blockchain
     """
     try:
         # 1. Get AI prediction (use ML model or fallback)
-        if model and scaler:
+        if await ml_models_ready():
             vulnerability_score = predict_vulnerability_ml(input_data.applicant_data)
         else:
             vulnerability_score = predict_vulnerability_fallback(input_data.applicant_data)
@@ -172,40 +269,12 @@ async def allocate_shelter(input_data: ShelterAllocationInput):
         # 2. Determine priority level
         priority = get_priority_level(vulnerability_score)
         
-        # 3. Record on blockchain (optional)
-        if blockchain_handler:
-            try:
-                blockchain_result = blockchain_handler.record_allocation(
-                    applicant_id=input_data.applicant_id,
-                    vulnerability_score=vulnerability_score,
-                    shelter_unit_id=input_data.shelter_unit_id
-                )
-                
-                if not blockchain_result.get('success', False):
-                    print(f"⚠️  Blockchain recording failed: {blockchain_result.get('error', 'Unknown error')}")
-                    # Continue without blockchain - don't fail the allocation
-                    blockchain_result = {
-                        'success': True,
-                        'transaction_hash': 'N/A - Blockchain disabled',
-                        'verification_url': 'N/A - Blockchain disabled',
-                        'blockchain_disabled': True
-                    }
-            except Exception as e:
-                print(f"⚠️  Blockchain error: {str(e)}")
-                blockchain_result = {
-                    'success': True,
-                    'transaction_hash': 'N/A - Blockchain disabled',
-                    'verification_url': 'N/A - Blockchain disabled',
-                    'blockchain_disabled': True,
-                    'error': str(e)
-                }
-        else:
-            blockchain_result = {
-                'success': True,
-                'transaction_hash': 'N/A - Blockchain disabled',
-                'verification_url': 'N/A - Blockchain disabled',
-                'blockchain_disabled': True
-            }
+        # 3. Record on blockchain (optional, confirmed in the background)
+        blockchain_result = record_allocation_on_chain(
+            applicant_id=input_data.applicant_id,
+            vulnerability_score=vulnerability_score,
+            shelter_unit_id=input_data.shelter_unit_id
+        )
         
         return ShelterAllocationOutput(
             applicant_id=input_data.applicant_id,
@@ -219,14 +288,173 @@ async def allocate_shelter(input_data: ShelterAllocationInput):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Shelter allocation error: {str(e)}")
 
-@router.get("/allocation/{applicant_id}")
+@router.post("/score-batch")
+async def score_batch(input_data: BatchScoreInput):
+    """
+    Score a whole intake upload at once; results are returned in input order
+    """
+    try:
+        use_ml = await ml_models_ready()
+        scores, method = predict_vulnerability_batch([a.applicant_data for a in input_data.applicants], use_ml)
+        priorities = priority_levels(scores)
+        
+        return {
+            "count": len(scores),
+            "prediction_method": method,
+            "results": [
+                {
+                    "applicant_id": applicant.applicant_id,
+                    "vulnerability_score": round(float(score), 2),
+                    "priority": priority
+                }
+                for applicant, score, priority in zip(input_data.applicants, scores, priorities)
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction error: {str(e)}")
+
+@router.post("/allocate-batch", dependencies=[Depends(require_blockchain)])
+async def allocate_shelter_batch(input_data: BatchAllocationInput):
+    """
+    Score and allocate many applicants at once; blockchain records are queued and
+    packed into batch transactions by the write pipeline
+    """
+    try:
+        allocations = input_data.allocations
+        use_ml = await ml_models_ready()
+        scores, method = predict_vulnerability_batch([a.applicant_data for a in allocations], use_ml)
+        priorities = priority_levels(scores)
+        
+        results = []
+        for allocation, score, priority in zip(allocations, scores, priorities):
+            blockchain_result = record_allocation_on_chain(
+                applicant_id=allocation.applicant_id,
+                vulnerability_score=float(score),
+                shelter_unit_id=allocation.shelter_unit_id
+            )
+            results.append(ShelterAllocationOutput(
+                applicant_id=allocation.applicant_id,
+                vulnerability_score=round(float(score), 2),
+                priority=priority,
+                shelter_unit_id=allocation.shelter_unit_id,
+                blockchain_transaction=blockchain_result,
+                verification_url=blockchain_result.get('verification_url', '')
+            ))
+        
+        return {
+            "count": len(results),
+            "prediction_method": method,
+            "results": results
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch allocation error: {str(e)}")
+
+@router.put("/units")
+async def set_shelter_units(input_data: ShelterUnitsInput):
+    """
+    Create shelter units or update their capacity
+    """
+    units = await run_in_threadpool(assignment_engine.set_units, [(u.shelter_unit_id, u.capacity) for u in input_data.units])
+    return {"units": units, "free_capacity": await run_in_threadpool(assignment_engine.free_capacity)}
+
+@router.get("/units")
+async def list_shelter_units():
+    """
+    Capacity and occupancy of every shelter unit
+    """
+    return {
+        "units": await run_in_threadpool(assignment_engine.units),
+        "free_capacity": await run_in_threadpool(assignment_engine.free_capacity)
+    }
+
+async def run_assignment_round(max_assignments: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Assign queued applicants to units in priority order and queue their blockchain records"""
+    assignments = await run_in_threadpool(assignment_engine.assign, max_assignments)
+    for assignment in assignments:
+        assignment["blockchain_transaction"] = record_allocation_on_chain(
+            applicant_id=assignment["applicant_id"],
+            vulnerability_score=assignment["vulnerability_score"],
+            shelter_unit_id=assignment["shelter_unit_id"]
+        )
+    return assignments
+
+@router.post("/queue", dependencies=[Depends(require_blockchain)])
+async def queue_applicants(input_data: QueueApplicantsInput):
+    """
+    Score applicants and add them to the priority queue (re-scores applicants already queued)
+    """
+    try:
+        applicants = input_data.applicants
+        use_ml = await ml_models_ready()
+        scores, method = predict_vulnerability_batch([a.applicant_data for a in applicants], use_ml)
+        priorities = priority_levels(scores)
+        
+        queued_flags = await run_in_threadpool(assignment_engine.enqueue_many, [
+            (applicant.applicant_id, float(score), priority, applicant.applicant_data)
+            for applicant, score, priority in zip(applicants, scores, priorities)
+        ])
+        results = []
+        for applicant, score, priority, queued in zip(applicants, scores, priorities, queued_flags):
+            results.append({
+                "applicant_id": applicant.applicant_id,
+                "vulnerability_score": round(float(score), 2),
+                "priority": priority,
+                "status": "queued" if queued else "already_assigned"
+            })
+        
+        assignments = await run_assignment_round() if input_data.auto_assign else []
+        return {
+            "prediction_method": method,
+            "results": results,
+            "assignments": assignments,
+            "queue": await run_in_threadpool(assignment_engine.stats)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Queueing error: {str(e)}")
+
+@router.get("/queue")
+async def get_queue(limit: int = Query(10, ge=1, le=500)):
+    """
+    Highest-priority pending applicants and queue statistics
+    """
+    return {"top": await run_in_threadpool(assignment_engine.peek, limit), "queue": await run_in_threadpool(assignment_engine.stats)}
+
+@router.delete("/queue/{applicant_id}")
+async def withdraw_applicant(applicant_id: str):
+    """
+    Remove a pending applicant from the queue
+    """
+    if not await run_in_threadpool(assignment_engine.withdraw, applicant_id):
+        raise HTTPException(status_code=404, detail="Applicant is not queued")
+    return {"applicant_id": applicant_id, "status": "withdrawn"}
+
+@router.post("/assign", dependencies=[Depends(require_blockchain)])
+async def assign_queued_applicants(max_assignments: Optional[int] = Query(None, ge=1)):
+    """
+    Assign queued applicants to free shelter units, most vulnerable first
+    """
+    assignments = await run_assignment_round(max_assignments)
+    return {"count": len(assignments), "assignments": assignments, "queue": await run_in_threadpool(assignment_engine.stats)}
+
+@router.post("/release/{applicant_id}")
+async def release_applicant(applicant_id: str):
+    """
+    Free the shelter place held by an assigned applicant
+    """
+    assignment = await run_in_threadpool(assignment_engine.release, applicant_id)
+    if assignment is None:
+        raise HTTPException(status_code=404, detail="Applicant has no assigned unit")
+    return {"released": assignment, "free_capacity": await run_in_threadpool(assignment_engine.free_capacity)}
+
+@router.get("/allocation/{applicant_id}", dependencies=[Depends(require_blockchain)])
 async def get_allocation(applicant_id: str):
     """
     Get allocation data from blockchain for a specific applicant
     """
     try:
         if blockchain_handler:
-            result = blockchain_handler.get_allocation(applicant_id)
+            # Cache hits return at once; a miss reads through to the node off the event loop
+            result = await run_in_threadpool(blockchain_handler.get_allocation, applicant_id)
             return result
         else:
             return {
@@ -237,39 +465,166 @@ async def get_allocation(applicant_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching allocation: {str(e)}")
 
-@router.get("/stats")
+@router.post("/allocations/lookup", dependencies=[Depends(require_blockchain)])
+async def lookup_allocations(input_data: AllocationLookupInput):
+    """
+    Get allocation data for many applicants at once (cache, then one batched RPC round trip)
+    """
+    if not blockchain_handler:
+        return {
+            'success': False,
+            'error': 'Blockchain functionality is disabled',
+            'blockchain_disabled': True
+        }
+    results = await run_in_threadpool(blockchain_handler.get_allocations, input_data.applicant_ids)
+    return {'success': True, 'allocations': results}
+
+@router.get("/allocation-status/{job_id}", dependencies=[Depends(require_blockchain)])
+async def get_allocation_status(job_id: str):
+    """
+    Get the status of a queued blockchain write (pending, submitted, confirmed or failed)
+    """
+    if not allocation_pipeline:
+        return {
+            'success': False,
+            'error': 'Blockchain functionality is disabled',
+            'blockchain_disabled': True
+        }
+    # May read the shared job store
+    job = await run_in_threadpool(allocation_pipeline.status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown allocation job")
+    return {'success': True, 'job': job}
+
+@router.get("/write-pipeline/stats", dependencies=[Depends(require_blockchain)])
+async def get_write_pipeline_stats():
+    """
+    Queue depth and outcome counters for background blockchain writes
+    """
+    if not allocation_pipeline:
+        return {'enabled': False}
+    return {'enabled': True, **allocation_pipeline.stats()}
+
+def _parse_time(value: Optional[str]) -> Optional[int]:
+    """ISO 8601 date or datetime (UTC if no offset) -> unix seconds"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def _indexer_disabled():
+    return {
+        'success': False,
+        'error': 'Allocation indexer is disabled',
+        'blockchain_disabled': True
+    }
+
+@router.get("/indexed/allocations", dependencies=[Depends(require_blockchain)])
+async def list_indexed_allocations(shelter_unit_id: Optional[str] = None,
+                                   start: Optional[str] = None,
+                                   end: Optional[str] = None,
+                                   limit: int = Query(100, ge=1, le=1000),
+                                   offset: int = Query(0, ge=0)):
+    """
+    List indexed allocations, optionally for one shelter unit and a [start, end) time range
+    """
+    if not allocation_indexer:
+        return _indexer_disabled()
+    rows = await run_in_threadpool(
+        allocation_indexer.find_allocations, shelter_unit_id, _parse_time(start), _parse_time(end), limit, offset
+    )
+    return {'success': True, 'count': len(rows), 'allocations': rows}
+
+@router.get("/indexed/allocations/{applicant_id}", dependencies=[Depends(require_blockchain)])
+async def get_indexed_allocation(applicant_id: str):
+    """
+    Look up one applicant in the local index (no RPC call)
+    """
+    if not allocation_indexer:
+        return _indexer_disabled()
+    row = await run_in_threadpool(allocation_indexer.get_allocation, applicant_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Allocation not indexed")
+    return {'success': True, 'data': row}
+
+@router.get("/indexed/daily", dependencies=[Depends(require_blockchain)])
+async def get_indexed_daily_counts(shelter_unit_id: Optional[str] = None,
+                                   start_day: Optional[str] = None,
+                                   end_day: Optional[str] = None):
+    """
+    Allocations per shelter unit per day (inclusive YYYY-MM-DD bounds, UTC)
+    """
+    if not allocation_indexer:
+        return _indexer_disabled()
+    for day in (start_day, end_day):
+        _parse_time(day)
+    rows = await run_in_threadpool(allocation_indexer.daily_counts, shelter_unit_id, start_day, end_day)
+    return {'success': True, 'days': rows}
+
+@router.get("/indexer/status", dependencies=[Depends(require_blockchain)])
+async def get_indexer_status():
+    """
+    Checkpoint and lag of the AllocationRecorded indexer
+    """
+    if not allocation_indexer:
+        return {'enabled': False}
+    return {'enabled': True, **(await run_in_threadpool(allocation_indexer.status))}
+
+@router.get("/stats", dependencies=[Depends(require_blockchain)])
 async def get_stats():
     """
     Get blockchain statistics and allocation metrics
     """
     try:
         if blockchain_handler:
-            stats = blockchain_handler.get_allocation_count()
-            network_info = blockchain_handler.get_network_info()
+            # Served from the handler's polled chain snapshot
+            stats = await run_in_threadpool(blockchain_handler.get_allocation_count)
+            network_info = await run_in_threadpool(blockchain_handler.get_network_info)
+            cache_stats = blockchain_handler.get_cache_stats()
         else:
             stats = {'success': True, 'count': 0, 'blockchain_disabled': True}
             network_info = {'success': False, 'error': 'Blockchain disabled'}
+            cache_stats = {'enabled': False}
         
         return {
             "blockchain_stats": stats,
             "network_info": network_info,
-            "ml_model_loaded": model is not None,
+            "read_cache": cache_stats,
+            "ml_model_loaded": model.loaded and model.get() is not None,
             "blockchain_enabled": blockchain_handler is not None,
             "system_status": "operational"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
 
+@router.get("/rpc-metrics", dependencies=[Depends(require_blockchain)])
+async def get_rpc_metrics():
+    """
+    Per-method RPC latency, retries and endpoint failover state
+    """
+    if not blockchain_handler:
+        return {'enabled': False}
+    return blockchain_handler.get_rpc_metrics()
+
 @router.get("/model-status")
 async def get_model_status():
     """
     Check if ML model is loaded correctly
     """
+    model_loaded = model.loaded and model.get() is not None
+    scaler_loaded = scaler.loaded and scaler.get() is not None
     return {
-        "ml_model_loaded": model is not None,
-        "scaler_loaded": scaler is not None,
-        "model_type": "Random Forest" if model else "Fallback Scoring",
-        "status": "ready"
+        "ml_model_loaded": model_loaded,
+        "scaler_loaded": scaler_loaded,
+        "model_type": model.status()["model_type"] if model_loaded else "Fallback Scoring",
+        "status": "ready" if model.loaded and scaler.loaded else "loading",
+        "models": {"model": model.status(), "scaler": scaler.status()},
+        "artifact_dir": artifact_store.root
     }
 
 # Test endpoint
@@ -281,7 +636,7 @@ async def test_prediction(applicant_data: ApplicantData):
     try:
         data_dict = applicant_data.dict()
         
-        if model and scaler:
+        if await ml_models_ready():
             score = predict_vulnerability_ml(data_dict)
             method = "ML Model"
         else:
@@ -0,0 +1,55 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence
+
+# Column order of the vulnerability model's input (same as the single-applicant path)
+FEATURES = [
+    'poverty_level', 'unemployment_duration', 'family_size', 'has_disability',
+    'is_elderly', 'is_single_parent', 'minority_status', 'special_circumstances'
+]
+
+PRIORITY_THRESHOLDS = [70, 50, 30]
+PRIORITY_LEVELS = ["CRITICAL", "HIGH", "MEDIUM"]
+DEFAULT_PRIORITY = "LOW"
+
+
+def feature_matrix(applicants: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Build the n x 8 model input for a list of applicant_data dicts in one pass"""
+    rows = [
+        (
+            a.get('poverty_level', 0),
+            a.get('unemployment_duration', 0),
+            a.get('family_size', 1),
+            1 if a.get('has_disability', False) else 0,
+            1 if a.get('is_elderly', False) else 0,
+            1 if a.get('is_single_parent', False) else 0,
+            1 if a.get('minority_status', False) else 0,
+            len(a.get('special_circumstances', []))
+        )
+        for a in applicants
+    ]
+    return np.array(rows, dtype=float).reshape(len(rows), len(FEATURES))
+
+
+def fallback_scores(X: np.ndarray) -> np.ndarray:
+    """Vectorized predict_vulnerability_fallback over a feature matrix"""
+    score = (
+        np.minimum(X[:, 0] * 0.25, 25)          # poverty
+        + np.minimum(X[:, 1] * 2.0, 20)         # unemployment
+        + np.minimum((X[:, 2] - 1) * 3, 15)     # family size
+        + X[:, 3] * 15                          # disability
+        + X[:, 4] * 10                          # elderly
+        + np.minimum(X[:, 7] * 3, 15)           # special circumstances
+    )
+    return np.clip(score, 0, 100)
+
+
+def model_scores(model, scaler, X: np.ndarray) -> np.ndarray:
+    """Scale and predict the whole matrix with a single transform/predict call"""
+    return np.clip(model.predict(scaler.transform(X)), 0, 100)
+
+
+def priority_levels(scores: np.ndarray) -> List[str]:
+    """Vectorized get_priority_level"""
+    scores = np.asarray(scores, dtype=float)
+    conditions = [scores >= threshold for threshold in PRIORITY_THRESHOLDS]
+    return np.select(conditions, PRIORITY_LEVELS, default=DEFAULT_PRIORITY).tolist()
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+
+class LazyResource:
+    """
+    A heavy resource (model, client, connection) built on first use or by a
+    background warmup, recording how long that took. If the factory fails
+    the fallback is used instead, or the resource stays None.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], fallback: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self._factory = factory
+        self._fallback = fallback
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self._warmup_thread: Optional[threading.Thread] = None
+        self.source: Optional[str] = None
+        self.load_ms: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def get(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load_now()
+        return self._value
+
+    def _create(self) -> Any:
+        return self._factory()
+
+    def _load_now(self):
+        started = time.perf_counter()
+        try:
+            self._value = self._create()
+            self.source = self.source or "loaded"
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Failed to initialize {self.name}: {e}")
+            if self._fallback is not None:
+                self._value = self._fallback()
+                self.source = "fallback"
+            else:
+                self.source = "unavailable"
+        self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.loaded_at = time.time()
+        self._loaded = True
+        print(f"✅ {self.name} ready ({self.source}) in {self.load_ms} ms")
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def warmup(self) -> threading.Thread:
+        """Load in a daemon thread; callers arriving meanwhile wait for it instead of loading twice"""
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self.get, name=f"warmup-{self.name}", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._loaded,
+            "source": self.source,
+            "load_ms": self.load_ms,
+            "loaded_at": self.loaded_at,
+            "error": self.error
+        }
+
+
+class StartupProfiler:
+    """
+    Import/init timings per module plus the lazily initialized resources.
+
+    Readiness means every required resource has finished initializing (with
+    its fallback if it failed); liveness only needs the process to answer.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.steps: List[Dict[str, Any]] = []
+        self.resources: Dict[str, LazyResource] = {}
+        self.required: Dict[str, bool] = {}
+        self.warmup_started_at: Optional[float] = None
+
+    @contextmanager
+    def track(self, name: str, kind: str = "import"):
+        started = time.perf_counter()
+        step = {"name": name, "kind": kind, "ok": True}
+        try:
+            yield step
+        except Exception as e:
+            step.update(ok=False, error=str(e))
+            raise
+        finally:
+            step["ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self.steps.append(step)
+
+    def register(self, resource: LazyResource, required: bool = True) -> LazyResource:
+        self.resources[resource.name] = resource
+        self.required[resource.name] = required
+        return resource
+
+    def start_warmups(self):
+        """Warm every registered resource in the background unless STARTUP_WARMUP=lazy"""
+        if os.getenv("STARTUP_WARMUP", "background").lower() == "lazy":
+            return
+        self.warmup_started_at = time.time()
+        for resource in list(self.resources.values()):
+            resource.warmup()
+
+    def pending(self) -> List[str]:
+        return [name for name, resource in self.resources.items() if self.required[name] and not resource.loaded]
+
+    def ready(self) -> bool:
+        return not self.pending()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 2),
+            "import_ms": round(sum(step["ms"] for step in self.steps if step["kind"] == "import"), 2),
+            "steps": self.steps,
+            "warmup_started_at": self.warmup_started_at,
+            "resources": {
+                name: {**resource.status(), "required": self.required[name]}
+                for name, resource in self.resources.items()
+            },
+            "pending": self.pending(),
+            "ready": self.ready()
+        }
+
+
+startup_profiler = StartupProfiler()
+
+
+def lazy_resource(name: str, factory: Callable[[], Any], fallback: Optional[Callable[[], Any]] = None, required: bool = True) -> LazyResource:
+    """Create a LazyResource and register it for warmup and readiness"""
+    return startup_profiler.register(LazyResource(name, factory, fallback), required)
@@ -0,0 +1,585 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# How many change-feed entries a backend keeps for followers to catch up from
+CHANGE_FEED_SIZE = 100000
+
+FIELD_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class Collection:
+    """
+    Keyed records (JSON-able dicts) inside a state backend.
+
+    Records are replaced, never mutated in place: `update` writes a merged
+    copy, so a record handed out earlier is a stable snapshot. Every write
+    bumps the backend version and is appended to its change feed.
+    """
+
+    def __init__(self, backend: "StateBackend", name: str):
+        self.backend = backend
+        self.name = name
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.backend._get(self.name, key)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self.backend._put(self.name, key, value)
+
+    def update(self, key: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge `fields` into an existing record atomically; returns the new record, or None if missing"""
+        return self.backend._update(self.name, key, fields)
+
+    def delete(self, key: str) -> bool:
+        return self.backend._delete(self.name, key)
+
+    def seed(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Insert records that don't exist yet (safe to run from every worker); returns how many were added"""
+        return self.backend._seed(self.name, list(records))
+
+    def values(self) -> List[Dict[str, Any]]:
+        """All records in insertion order"""
+        return [value for _, value in self.items()]
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return self.backend._items(self.name)
+
+    def create_index(self, field: str) -> "Collection":
+        """Hash index on a top-level field, kept in step with every write; returns the collection"""
+        if not FIELD_NAME.fullmatch(field):
+            raise ValueError(f"Invalid index field name: {field!r}")
+        self.backend._create_index(self.name, field)
+        return self
+
+    def find(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Records whose `field` equals `value` (None matches records without the field)"""
+        return self.backend._find(self.name, field, value)
+
+    def count(self, field: str, value: Any) -> int:
+        return self.backend._count_where(self.name, field, value)
+
+    def value_counts(self, field: str) -> Dict[Any, int]:
+        """Number of records per distinct value of `field`"""
+        return self.backend._value_counts(self.name, field)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self.backend._count(self.name)
+
+
+class StateBackend:
+    """Named collections, atomic counters and a versioned change feed"""
+
+    kind = "abstract"
+
+    def __init__(self):
+        self._collections: Dict[str, Collection] = {}
+
+    def collection(self, name: str) -> Collection:
+        if name not in self._collections:
+            self._collections[name] = Collection(self, name)
+        return self._collections[name]
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        """Atomically add `amount` to a counter and return the new value"""
+        raise NotImplementedError
+
+    def raise_counter(self, name: str, floor: int) -> int:
+        """Atomically raise a counter to at least `floor` (creating it if needed) and return its value"""
+        raise NotImplementedError
+
+    def counter(self, name: str) -> int:
+        """Current value of a counter (0 if it was never written)"""
+        raise NotImplementedError
+
+    def compare_and_set(self, name: str, expected: int, value: int) -> bool:
+        """Atomically set a counter to `value` only if it still holds `expected` (0 for a missing counter)"""
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """Number of the latest write (0 before any write)"""
+        raise NotImplementedError
+
+    def changes(self, since: int, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Writes after version `since`, oldest first, as {version, collection, key, op}.
+        `truncated` means entries after `since` were already trimmed, so a follower
+        has to reload the collections it mirrors instead of applying the feed.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.kind,
+            "version": self.version(),
+            "collections": {name: len(collection) for name, collection in self._collections.items()}
+        }
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend: plain dicts behind one lock (single-worker deployments)"""
+
+    kind = "memory"
+
+    def __init__(self, feed_size: int = CHANGE_FEED_SIZE):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._counters: Dict[str, int] = {}
+        self._version = 0
+        self._feed = deque(maxlen=feed_size)
+        # collection -> field -> value -> keys (a dict used as an insertion-ordered set)
+        self._indexes: Dict[str, Dict[str, Dict[Any, Dict[str, None]]]] = {}
+
+    def _record(self, collection: str, key: str, op: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+        self._version += 1
+        self._feed.append({"version": self._version, "collection": collection, "key": key, "op": op})
+        for field, index in self._indexes.get(collection, {}).items():
+            old_value = old.get(field) if old is not None else None
+            new_value = new.get(field) if new is not None else None
+            if old is not None and new is not None and old_value == new_value:
+                continue
+            if old is not None:
+                self._unindex(index, old_value, key)
+            if new is not None and self._hashable(new_value):
+                index.setdefault(new_value, {})[key] = None
+
+    @staticmethod
+    def _hashable(value) -> bool:
+        # Lists/dicts can't be hash-indexed; such records are only found by scanning
+        try:
+            hash(value)
+            return True
+        except TypeError:
+            return False
+
+    def _unindex(self, index, value, key):
+        if self._hashable(value):
+            keys = index.get(value)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del index[value]
+
+    def _get(self, collection, key):
+        return self._data.get(collection, {}).get(key)
+
+    def _put(self, collection, key, value):
+        with self._lock:
+            records = self._data.setdefault(collection, {})
+            old = records.get(key)
+            records[key] = value
+            self._record(collection, key, "put", old, value)
+
+    def _update(self, collection, key, fields):
+        with self._lock:
+            records = self._data.get(collection, {})
+            if key not in records:
+                return None
+            old = records[key]
+            records[key] = {**old, **fields}
+            self._record(collection, key, "put", old, records[key])
+            return records[key]
+
+    def _delete(self, collection, key):
+        with self._lock:
+            old = self._data.get(collection, {}).pop(key, None)
+            if old is None:
+                return False
+            self._record(collection, key, "delete", old, None)
+            return True
+
+    def _seed(self, collection, records):
+        added = 0
+        with self._lock:
+            existing = self._data.setdefault(collection, {})
+            for key, value in records:
+                if key not in existing:
+                    existing[key] = value
+                    self._record(collection, key, "put", None, value)
+                    added += 1
+        return added
+
+    def _items(self, collection):
+        with self._lock:
+            return list(self._data.get(collection, {}).items())
+
+    def _count(self, collection):
+        return len(self._data.get(collection, {}))
+
+    def _create_index(self, collection, field):
+        with self._lock:
+            indexes = self._indexes.setdefault(collection, {})
+            if field in indexes:
+                return
+            index = indexes[field] = {}
+            for key, record in self._data.get(collection, {}).items():
+                if self._hashable(record.get(field)):
+                    index.setdefault(record.get(field), {})[key] = None
+
+    def _matching_keys(self, collection, field, value) -> List[str]:
+        index = self._indexes.get(collection, {}).get(field)
+        if index is not None and self._hashable(value):
+            return list(index.get(value, ()))
+        return [key for key, record in self._data.get(collection, {}).items() if record.get(field) == value]
+
+    def _find(self, collection, field, value):
+        with self._lock:
+            records = self._data.get(collection, {})
+            return [records[key] for key in self._matching_keys(collection, field, value)]
+
+    def _count_where(self, collection, field, value):
+        with self._lock:
+            index = self._indexes.get(collection, {}).get(field)
+            if index is not None and self._hashable(value):
+                return len(index.get(value, ()))
+            return len(self._matching_keys(collection, field, value))
+
+    def _value_counts(self, collection, field):
+        with self._lock:
+            index = self._indexes.get(collection, {}).get(field)
+            if index is not None:
+                return {value: len(keys) for value, keys in index.items()}
+            counts: Dict[Any, int] = {}
+            for record in self._data.get(collection, {}).values():
+                value = record.get(field)
+                if self._hashable(value):
+                    counts[value] = counts.get(value, 0) + 1
+            return counts
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            return self._counters[name]
+
+    def raise_counter(self, name: str, floor: int) -> int:
+        with self._lock:
+            self._counters[name] = max(self._counters.get(name, floor), floor)
+            return self._counters[name]
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def compare_and_set(self, name: str, expected: int, value: int) -> bool:
+        with self._lock:
+            if self._counters.get(name, 0) != expected:
+                return False
+            self._counters[name] = value
+            return True
+
+    def version(self) -> int:
+        return self._version
+
+    def changes(self, since: int, limit: int = 1000) -> Dict[str, Any]:
+        with self._lock:
+            oldest = self._feed[0]["version"] if self._feed else self._version + 1
+            # Versions are consecutive, so the newer entries are the last (version - since) ones
+            newer = list(islice(reversed(self._feed), max(0, self._version - since)))
+            entries = newer[::-1][:limit]
+            return {"version": self._version, "changes": entries, "truncated": since + 1 < oldest and since < self._version}
+
+
+class ChangeFollower:
+    """
+    Process-local view derived from some collections (an index, running totals)
+    kept current by replaying the backend's change feed, so it also reflects
+    writes made by other workers. Call `sync` before reading; it loads
+    everything on first use and again whenever the feed was trimmed past it.
+    Subclasses implement `reset` and `apply`.
+    """
+
+    def __init__(self, backend: StateBackend, collections: Iterable[str]):
+        self.backend = backend
+        self.collections = list(collections)
+        self._lock = threading.RLock()
+        self.version: Optional[int] = None
+        self.rebuilds = 0
+        self.changes_applied = 0
+
+    def reset(self):
+        raise NotImplementedError
+
+    def apply(self, collection: str, key: str, record: Optional[Dict[str, Any]]):
+        """Reflect the current record for `key` (None once deleted)"""
+        raise NotImplementedError
+
+    def apply_change(self, change: Dict[str, Any]):
+        """Apply one feed entry; by default just the record's current value"""
+        self.apply(change["collection"], change["key"], self.backend.collection(change["collection"]).get(change["key"]))
+
+    def rebuild(self):
+        with self._lock:
+            # Taken before reading, so writes racing with the reload are applied again by the next sync
+            version = self.backend.version()
+            self.reset()
+            for name in self.collections:
+                for key, record in self.backend.collection(name).items():
+                    self.apply(name, key, record)
+            self.version = version
+            self.rebuilds += 1
+
+    def sync(self):
+        """Apply writes recorded in the change feed since the last sync"""
+        with self._lock:
+            if self.version is None:
+                self.rebuild()
+                return
+            while self.version < self.backend.version():
+                feed = self.backend.changes(self.version)
+                if feed["truncated"]:
+                    self.rebuild()
+                    return
+                if not feed["changes"]:
+                    break
+                for change in feed["changes"]:
+                    if change["collection"] in self.collections:
+                        self.apply_change(change)
+                        self.changes_applied += 1
+                self.version = feed["changes"][-1]["version"]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (collection, key)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    op TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    Backend shared by every worker process through one SQLite file in WAL mode.
+
+    Readers never block the writer, and each write (record plus change-feed
+    entry) is one transaction, so all workers see the same data and the same
+    version sequence. Read-modify-write operations take the write lock up front
+    (BEGIN IMMEDIATE), making `update` and `incr` atomic across processes.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, db_path: str, feed_size: int = CHANGE_FEED_SIZE, busy_timeout_seconds: float = 30):
+        super().__init__()
+        self.db_path = db_path
+        self.feed_size = feed_size
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=busy_timeout_seconds, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _write(self, statements):
+        """Run `statements(db)` (a write plus its change-feed entry) in one immediate transaction"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._db)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._trim_feed()
+            return result
+
+    def _trim_feed(self):
+        self._db.execute("DELETE FROM changes WHERE version <= (SELECT MAX(version) FROM changes) - ?", (self.feed_size,))
+
+    @staticmethod
+    def _log(db, collection, key, op):
+        db.execute("INSERT INTO changes (collection, key, op, changed_at) VALUES (?, ?, ?, ?)", (collection, key, op, time.time()))
+
+    @staticmethod
+    def _upsert(db, collection, key, value):
+        db.execute(
+            "INSERT INTO records (collection, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection, key) DO UPDATE SET value = excluded.value",
+            (collection, key, json.dumps(value, default=str))
+        )
+
+    def _get(self, collection, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM records WHERE collection = ? AND key = ?", (collection, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, collection, key, value):
+        def statements(db):
+            self._upsert(db, collection, key, value)
+            self._log(db, collection, key, "put")
+        self._write(statements)
+
+    def _update(self, collection, key, fields):
+        def statements(db):
+            row = db.execute("SELECT value FROM records WHERE collection = ? AND key = ?", (collection, key)).fetchone()
+            if row is None:
+                return None
+            merged = {**json.loads(row[0]), **fields}
+            self._upsert(db, collection, key, merged)
+            self._log(db, collection, key, "put")
+            return merged
+        return self._write(statements)
+
+    def _delete(self, collection, key):
+        def statements(db):
+            deleted = db.execute("DELETE FROM records WHERE collection = ? AND key = ?", (collection, key)).rowcount
+            if deleted:
+                self._log(db, collection, key, "delete")
+            return bool(deleted)
+        return self._write(statements)
+
+    def _seed(self, collection, records):
+        def statements(db):
+            added = 0
+            for key, value in records:
+                inserted = db.execute(
+                    "INSERT OR IGNORE INTO records (collection, key, value) VALUES (?, ?, ?)",
+                    (collection, key, json.dumps(value, default=str))
+                ).rowcount
+                if inserted:
+                    self._log(db, collection, key, "put")
+                    added += inserted
+            return added
+        return self._write(statements)
+
+    def _items(self, collection):
+        with self._lock:
+            rows = self._db.execute("SELECT key, value FROM records WHERE collection = ? ORDER BY rowid", (collection,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def _count(self, collection):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM records WHERE collection = ?", (collection,)).fetchone()[0]
+
+    # Field names are validated by Collection.create_index, and the expression has to be spelled
+    # the same way in queries as in the index for SQLite to use it
+    @staticmethod
+    def _field_expr(field):
+        return f"json_extract(value, '$.{field}')"
+
+    def _field_match(self, field, value):
+        if value is None:
+            return f"{self._field_expr(field)} IS NULL", ()
+        return f"{self._field_expr(field)} = ?", (value,)
+
+    def _create_index(self, collection, field):
+        # One expression index per field, shared by every collection; the database keeps it
+        # consistent on each write, for all worker processes
+        with self._lock:
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS records_by_{field} ON records (collection, {self._field_expr(field)})")
+
+    def _find(self, collection, field, value):
+        condition, params = self._field_match(field, value)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT value FROM records WHERE collection = ? AND {condition} ORDER BY rowid", (collection, *params)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _count_where(self, collection, field, value):
+        condition, params = self._field_match(field, value)
+        with self._lock:
+            return self._db.execute(
+                f"SELECT COUNT(*) FROM records WHERE collection = ? AND {condition}", (collection, *params)
+            ).fetchone()[0]
+
+    def _value_counts(self, collection, field):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {self._field_expr(field)}, COUNT(*) FROM records WHERE collection = ? GROUP BY 1", (collection,)
+            ).fetchall()
+        return {value: count for value, count in rows}
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        return self._write(lambda db: db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value RETURNING value",
+            (name, amount)
+        ).fetchone()[0])
+
+    def raise_counter(self, name: str, floor: int) -> int:
+        return self._write(lambda db: db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value) RETURNING value",
+            (name, floor)
+        ).fetchone()[0])
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def compare_and_set(self, name: str, expected: int, value: int) -> bool:
+        def statements(db):
+            row = db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+            if (row[0] if row else 0) != expected:
+                return False
+            db.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (name, value)
+            )
+            return True
+        return self._write(statements)
+
+    def version(self) -> int:
+        with self._lock:
+            # The sequence survives feed trimming, unlike MAX(version)
+            row = self._db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def changes(self, since: int, limit: int = 1000) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT version, collection, key, op FROM changes WHERE version > ? ORDER BY version LIMIT ?",
+                (since, limit)
+            ).fetchall()
+            oldest = self._db.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+        version = self.version()
+        return {
+            "version": version,
+            "changes": [{"version": v, "collection": c, "key": k, "op": op} for v, c, k, op in rows],
+            "truncated": oldest is not None and since + 1 < oldest and since < version
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "db_path": self.db_path}
+
+
+def state_backend_from_env() -> StateBackend:
+    """Create the backend selected by STATE_BACKEND (memory | sqlite, at STATE_DB_PATH)"""
+    kind = os.getenv("STATE_BACKEND", "memory").lower()
+    if kind == "sqlite":
+        return SQLiteStateBackend(os.getenv("STATE_DB_PATH", "data/state.db"))
+    if kind != "memory":
+        print(f"⚠️ Unknown STATE_BACKEND '{kind}', using in-memory state")
+    return MemoryStateBackend()
+
+
+# Shared by every router in the process
+state_backend = state_backend_from_env()
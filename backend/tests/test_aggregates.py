@@ -0,0 +1,98 @@
+import random
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from state_backend import MemoryStateBackend
+from aggregates import RunningTotals, conditional_response, count_all, count_where, field_sum
+
+METRICS = {
+    "hospitals": ("hospitals", count_all),
+    "available_beds": ("hospitals", field_sum("available_beds")),
+    "busy_doctors": ("doctors", count_where("status", "busy")),
+}
+
+
+def recompute(backend):
+    hospitals = backend.collection("hospitals").values()
+    return {
+        "hospitals": len(hospitals),
+        "available_beds": sum(h["available_beds"] for h in hospitals),
+        "busy_doctors": sum(1 for d in backend.collection("doctors").values() if d.get("status") == "busy"),
+    }
+
+
+def test_running_totals_match_a_recount_after_random_writes():
+    backend = MemoryStateBackend()
+    totals = RunningTotals(backend, METRICS)
+    hospitals, doctors = backend.collection("hospitals"), backend.collection("doctors")
+    rng = random.Random(5)
+    for step in range(500):
+        key = f"k{rng.randrange(20)}"
+        roll = rng.random()
+        if roll < 0.4:
+            hospitals.put(key, {"available_beds": rng.randrange(50)})
+        elif roll < 0.5:
+            hospitals.delete(key)
+        elif roll < 0.9:
+            doctors.put(key, {"status": rng.choice(["busy", "available"])})
+        else:
+            doctors.delete(key)
+        if step % 50 == 0:
+            assert totals.snapshot()[0] == recompute(backend)
+    assert totals.snapshot()[0] == recompute(backend)
+
+
+def test_digest_only_changes_with_the_totals():
+    backend = MemoryStateBackend()
+    totals = RunningTotals(backend, METRICS)
+    backend.collection("hospitals").put("H1", {"available_beds": 5})
+    _, first = totals.snapshot()
+    backend.collection("hospitals").put("H1", {"available_beds": 5, "name": "renamed"})
+    backend.collection("doctors").put("D1", {"status": "available"})
+    assert totals.snapshot()[1] == first
+    backend.collection("hospitals").update("H1", {"available_beds": 4})
+    assert totals.snapshot()[1] != first
+
+
+def test_records_a_metric_cannot_read_are_skipped():
+    backend = MemoryStateBackend()
+    totals = RunningTotals(backend, METRICS)
+    backend.collection("hospitals").put("bad", {"name": "no bed count"})
+    backend.collection("hospitals").put("H1", {"available_beds": 3})
+    assert totals.snapshot()[0] == {"hospitals": 2, "available_beds": 3, "busy_doctors": 0}
+
+
+def app_for(totals):
+    app = FastAPI()
+
+    @app.get("/dashboard")
+    def dashboard(request: Request):
+        values, digest = totals.snapshot()
+        return conditional_response(request, digest, lambda: {"totals": values})
+
+    @app.get("/summary")
+    def summary(request: Request):
+        values, digest = totals.snapshot()
+        return conditional_response(request, digest, lambda: {"beds": values["available_beds"]})
+
+    return TestClient(app)
+
+
+def test_etag_gives_304_until_the_totals_change():
+    backend = MemoryStateBackend()
+    backend.collection("hospitals").put("H1", {"available_beds": 7})
+    client = app_for(RunningTotals(backend, METRICS))
+
+    first = client.get("/dashboard")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json()["totals"]["available_beds"] == 7
+    assert etag.startswith('W/"')
+
+    unchanged = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert client.get("/dashboard", headers={"If-None-Match": f'"other", {etag.removeprefix("W/")}'}).status_code == 304
+    # Same totals, different endpoint: a different representation, so a different tag
+    assert client.get("/summary", headers={"If-None-Match": etag}).status_code == 200
+
+    backend.collection("hospitals").update("H1", {"available_beds": 6})
+    changed = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
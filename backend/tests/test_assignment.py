@@ -0,0 +1,134 @@
+import time
+from state_backend import MemoryStateBackend, SQLiteStateBackend
+from shelter_allocation.assignment import AssignmentEngine, SharedAssignmentEngine
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def shared(backend, **kwargs):
+    return SharedAssignmentEngine(backend.collection("shelter_assignment_log"), **kwargs)
+
+
+def test_assigns_by_score_then_queue_order_to_the_emptiest_unit():
+    engine = AssignmentEngine()
+    engine.set_unit("U1", 2)
+    engine.set_unit("U2", 1)
+    for applicant_id, score in [("a", 40), ("b", 90), ("c", 40), ("d", 70)]:
+        engine.enqueue(applicant_id, score, "medium", now=0)
+
+    made = engine.assign(now=0)
+    assert [(m["applicant_id"], m["shelter_unit_id"]) for m in made] == [("b", "U1"), ("d", "U1"), ("a", "U2")]
+    assert [entry["applicant_id"] for entry in engine.peek()] == ["c"]
+    assert engine.free_capacity() == 0
+
+
+def test_rescoring_and_withdrawing_leave_stale_entries_behind():
+    engine = AssignmentEngine()
+    engine.set_unit("U1", 1)
+    engine.enqueue("a", 90, "high", now=0)
+    engine.enqueue("b", 50, "medium", now=0)
+    engine.enqueue("b", 95, "critical", now=0)
+    assert engine.withdraw("a") and not engine.withdraw("a")
+
+    assert [m["applicant_id"] for m in engine.assign(now=0)] == ["b"]
+    assert engine.stats()["pending"] == 0 and engine.stats()["heap_entries"] == 2
+    assert not engine.enqueue("b", 99, "critical")
+
+
+def test_release_frees_the_place_for_the_next_applicant():
+    engine = AssignmentEngine()
+    engine.set_unit("U1", 1)
+    engine.enqueue("a", 80, "high", now=0)
+    engine.enqueue("b", 60, "medium", now=0)
+    engine.assign(now=0)
+    assert engine.assign(now=0) == []
+
+    assert engine.release("a")["shelter_unit_id"] == "U1"
+    assert [m["applicant_id"] for m in engine.assign(now=0)] == ["b"]
+
+
+def test_restored_state_makes_the_same_decisions():
+    engine = AssignmentEngine()
+    engine.set_unit("U1", 3)
+    engine.set_unit("U2", 2)
+    for i in range(8):
+        engine.enqueue(f"a{i}", 50 + (i % 3), "medium", now=0)
+    engine.assign(2, now=0)
+    engine.withdraw("a4")
+
+    restored = AssignmentEngine.from_state(engine.to_state())
+    for copy in (engine, restored):
+        copy.enqueue("late", 51, "medium", now=1)
+    assert restored.assign(now=2) == engine.assign(now=2)
+    assert restored.peek(10) == engine.peek(10)
+    assert restored.assignments == engine.assignments
+
+
+def test_workers_sharing_a_backend_agree_on_assignments():
+    backend = MemoryStateBackend()
+    first, second = shared(backend), shared(backend)
+    first.set_units([("U1", 1), ("U2", 1)])
+    first.enqueue_many([("a", 70, "high", {}), ("b", 30, "low", {})])
+    second.enqueue_many([("c", 90, "critical", {})])
+
+    made = second.assign(1)
+    assert [m["applicant_id"] for m in made] == ["c"]
+    assert [m["applicant_id"] for m in first.assign()] == ["a"]
+    assert first.peek() == second.peek()
+    assert first.units() == second.units()
+
+
+def test_log_is_snapshotted_and_trimmed():
+    backend = MemoryStateBackend()
+    engine = shared(backend, snapshot_every=5)
+    engine.set_units([("U1", 50)])
+    for i in range(30):
+        engine.enqueue_many([(f"a{i}", float(i), "medium", {"name": f"Applicant {i}"})])
+        wait_for(lambda: not engine._snapshotting)
+
+    assert engine.snapshots_taken == 6
+    # Trimmed one snapshot behind: the commands since the previous snapshot stay
+    assert len(engine.commands) == engine.stats()["log_commands"] <= 2 * 5
+    assert len(engine.snapshots) == 2
+    assert engine.stats()["pending"] == 30
+
+
+def test_late_joiner_loads_the_snapshot_and_replays_only_newer_commands(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    first = shared(SQLiteStateBackend(db_path), snapshot_every=4)
+    first.set_units([("U1", 2), ("U2", 2)])
+    for i in range(6):
+        first.enqueue_many([(f"a{i}", float(i % 4), "medium", {})])
+        wait_for(lambda: not first._snapshotting)
+    first.assign(1)
+    first.enqueue_many([("b", 2.5, "medium", {})])
+    wait_for(lambda: not first._snapshotting)
+
+    assert first.snapshots_taken == 2 and len(first.commands) < 9
+    late = shared(SQLiteStateBackend(db_path))
+    late.sync()
+    assert late.rebuilds == 1
+    assert late.peek(10) == first.peek(10)
+    assert [m["applicant_id"] for m in late.assign()] == ["b", "a2", "a1"]
+    assert first.units() == late.units()
+
+
+def test_worker_that_misses_trimmed_commands_reloads_from_the_snapshot():
+    backend = MemoryStateBackend()
+    busy, idle = shared(backend, snapshot_every=3), shared(backend)
+    idle.sync()
+    busy.set_units([("U1", 5)])
+    for i in range(6):
+        busy.enqueue_many([(f"a{i}", float(i), "medium", {})])
+        wait_for(lambda: not busy._snapshotting)
+    assert busy.snapshots_taken == 2
+
+    # idle never saw the commands before they were deleted from the log
+    assert idle.peek(10) == busy.peek(10)
+    assert idle.rebuilds == 2
+    assert idle.stats()["pending"] == 6
@@ -0,0 +1,82 @@
+import time
+import asyncio
+import threading
+import numpy as np
+import pandas as pd
+from hospital_allocation.batching import MicroBatcher
+
+
+class RowSumModel:
+    """predict() returns each row's sum and remembers the batch sizes it saw"""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.calls = []
+        self.threads = set()
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError("model exploded")
+        return X.sum(axis=1).to_numpy()
+
+
+def frame(start, rows):
+    values = np.arange(start, start + rows, dtype=float)
+    return pd.DataFrame({"a": values, "b": values * 10})
+
+
+def test_concurrent_callers_share_one_predict_and_get_their_own_rows():
+    model = RowSumModel()
+    batcher = MicroBatcher("clf", lambda: model, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict(frame(i * 100, i + 1)) for i in range(5)))
+
+    results = asyncio.run(run())
+    assert model.calls == [15]
+    for i, result in enumerate(results):
+        assert result.tolist() == (frame(i * 100, i + 1).sum(axis=1)).tolist()
+    assert threading.current_thread().name not in model.threads
+    metrics = batcher.metrics()
+    assert metrics["batches"] == 1 and metrics["requests"] == 5 and metrics["batch_size_histogram"]["8"] == 1
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_window():
+    model = RowSumModel()
+    batcher = MicroBatcher("gbm", lambda: model, max_wait_ms=5000, max_rows=6)
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(batcher.predict(frame(0, 3)), batcher.predict(frame(3, 3)))
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 1
+    assert model.calls == [6]
+
+
+def test_model_error_reaches_every_caller_in_the_batch_and_the_worker_survives():
+    model = RowSumModel(fail=True)
+    batcher = MicroBatcher("clf", lambda: model, max_wait_ms=10)
+
+    async def run():
+        results = await asyncio.gather(batcher.predict(frame(0, 2)), batcher.predict(frame(2, 2)), return_exceptions=True)
+        model.fail = False
+        return results, await batcher.predict(frame(0, 1))
+
+    results, after = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert after.tolist() == [0.0]
+
+
+def test_empty_input_skips_the_model_and_a_new_event_loop_gets_a_new_worker():
+    model = RowSumModel()
+    batcher = MicroBatcher("clf", lambda: model, max_wait_ms=1)
+    assert asyncio.run(batcher.predict(frame(0, 0))).size == 0
+    assert model.calls == []
+    for _ in range(2):
+        assert asyncio.run(batcher.predict(frame(1, 1))).tolist() == [11.0]
+    assert model.calls == [1, 1]
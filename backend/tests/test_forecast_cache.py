@@ -0,0 +1,79 @@
+import threading
+import numpy as np
+from hospital_allocation.forecast_cache import OccupancyForecastCache
+
+DAY = 739000
+
+
+def test_rows_miss_until_stored_then_hit_for_the_same_day():
+    cache = OccupancyForecastCache(["h0", "h1", "h2"])
+    positions = np.array([0, 2])
+    _, missing, generations = cache.lookup(positions, DAY, now=0)
+    assert missing.tolist() == [True, True]
+
+    cache.store(positions, DAY, np.array([0.5, 0.7]), generations, now=0)
+    values, missing, _ = cache.lookup(positions, DAY, now=1)
+    assert not missing.any()
+    assert values.tolist() == [0.5, 0.7]
+    assert cache.lookup(positions, DAY + 1, now=1)[1].all()
+    assert cache.stats()["hits"] == 2
+
+
+def test_entries_expire_after_the_ttl():
+    cache = OccupancyForecastCache(["h0"], ttl_seconds=10)
+    cache.store(np.array([0]), DAY, np.array([0.4]), now=100)
+    assert not cache.lookup(np.array([0]), DAY, now=109)[1].any()
+    assert cache.lookup(np.array([0]), DAY, now=110)[1].all()
+
+
+def test_invalidate_drops_one_hospital_and_rejects_unknown_ids():
+    cache = OccupancyForecastCache(["h0", "h1"])
+    cache.store(np.array([0, 1]), DAY, np.array([0.1, 0.2]), now=0)
+    assert cache.invalidate("h1")
+    assert not cache.invalidate("nope")
+    assert cache.lookup(np.array([0, 1]), DAY, now=1)[1].tolist() == [False, True]
+
+
+def test_store_skips_rows_invalidated_while_the_forecast_was_computed():
+    cache = OccupancyForecastCache(["h0", "h1", "h2"])
+    positions = np.arange(3)
+    _, missing, generations = cache.lookup(positions, DAY, now=0)
+
+    # An update for h1 lands while gbm is running on the old features
+    cache.invalidate("h1")
+    cache.store(positions[missing], DAY, np.array([0.1, 0.2, 0.3]), generations[missing], now=0)
+
+    values, missing, _ = cache.lookup(positions, DAY, now=1)
+    assert missing.tolist() == [False, True, False]
+    assert values[[0, 2]].tolist() == [0.1, 0.3]
+    assert cache.stats()["stale_stores"] == 1
+
+
+def test_clear_also_discards_forecasts_in_flight():
+    cache = OccupancyForecastCache(["h0", "h1"])
+    positions = np.arange(2)
+    _, _, generations = cache.lookup(positions, DAY, now=0)
+    cache.clear()
+    cache.store(positions, DAY, np.array([0.1, 0.2]), generations, now=0)
+    assert cache.lookup(positions, DAY, now=1)[1].all()
+
+
+def test_invalidations_from_other_threads_are_all_counted():
+    cache = OccupancyForecastCache([f"h{i}" for i in range(50)])
+    positions = np.arange(50)
+
+    def invalidate():
+        for i in range(2000):
+            cache.invalidate(f"h{i % 50}")
+
+    threads = [threading.Thread(target=invalidate) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for _ in range(100):
+        _, missing, generations = cache.lookup(positions, DAY, now=0)
+        cache.store(positions[missing], DAY, np.ones(int(missing.sum())), generations[missing], now=0)
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats()["invalidations"] == 4000
+    assert int(cache.generations.sum()) == 4000
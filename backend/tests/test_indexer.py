@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+from web3 import Web3
+from blockchain.indexer import AllocationIndexer
+
+
+class FakeChain:
+    """Just enough of a handler for the indexer: a block height and AllocationRecorded logs"""
+
+    def __init__(self, block_number: int, finality_depth: int = 2):
+        self.block_number = block_number
+        self.logs = []
+        self.log_queries = []
+        self.transactions = {}
+        self.read_cache = SimpleNamespace(finality_depth=finality_depth)
+        self.w3 = SimpleNamespace(eth=self)
+        self.contract = SimpleNamespace(
+            events=SimpleNamespace(AllocationRecorded=lambda: self),
+            decode_function_input=lambda data: (SimpleNamespace(fn_name='recordAllocation'), {'_applicantId': data})
+        )
+
+    def record(self, applicant_id: str, shelter_unit_id: str, timestamp: int = 1_700_000_000):
+        self.block_number += 1
+        txn_hash = Web3.keccak(text=f"txn-{applicant_id}")
+        self.transactions[Web3.to_hex(txn_hash)] = {'input': applicant_id}
+        self.logs.append({
+            'args': {
+                'applicantId': Web3.keccak(text=applicant_id),
+                'vulnerabilityScore': 4250,
+                'shelterUnitId': shelter_unit_id,
+                'timestamp': timestamp,
+                'recordedBy': None
+            },
+            'blockNumber': self.block_number,
+            'transactionHash': txn_hash,
+            'logIndex': 0
+        })
+
+    def get_logs(self, from_block: int, to_block: int):
+        self.log_queries.append((from_block, to_block))
+        return [log for log in self.logs if from_block <= log['blockNumber'] <= to_block]
+
+    def get_transaction(self, txn_hash: str):
+        return self.transactions[txn_hash]
+
+
+def test_first_sync_checkpoints_head_and_later_events_are_indexed(tmp_path):
+    chain = FakeChain(block_number=100)
+    indexer = AllocationIndexer(chain, str(tmp_path / "index.db"), chunk_blocks=5)
+
+    # Without a start block the first sync indexes nothing, but remembers where it started
+    assert indexer.sync() == 0
+    assert indexer.checkpoint() == 98
+    assert chain.log_queries == []
+
+    chain.record("applicant-1", "U1")
+    chain.block_number += 10
+    assert indexer.sync() == 1
+    assert chain.log_queries[0][0] == 99
+
+    allocation = indexer.get_allocation("applicant-1")
+    assert allocation['shelter_unit_id'] == "U1"
+    assert allocation['vulnerability_score'] == 42.5
+    assert indexer.checkpoint() == chain.block_number - 2
+
+
+def test_restart_resumes_from_checkpoint(tmp_path):
+    chain = FakeChain(block_number=50)
+    db_path = str(tmp_path / "index.db")
+    AllocationIndexer(chain, db_path).sync()
+
+    chain.record("applicant-2", "U2")
+    chain.block_number += 5
+    restarted = AllocationIndexer(chain, db_path)
+    assert restarted.sync() == 1
+    assert restarted.find_allocations(shelter_unit_id="U2")[0]['applicant_id'] == "applicant-2"
@@ -0,0 +1,73 @@
+import random
+from state_backend import MemoryStateBackend
+from hospital_allocation.inventory_index import InventoryIndex
+
+WORDS = ["rice", "flour", "baby", "formula", "water", "bottled", "oral", "rehydration", "salts", "tarpaulin", "blanket"]
+
+
+def warehouse(*names, role="warehouse_manager"):
+    return {"role": role, "profile_data": {"inventory_items": [{"name": name, "quantity": 10} for name in names]}}
+
+
+def setup(profiles_by_id):
+    backend = MemoryStateBackend()
+    profiles = backend.collection("user_profiles")
+    for key, profile in profiles_by_id.items():
+        profiles.put(key, profile)
+    return profiles, InventoryIndex(profiles)
+
+
+def scan(profiles, query, prefix=False):
+    """The old linear search over every warehouse's items"""
+    query = query.lower()
+    hits = set()
+    for key, profile in profiles.items():
+        if profile.get("role") != "warehouse_manager":
+            continue
+        for item in profile["profile_data"]["inventory_items"]:
+            name = str(item.get("name", "")).lower()
+            words = name.replace("-", " ").split()
+            if (all(any(w.startswith(q) for w in words) for q in query.split()) if prefix else query in name):
+                hits.add(key)
+    return hits
+
+
+def test_substring_and_prefix_search_match_a_full_scan():
+    rng = random.Random(11)
+    stock = {
+        f"W{i}": warehouse(*(" ".join(rng.sample(WORDS, rng.randint(1, 3))).title() for _ in range(rng.randint(0, 6))))
+        for i in range(40)
+    }
+    profiles, index = setup(stock)
+    for query in ["r", "ri", "rice", "ice", "baby formula", "Water", "lt", "tarpaulins", "xyz", "o"]:
+        assert index.search(query)[0] == scan(profiles, query), query
+    for query in ["ba", "bab form", "sal", "rehyd oral", "ater"]:
+        assert index.search(query, match="prefix")[0] == scan(profiles, query, prefix=True), query
+
+
+def test_positions_point_at_the_matching_items():
+    _, index = setup({"W1": warehouse("Rice", "Baby Formula", "Rice")})
+    ids, names = index.search("rice")
+    assert ids == {"W1"} and names == {"rice"}
+    assert index.positions("W1", names) == [0, 2]
+
+
+def test_restocked_and_deleted_warehouses_drop_their_postings():
+    profiles, index = setup({"W1": warehouse("Rice", "Water"), "W2": warehouse("Rice")})
+    profiles.put("W1", warehouse("Blanket"))
+    assert index.search("rice")[0] == {"W2"}
+    assert index.search("water")[0] == set()
+    profiles.delete("W2")
+    profiles.put("W1", warehouse("Blanket", role="volunteer"))
+    assert index.search("rice") == (set(), set())
+    assert index.stats() == {**index.stats(), "warehouses": 0, "distinct_names": 0, "grams": 0, "tokens": 0}
+
+
+def test_malformed_items_and_other_roles_are_ignored():
+    profiles, index = setup({
+        "W1": {"role": "warehouse_manager", "profile_data": {"inventory_items": ["oops", {"name": "Rice"}, {}]}},
+        "V1": warehouse("Rice", role="volunteer"),
+    })
+    ids, names = index.search("rice")
+    assert ids == {"W1"}
+    assert index.positions("W1", names) == [1]
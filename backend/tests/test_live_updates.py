@@ -0,0 +1,107 @@
+import asyncio
+from state_backend import MemoryStateBackend
+from aggregates import RunningTotals
+from live_updates import LiveChannel, Subscriber
+
+
+def channel(backend, **kwargs):
+    totals = RunningTotals(backend, {
+        "beds": ("hospitals", lambda h: h["available_beds"]),
+        "patients": ("patients", lambda p: 1),
+    })
+    return LiveChannel("hospital", backend, ["hospitals", "patients"], totals, tick_seconds=60, **kwargs)
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return events
+
+
+def test_one_delta_per_tick_with_only_the_changed_fields():
+    backend = MemoryStateBackend()
+    hospitals = backend.collection("hospitals")
+    hospitals.put("H1", {"name": "Apollo", "available_beds": 10, "tags": ["icu"]})
+    live = channel(backend)
+
+    async def run():
+        subscriber = await live.subscribe()
+        hospitals.update("H1", {"available_beds": 9})
+        hospitals.update("H1", {"available_beds": 8, "tags": ["icu", "burns"]})
+        hospitals.put("H2", {"name": "MIOT", "available_beds": 4})
+        backend.collection("patients").put("P1", {"assigned_hospital": "H1"})
+        await live.publish()
+        hospitals.delete("H2")
+        hospitals.update("H1", {"name": "Apollo"})  # no field changes
+        await live.publish()
+        return drain(subscriber)
+
+    snapshot, first, second = asyncio.run(run())
+    assert snapshot["type"] == "snapshot" and snapshot["totals"] == {"beds": 10, "patients": 0}
+    assert first["changes"] == {
+        "hospitals": {"H1": {"available_beds": 8, "tags": ["icu", "burns"]}, "H2": {"name": "MIOT", "available_beds": 4}},
+        "patients": {"P1": {"assigned_hospital": "H1"}},
+    }
+    assert first["totals"] == {"beds": 12, "patients": 1}
+    assert second["changes"] == {"hospitals": {"H2": None}} and second["totals"] == {"beds": 8}
+
+
+def test_only_field_hashes_are_kept_between_ticks():
+    backend = MemoryStateBackend()
+    backend.collection("patients").put("P1", {"name": "A", "history": {"notes": "x" * 1000}})
+    live = channel(backend)
+    live.sync()
+    kept = live._fingerprints["patients"]["P1"]
+    assert set(kept) == {"name", "history"}
+    assert all(isinstance(value, int) for value in kept.values())
+
+
+def test_subscribing_after_an_idle_period_starts_from_the_snapshot():
+    backend = MemoryStateBackend(feed_size=4)
+    hospitals = backend.collection("hospitals")
+    live = channel(backend)
+
+    async def run():
+        first = await live.subscribe()
+        live.unsubscribe(first)
+        # Nobody is subscribed: these writes are not followed, and the feed trims past them
+        for i in range(10):
+            hospitals.put(f"H{i}", {"name": f"Hospital {i}", "available_beds": 1})
+        second = await live.subscribe()
+        await live.publish()
+        hospitals.update("H3", {"available_beds": 0})
+        await live.publish()
+        return drain(second)
+
+    events = asyncio.run(run())
+    assert [event["type"] for event in events] == ["snapshot", "delta"]
+    assert events[0]["totals"]["beds"] == 10
+    assert events[1]["changes"] == {"hospitals": {"H3": {"available_beds": 0}}}
+
+
+def test_trimmed_feed_while_subscribed_sends_a_resync():
+    backend = MemoryStateBackend(feed_size=4)
+    hospitals = backend.collection("hospitals")
+    live = channel(backend)
+
+    async def run():
+        subscriber = await live.subscribe()
+        for i in range(10):
+            hospitals.put(f"H{i}", {"name": f"Hospital {i}", "available_beds": 1})
+        await live.publish()
+        return drain(subscriber)
+
+    events = asyncio.run(run())
+    assert [event["type"] for event in events] == ["snapshot", "resync"]
+
+
+def test_slow_subscriber_backlog_is_replaced_by_a_resync():
+    async def run():
+        subscriber = Subscriber(queue_size=2)
+        offered = [subscriber.offer({"type": "delta", "n": i}) for i in range(3)]
+        return offered, drain(subscriber), subscriber.overflows
+
+    offered, events, overflows = asyncio.run(run())
+    assert offered == [True, True, False] and overflows == 1
+    assert [event["type"] for event in events] == ["resync"]
@@ -0,0 +1,220 @@
+import time
+import threading
+import pytest
+from state_backend import MemoryStateBackend, SQLiteStateBackend
+from blockchain.nonce_manager import NonceManager, TransactionQueue
+
+
+class FakeNode:
+    """
+    Transactions one account has sent. Like a real node, the pending nonce
+    stops at the first gap: anything above it waits in the queue.
+    """
+
+    def __init__(self, pending: int = 0):
+        self.accepted = set(range(pending))
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def fetch(self) -> int:
+        with self._lock:
+            nonce = 0
+            while nonce in self.accepted:
+                nonce += 1
+            return nonce
+
+    def send(self, nonce: int) -> bool:
+        with self._lock:
+            if nonce in self.accepted:
+                self.rejected += 1
+                return False
+            self.accepted.add(nonce)
+            return True
+
+
+def manager(node, backend, **kwargs):
+    return NonceManager(node.fetch, backend=backend, account="0xadmin", **kwargs)
+
+
+def send(nonces, node):
+    nonce = nonces.reserve()
+    if not node.send(nonce):
+        nonces.failed(nonce)
+    return nonce
+
+
+def test_local_nonces_are_sequential_and_resync_rereads_the_node():
+    node = FakeNode(pending=7)
+    nonces = NonceManager(node.fetch)
+    assert [nonces.reserve() for _ in range(3)] == [7, 8, 9]
+    node.send(7)
+    assert nonces.resync() == 8
+    assert nonces.reserve() == 8
+
+
+def test_local_reservations_from_many_threads_are_unique_and_gapless():
+    nonces = NonceManager(FakeNode(pending=3).fetch)
+    reserved = []
+    lock = threading.Lock()
+
+    def run():
+        for _ in range(100):
+            nonce = nonces.reserve()
+            with lock:
+                reserved.append(nonce)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(reserved) == list(range(3, 803))
+    assert nonces.stats()["resyncs"] == 1
+
+
+def test_failed_local_resync_refetches_on_the_next_reservation():
+    node = FakeNode(pending=2)
+    calls = []
+
+    def flaky_fetch():
+        calls.append(1)
+        if len(calls) == 2:
+            raise ConnectionError("node down")
+        return node.fetch()
+
+    nonces = NonceManager(flaky_fetch)
+    assert nonces.reserve() == 2
+    assert nonces.resync() is None
+    assert nonces.reserve() == 2  # the node never got 2, so it is handed out again
+    assert len(calls) == 3
+
+
+def test_transaction_queue_runs_jobs_in_order_on_one_thread():
+    submitter = TransactionQueue()
+    ran = []
+
+    def job(i):
+        ran.append((i, threading.current_thread().name))
+        return i * 2
+
+    futures = [submitter.submit(lambda i=i: job(i)) for i in range(50)]
+    assert [future.result(timeout=5) for future in futures] == [i * 2 for i in range(50)]
+    assert [i for i, _ in ran] == list(range(50))
+    assert {name for _, name in ran} == {"tx-submitter"}
+
+
+def test_transaction_queue_reports_job_errors_and_keeps_running():
+    submitter = TransactionQueue()
+
+    def boom():
+        raise ValueError("nonce too low")
+
+    with pytest.raises(ValueError, match="nonce too low"):
+        submitter.run(boom, timeout=5)
+    assert submitter.run(lambda: "sent", timeout=5) == "sent"
+    assert submitter.stats() == {"queued": 0, "sent": 1, "errors": 1}
+
+
+def test_workers_sharing_a_backend_never_send_the_same_nonce():
+    node, backend = FakeNode(pending=5), MemoryStateBackend()
+    workers = [manager(node, backend) for _ in range(4)]
+
+    def run(nonces):
+        for i in range(50):
+            nonce = nonces.reserve()
+            if i % 10 == 3:
+                nonces.failed(nonce)  # the node never took it
+            else:
+                node.send(nonce)
+
+    threads = [threading.Thread(target=run, args=(w,)) for w in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert node.rejected == 0
+    pool = {r["nonce"] for r in backend.collection("released_nonces").values()}
+    assert node.accepted | pool == set(range(max(node.accepted) + 1))
+
+
+def test_failed_nonce_is_reused_by_another_worker():
+    node, backend = FakeNode(), MemoryStateBackend()
+    first, second = manager(node, backend), manager(node, backend)
+    send(first, node)
+    lost = first.reserve()
+    node.send(second.reserve())
+    first.failed(lost)
+
+    assert backend.counter("nonce_released:0xadmin") == 1
+    assert second.reserve() == lost
+    assert second.stats()["reused"] == 1
+    assert backend.counter("nonce_released:0xadmin") == 0
+
+
+def test_reserve_skips_the_pool_query_when_nothing_was_released():
+    node, backend = FakeNode(), MemoryStateBackend()
+    nonces = manager(node, backend)
+    nonces.reserve()
+
+    def no_query(*args):
+        raise AssertionError("released pool queried")
+
+    nonces._released.find = no_query
+    assert nonces.reserve() == 1
+
+
+def test_released_nonces_the_node_already_took_are_dropped():
+    node, backend = FakeNode(), MemoryStateBackend()
+    nonces = manager(node, backend)
+    nonce = nonces.reserve()
+    nonces.failed(nonce)  # the send raised, but the node had taken it after all
+    node.send(nonce)
+    nonces.resync()
+    assert len(backend.collection("released_nonces")) == 0
+    assert backend.counter("nonce_released:0xadmin") == 0
+    assert nonces.reserve() == 1
+
+
+def test_quiet_resync_recovers_nonces_lost_in_a_crash():
+    node, backend = FakeNode(pending=3), MemoryStateBackend()
+    crashed = manager(node, backend)
+    crashed.reserve()
+    crashed.reserve()  # reserved 3 and 4, then died before sending either
+
+    survivor = manager(node, backend, lost_after_seconds=0.05)
+    assert survivor.resync() == 5  # 4 could still be on its way
+    time.sleep(0.1)
+    assert survivor.resync() == 3
+    assert survivor.stats()["resets"] == 1
+    assert send(survivor, node) == 3
+
+
+def test_stuck_nonce_is_recovered_under_load_without_resending_queued_ones():
+    node, backend = FakeNode(pending=3), MemoryStateBackend()
+    crashed, busy = manager(node, backend), manager(node, backend, lost_after_seconds=0.1)
+    crashed.reserve()  # 3 never reaches the node
+    assert send(busy, node) == 4
+
+    busy.resync()  # starts watching pending nonce 3
+    time.sleep(0.15)
+    assert send(busy, node) == 5
+    busy.resync()
+    assert busy.stats()["recovered"] == 1
+    assert send(busy, node) == 3
+    assert send(busy, node) == 6
+    assert node.rejected == 0 and busy.stats()["resets"] == 0
+
+
+def test_counter_that_outlived_a_dev_chain_restart_is_reset(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    node = FakeNode(pending=40)
+    before = manager(node, SQLiteStateBackend(db_path), lost_after_seconds=0.05)
+    for _ in range(3):
+        send(before, node)
+
+    # The chain restarts from scratch but the state file survives; a new worker process starts later
+    time.sleep(0.1)
+    restarted = FakeNode()
+    after = manager(restarted, SQLiteStateBackend(db_path), lost_after_seconds=0.05)
+    assert send(after, restarted) == 0
+    assert restarted.rejected == 0
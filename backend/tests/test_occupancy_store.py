@@ -0,0 +1,147 @@
+import threading
+import numpy as np
+import pytest
+from state_backend import MemoryStateBackend
+from hospital_allocation.occupancy_store import (
+    HISTORY_HOURS, HOURS_PER_DAY, WINDOW_HOURS, OccupancyFeed, OccupancyRingBuffer, OccupancyStore
+)
+
+START = 480000
+HOUR = 3600
+
+
+def reference_features(start, initial, observations, head):
+    """Recompute the live features from scratch over every hour since `start`"""
+    occupancy, admissions, discharges = {}, {}, {}
+    last = initial
+    for hour in range(start, head + 1):
+        for obs_hour, occ, adm, dis in observations:
+            if obs_hour == hour:
+                last = occ
+                admissions[hour] = admissions.get(hour, 0) + adm
+                discharges[hour] = discharges.get(hour, 0) + dis
+        occupancy[hour] = last
+
+    week = [h for h in range(head - WINDOW_HOURS + 1, head + 1) if h >= start]
+    day = [h for h in range(head - HOURS_PER_DAY + 1, head + 1) if h >= start]
+    week_ago = head - (WINDOW_HOURS - HOURS_PER_DAY)
+    return [
+        occupancy[head],
+        occupancy[week_ago] if week_ago >= start else occupancy[head] * 0.95,
+        sum(occupancy[h] for h in week) / len(week),
+        sum(admissions.get(h, 0) for h in week) / max(1.0, len(week) / HOURS_PER_DAY),
+        sum(admissions.get(h, 0) for h in day),
+        sum(discharges.get(h, 0) for h in day)
+    ]
+
+
+def test_ring_buffer_matches_a_full_recomputation():
+    rng = np.random.default_rng(3)
+    buffer = OccupancyRingBuffer(START, 40)
+    observations = []
+    hour = START
+    for _ in range(400):
+        hour += int(rng.integers(0, 4))
+        observation = (hour, float(rng.integers(0, 100)), float(rng.integers(0, 5)), float(rng.integers(0, 5)))
+        observations.append(observation)
+        buffer.record(*observation)
+        assert buffer.features() == pytest.approx(reference_features(START, 40, observations, hour))
+
+
+def test_ring_buffer_after_a_gap_longer_than_the_history():
+    buffer = OccupancyRingBuffer(START, 40)
+    buffer.record(START, 55, admissions=3)
+    buffer.advance(START + 2 * HISTORY_HOURS)
+    occ_lag1, occ_lag7, occ_roll7, adm_roll7, adm_lag1, dis_lag1 = buffer.features()
+    assert occ_lag1 == occ_lag7 == occ_roll7 == 55
+    assert adm_roll7 == adm_lag1 == dis_lag1 == 0
+
+
+def test_store_refuses_unregistered_hospitals():
+    store = OccupancyStore()
+    store.register(["0", "1"])
+    with pytest.raises(KeyError):
+        store.record("H001", 50)
+    assert "1" in store and "H001" not in store
+
+
+def test_register_drops_unlisted_hospitals_and_keeps_live_history():
+    store = OccupancyStore()
+    store.register(["0", "1", "2"])
+    store.record("2", 77, admissions=4, now=store.hour * HOUR)
+    store.register(["2", "3"])
+    assert sorted(store.rows) == ["2", "3"]
+    assert store.feature_rows(store.row_for(["2"]))[0][0] == 77
+
+
+def test_concurrent_updates_and_reads_keep_every_admission():
+    store = OccupancyStore()
+    store.register([str(i) for i in range(8)])
+    now = store.hour * HOUR
+    rows = store.row_for([str(i) for i in range(8)])
+    before = store.feature_rows(rows)[:, 4].copy()
+
+    def update(hospital_id):
+        for _ in range(200):
+            store.record(hospital_id, 50, admissions=1, now=now)
+
+    threads = [threading.Thread(target=update, args=(str(i),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for _ in range(200):
+        store.feature_rows(rows)
+    for thread in threads:
+        thread.join()
+    assert (store.feature_rows(rows)[:, 4] - before).tolist() == [200] * 8
+
+
+def feed(backend, hospital_ids, **kwargs):
+    store = OccupancyStore()
+    store.register(hospital_ids)
+    return OccupancyFeed(backend.collection("occupancy_observations"), store, **kwargs)
+
+
+def test_workers_replay_each_others_observations():
+    backend = MemoryStateBackend()
+    changed = []
+    writer = feed(backend, ["0", "1"])
+    reader = feed(backend, ["0", "1"], on_change=changed.append)
+    writer.rebuild()
+    reader.rebuild()
+    assert changed == [None, None]
+
+    writer.record("1", 64, admissions=2)
+    writer.record("9", 10)  # a row only another infra table has
+    reader.sync()
+    assert changed[-1] == "1"
+    assert np.array_equal(reader.store.features[:2], writer.store.features[:2])
+
+    late = feed(backend, ["0", "1"])
+    late.sync()
+    assert np.array_equal(late.store.features[:2], writer.store.features[:2])
+
+
+def test_prune_keeps_the_newest_expired_observation_per_hospital():
+    backend = MemoryStateBackend()
+    occupancy = feed(backend, ["0", "1"])
+    now = START * HOUR
+    expired_at = now - (HISTORY_HOURS + 5) * HOUR
+    for i, (hospital_id, at) in enumerate([("0", expired_at), ("0", expired_at + HOUR), ("1", expired_at), ("0", now)]):
+        occupancy.observations.put(f"o{i}", {"observation_id": f"o{i}", "hospital_id": hospital_id, "occupancy": 10 + i,
+                                             "admissions": 0, "discharges": 0, "at": at})
+
+    assert occupancy.prune(now) == 1
+    assert sorted(key for key, _ in occupancy.observations.items()) == ["o1", "o2", "o3"]
+    assert occupancy.prune(now) == 0
+
+
+def test_record_prunes_at_most_once_per_hour_across_workers():
+    backend = MemoryStateBackend()
+    first, second = feed(backend, ["0"]), feed(backend, ["0"])
+    pruned = []
+    for worker in (first, second):
+        worker.prune = lambda now, worker=worker: pruned.append(worker)
+    for _ in range(3):
+        first.record("0", 20)
+        second.record("0", 21)
+    assert pruned == [first]
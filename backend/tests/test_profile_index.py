@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from state_backend import MemoryStateBackend
+from hospital_allocation.scoring import haversine_vec
+from hospital_allocation.profile_index import GeoGrid, ProfileGeoIndex
+
+
+def brute_force(points, lat, lon, radius_km=None, limit=None):
+    keys = list(points)
+    coords = np.array([points[key] for key in keys])
+    dist = haversine_vec(lon, lat, coords[:, 1], coords[:, 0])
+    order = [i for i in np.argsort(dist, kind="stable") if radius_km is None or dist[i] <= radius_km]
+    return [(pytest.approx(float(dist[i])), keys[i]) for i in order][:limit]
+
+
+def scattered(rng, n, lat_range, lon_range):
+    return {f"p{i}": (float(rng.uniform(*lat_range)), float(rng.uniform(*lon_range))) for i in range(n)}
+
+
+@pytest.mark.parametrize("lat_range, lon_range", [
+    ((12.8, 13.3), (80.0, 80.4)),      # one city
+    ((-10, 10), (175, 185)),           # across the antimeridian (wrapped below)
+    ((85, 89.9), (-180, 180)),         # near the pole, where cells get narrow
+])
+def test_grid_queries_match_a_full_scan(lat_range, lon_range):
+    rng = np.random.default_rng(7)
+    points = {key: (lat, (lon + 180) % 360 - 180) for key, (lat, lon) in scattered(rng, 300, lat_range, lon_range).items()}
+    grid = GeoGrid(cell_deg=0.5)
+    for key, (lat, lon) in points.items():
+        grid.add(key, lat, lon)
+
+    for _ in range(20):
+        lat = float(rng.uniform(*lat_range))
+        lon = float((rng.uniform(*lon_range) + 180) % 360 - 180)
+        assert grid.nearby(lat, lon, radius_km=150) == brute_force(points, lat, lon, radius_km=150)
+        assert grid.nearby(lat, lon, limit=5) == brute_force(points, lat, lon, limit=5)
+        assert grid.nearby(lat, lon, radius_km=300, limit=3) == brute_force(points, lat, lon, radius_km=300, limit=3)
+
+
+def test_moved_and_removed_points_leave_their_old_cells():
+    grid = GeoGrid(cell_deg=0.1)
+    grid.add("a", 13.0, 80.2)
+    grid.add("a", 28.6, 77.2)
+    assert len(grid.cells) == 1 and grid.nearby(13.0, 80.2, radius_km=10) == []
+    grid.remove("a")
+    grid.remove("a")
+    assert len(grid) == 0 and grid.cells == {}
+
+
+def profile(role, lat=None, lon=None, **data):
+    if lat is not None:
+        data.update(location_lat=lat, location_lon=lon)
+    return {"role": role, "profile_data": data}
+
+
+def test_profile_index_is_partitioned_by_role_and_follows_other_writers():
+    backend = MemoryStateBackend()
+    profiles = backend.collection("user_profiles")
+    profiles.put("d1", profile("driver", 13.00, 80.20, available=True))
+    profiles.put("d2", profile("driver", 13.01, 80.21, available=False))
+    profiles.put("v1", profile("volunteer", 13.00, 80.20))
+    profiles.put("d3", profile("driver"))
+    index = ProfileGeoIndex(profiles)
+
+    assert [p["profile_data"]["available"] for _, p in index.nearby("driver", 13.0, 80.2, 5)] == [True, False]
+    assert index.nearby("driver", 13.0, 80.2, 5, where=lambda p: not p["profile_data"]["available"])[0][1] is profiles.get("d2")
+    assert [p["role"] for p in index.members("driver", located=False)] == ["driver"]
+
+    # Another worker moves d1 away and deletes the volunteer
+    profiles.put("d1", profile("driver", 28.6, 77.2, available=True))
+    profiles.delete("v1")
+    assert len(index.nearby("driver", 13.0, 80.2, 5)) == 1
+    assert index.nearby("volunteer", 13.0, 80.2, 5) == []
+    assert index.stats()["roles"]["driver"] == {"profiles": 3, "located": 2, "cells": 2}
+
+
+def test_filtered_and_restricted_queries_still_fill_the_limit():
+    backend = MemoryStateBackend()
+    profiles = backend.collection("user_profiles")
+    rng = np.random.default_rng(3)
+    for i in range(200):
+        profiles.put(f"d{i}", profile("driver", float(rng.uniform(12.9, 13.1)), float(rng.uniform(80.1, 80.3)), n=i))
+    index = ProfileGeoIndex(profiles)
+    everyone = index.nearby("driver", 13.0, 80.2, 50)
+
+    odd = index.nearby("driver", 13.0, 80.2, 50, limit=10, where=lambda p: p["profile_data"]["n"] % 2 == 1)
+    assert odd == [row for row in everyone if row[1]["profile_data"]["n"] % 2 == 1][:10]
+
+    among = {f"d{i}" for i in range(0, 200, 25)}
+    few = index.nearby("driver", 13.0, 80.2, 50, limit=3, among=among)
+    assert few == [row for row in everyone if f"d{row[1]['profile_data']['n']}" in among][:3]
@@ -0,0 +1,60 @@
+from hospital_allocation.prompt_builder import CompactPromptBuilder, estimate_tokens, linked_infra_id
+
+CANDIDATES = [
+    {"hospital_id": "0", "hospital_name": "Apollo Hospital", "distance_km": 1.2},
+    {"hospital_id": "1", "hospital_name": "MIOT International", "distance_km": 3.4},
+]
+
+
+def live_data():
+    return {
+        "hospitals": [
+            {"hospital_id": "H1", "name": "Apollo Clinic Greams Road", "infra_id": "0"},  # linked by id, name differs
+            {"hospital_id": "H2", "name": " miot international "},                         # linked by name
+            {"hospital_id": "H3", "name": "MIOT International", "infra_id": "7"},          # explicitly another row
+            {"hospital_id": "1", "name": "Unrelated Nursing Home"},                        # id equals a row index
+        ],
+        "doctors": [
+            {"doctor_id": "D1", "hospital_id": "H1"},
+            {"doctor_id": "D2", "hospital_id": "H2"},
+            {"doctor_id": "D3", "hospital_id": "0"},
+            {"doctor_id": "D4", "hospital_id": "1"},
+        ],
+        "patients": [
+            {"patient_id": "P1", "assigned_hospital": "H2"},
+            {"patient_id": "P2", "assigned_hospital": "1"},
+        ],
+    }
+
+
+def test_linked_infra_id_prefers_the_explicit_link():
+    ids_by_name = {"miot international": "1"}
+    assert linked_infra_id({"name": "MIOT International", "infra_id": 7}, ids_by_name) == "7"
+    assert linked_infra_id({"name": "MIOT International "}, ids_by_name) == "1"
+    assert linked_infra_id({"name": "Elsewhere"}, ids_by_name) is None
+
+
+def test_select_relevant_follows_infra_links_not_raw_ids():
+    relevant = CompactPromptBuilder().select_relevant(CANDIDATES, live_data())
+    assert [h["hospital_id"] for h in relevant["hospitals"]] == ["H1", "H2"]
+    assert [d["doctor_id"] for d in relevant["doctors"]] == ["D1", "D2"]
+    assert [p["patient_id"] for p in relevant["patients"]] == ["P1"]
+
+
+def test_select_relevant_uses_the_given_link_function():
+    relevant = CompactPromptBuilder().select_relevant(CANDIDATES, live_data(), infra_id_of=lambda h: h.get("infra_id"))
+    assert [h["hospital_id"] for h in relevant["hospitals"]] == ["H1"]
+
+
+def test_fit_sections_stays_within_the_allowance_and_drops_patients_first():
+    builder = CompactPromptBuilder()
+    relevant = {
+        "hospitals": [{"hospital_id": f"H{i}", "name": f"Hospital {i}"} for i in range(3)],
+        "doctors": [{"hospital_id": "H0", "name": f"Dr {i}"} for i in range(50)],
+        "patients": [{"patient_id": f"P{i}", "assigned_hospital": "H0"} for i in range(50)],
+    }
+    tables, counts = builder.fit_sections(relevant, token_allowance=300)
+    assert sum(estimate_tokens(table) + 1 for table in tables.values() if table != "(none)") <= 300
+    assert counts["hospitals"] == {"included": 3, "dropped": 0}
+    assert counts["patients"]["included"] == 0 and tables["patients"] == "(none)"
+    assert counts["doctors"]["included"] + counts["doctors"]["dropped"] == 50
@@ -0,0 +1,67 @@
+import time
+from web3 import Web3
+from blockchain.read_cache import AllocationReadCache, applicant_key
+
+ALLOCATION = {"applicant_id": None, "vulnerability_score": 72.5, "shelter_unit_id": "U3", "timestamp": 1700000000, "is_approved": True}
+
+
+def event(applicant_id, block_number, block_hash, score=7250):
+    return {
+        "args": {"applicantId": Web3.keccak(text=applicant_id), "vulnerabilityScore": score,
+                 "shelterUnitId": "U3", "timestamp": 1700000000},
+        "blockNumber": block_number,
+        "blockHash": bytes.fromhex(block_hash[2:]),
+    }
+
+
+def test_hit_returns_the_allocation_under_the_asked_applicant_id():
+    cache = AllocationReadCache()
+    assert cache.get("A-1") is None
+    cache.put(applicant_key("A-1"), dict(ALLOCATION))
+    result = cache.get("A-1")
+    assert result["success"] and result["cached"] and result["finalized"]
+    assert result["data"]["applicant_id"] == "A-1" and result["data"]["shelter_unit_id"] == "U3"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_not_found_is_cached_briefly_and_replaced_by_a_write():
+    cache = AllocationReadCache(negative_ttl_seconds=0.05)
+    cache.put_missing("A-2")
+    assert cache.get("A-2")["success"] is False
+    time.sleep(0.06)
+    assert cache.get("A-2") is None
+
+    cache.put_missing("A-2")
+    cache.put(applicant_key("A-2"), dict(ALLOCATION))
+    assert cache.get("A-2")["success"]
+
+
+def test_event_entries_finalize_once_deep_enough_on_the_canonical_chain():
+    cache = AllocationReadCache(finality_depth=5)
+    canonical = {100: "0x" + "aa" * 32, 101: "0x" + "bb" * 32}
+    assert cache.put_events([event("A-3", 100, canonical[100]), event("A-4", 101, "0x" + "cc" * 32)]) == 2
+    assert cache.get("A-3")["data"]["vulnerability_score"] == 72.5
+    assert not cache.get("A-3")["finalized"]
+
+    cache.check_finality(104, canonical.get)  # not deep enough yet
+    assert cache.stats()["unfinalized"] == 2
+
+    cache.check_finality(106, canonical.get)
+    assert cache.get("A-3")["finalized"]
+    # A-4's block was reorged away: it is read through again
+    assert cache.get("A-4") is None
+    assert cache.stats()["reorg_evictions"] == 1
+
+
+def test_entry_rewritten_during_a_finality_check_is_left_alone():
+    cache = AllocationReadCache(finality_depth=1)
+    cache.put_events([event("A-5", 10, "0x" + "aa" * 32)])
+
+    def block_hash_at(block_number):
+        # A newer event for the same applicant lands while the node is being asked
+        cache.put_events([event("A-5", 12, "0x" + "dd" * 32, score=9000)])
+        return "0x" + "ff" * 32
+
+    cache.check_finality(11, block_hash_at)
+    assert cache.get("A-5")["data"]["vulnerability_score"] == 90.0
+    assert cache.stats()["reorg_evictions"] == 0
@@ -0,0 +1,70 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from hospital_allocation.occupancy_store import LIVE_FEATURES
+from hospital_allocation.scoring import (
+    CandidateScorer, NEXT_DAY_FEATURES, SUITABILITY_FEATURES, haversine_vec
+)
+
+
+def infra_table():
+    return pd.DataFrame({
+        "facility_name": ["Apollo", "MIOT", "Fortis Malar", "Global Health City"],
+        "latitude": [13.0604, 13.0185, 13.0067, 12.9010],
+        "longitude": [80.2496, 80.1850, 80.2575, 80.2279],
+        "total_beds": [500, 300, 180, 1000],
+        "icu_beds": [60, 40, 20, 120],
+    }, index=[10, 11, 12, 13])
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+def test_vectorized_distance_matches_the_scalar_formula():
+    infra = infra_table()
+    distances = haversine_vec(80.27, 13.08, infra["longitude"].to_numpy(), infra["latitude"].to_numpy())
+    expected = [haversine(80.27, 13.08, lon, lat) for lon, lat in zip(infra["longitude"], infra["latitude"])]
+    assert distances == pytest.approx(expected)
+
+
+def test_candidate_features_for_selected_rows_match_a_row_by_row_build():
+    infra = infra_table()
+    scorer = CandidateScorer(infra)
+    positions = np.array([3, 1])
+    pred_next_occ = np.array([950.0, 120.0])
+
+    features = scorer.candidate_features(80.27, 13.08, 4, pred_next_occ, positions)
+    assert list(features.index) == [13, 11]
+    assert list(features.columns) == SUITABILITY_FEATURES
+    for (label, row), occ in zip(infra.iloc[positions].iterrows(), pred_next_occ):
+        got = features.loc[label]
+        assert got["dist_km"] == pytest.approx(haversine(80.27, 13.08, row["longitude"], row["latitude"]))
+        assert got["pred_beds_available"] == max(0, row["total_beds"] - occ)
+        assert got["hospital_icu_beds"] == row["icu_beds"]
+        assert got["req_icu"] == 1 and got["severity"] == 4
+    # Predicted occupancy over capacity never yields negative free beds
+    assert (scorer.candidate_features(80.27, 13.08, 2, np.full(4, 2000.0))["pred_beds_available"] == 0).all()
+
+
+def test_next_day_features_keep_the_model_column_order():
+    scorer = CandidateScorer(infra_table())
+    live = np.arange(2 * len(LIVE_FEATURES), dtype=float).reshape(2, len(LIVE_FEATURES))
+    X = scorer.next_day_features(live, np.array([0, 2]))
+    assert list(X.columns) == NEXT_DAY_FEATURES
+    assert list(X.index) == [10, 12]
+    assert X["total_beds"].tolist() == [500, 180]
+    assert X[LIVE_FEATURES].to_numpy().tolist() == live.tolist()
+
+
+def test_rank_keeps_the_top_k_by_model_score_with_infra_columns():
+    infra = infra_table()
+    scorer = CandidateScorer(infra)
+    candidates = scorer.candidate_features(80.27, 13.08, 3, np.full(4, 100.0))
+    ranked = scorer.rank(candidates, np.array([0.2, 0.9, 0.5, 0.1]), top_k=2)
+    assert list(ranked.index) == [11, 12]
+    assert ranked["facility_name"].tolist() == ["MIOT", "Fortis Malar"]
+    assert ranked["ml_prob"].tolist() == [0.9, 0.5]
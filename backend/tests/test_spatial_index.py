@@ -0,0 +1,42 @@
+import numpy as np
+from hospital_allocation.scoring import haversine_vec
+from hospital_allocation.spatial_index import HospitalSpatialIndex
+
+
+def random_sites(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(12.8, 13.3, n), rng.uniform(80.0, 80.4, n)
+
+
+def brute_force(latitude, longitude, lat, lon, radius_km):
+    return np.flatnonzero(haversine_vec(lon, lat, longitude, latitude) <= radius_km)
+
+
+def test_radius_query_matches_a_full_scan():
+    latitude, longitude = random_sites(500)
+    index = HospitalSpatialIndex(latitude, longitude)
+    assert index.tree is not None
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        lat, lon = rng.uniform(12.8, 13.3), rng.uniform(80.0, 80.4)
+        radius_km = float(rng.uniform(0.5, 20))
+        positions = index.query_radius(lat, lon, radius_km)
+        assert positions.tolist() == brute_force(latitude, longitude, lat, lon, radius_km).tolist()
+
+
+def test_scan_fallback_without_a_tree_gives_the_same_positions():
+    latitude, longitude = random_sites(200, seed=2)
+    index = HospitalSpatialIndex(latitude, longitude)
+    expected = index.query_radius(13.05, 80.2, 8)
+    index.tree = None
+    assert index.query_radius(13.05, 80.2, 8).tolist() == expected.tolist()
+    assert len(expected) > 0
+
+
+def test_empty_index_and_far_away_points():
+    empty = HospitalSpatialIndex(np.array([]), np.array([]))
+    assert len(empty) == 0 and empty.query_radius(13.0, 80.2, 50).size == 0
+
+    latitude, longitude = random_sites(50)
+    index = HospitalSpatialIndex(latitude, longitude)
+    assert index.query_radius(28.6, 77.2, 100).size == 0  # Delhi, nowhere near the Chennai sites
@@ -0,0 +1,171 @@
+import threading
+import pytest
+from state_backend import ChangeFollower, MemoryStateBackend, SQLiteStateBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateBackend(feed_size=50)
+    return SQLiteStateBackend(str(tmp_path / "state.db"), feed_size=50)
+
+
+class KeyMirror(ChangeFollower):
+    """Mirrors one collection's records, the way the dashboard followers do"""
+
+    def reset(self):
+        self.records = {}
+
+    def apply(self, collection, key, record):
+        if record is None:
+            self.records.pop(key, None)
+        else:
+            self.records[key] = record
+
+
+def overflow_feed(collection):
+    # Past feed_size, and enough writes for SQLite's periodic trim to run
+    for i in range(1000):
+        collection.put(f"T{i}", {"free": i})
+
+
+def mirror(backend):
+    follower = KeyMirror(backend, ["beds"])
+    follower.reset()
+    return follower
+
+
+def test_records_round_trip_and_update_merges(backend):
+    beds = backend.collection("beds")
+    beds.put("H1", {"name": "Apollo", "free": 4})
+    assert beds.update("H1", {"free": 3}) == {"name": "Apollo", "free": 3}
+    assert beds.update("missing", {"free": 1}) is None
+    assert beds.get("H1") == {"name": "Apollo", "free": 3}
+    assert "H1" in beds and len(beds) == 1
+    assert beds.delete("H1") and not beds.delete("H1")
+    assert beds.items() == []
+
+
+def test_seed_only_adds_missing_records(backend):
+    beds = backend.collection("beds")
+    beds.put("H1", {"free": 9})
+    assert beds.seed([("H1", {"free": 0}), ("H2", {"free": 5})]) == 1
+    assert beds.get("H1") == {"free": 9}
+    assert beds.seed([("H2", {"free": 0})]) == 0
+
+
+def test_counters(backend):
+    assert backend.counter("c") == 0
+    assert backend.incr("c", 5) == 5
+    assert backend.raise_counter("c", 3) == 5
+    assert backend.raise_counter("c", 8) == 8
+    assert not backend.compare_and_set("c", 5, 1)
+    assert backend.compare_and_set("c", 8, 1) and backend.counter("c") == 1
+    assert backend.compare_and_set("fresh", 0, 7) and backend.counter("fresh") == 7
+
+
+def test_concurrent_increments_are_not_lost(backend):
+    def run():
+        for _ in range(100):
+            backend.incr("hits")
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.counter("hits") == 400
+
+
+def test_change_feed_lists_writes_in_order_and_reports_trimming(backend):
+    beds = backend.collection("beds")
+    start = backend.version()
+    beds.put("H1", {"free": 1})
+    beds.update("H1", {"free": 2})
+    beds.delete("H1")
+    backend.incr("not-in-the-feed")
+
+    feed = backend.changes(start)
+    assert [(c["key"], c["op"]) for c in feed["changes"]] == [("H1", "put"), ("H1", "put"), ("H1", "delete")]
+    assert feed["version"] == backend.version() == start + 3
+    assert not feed["truncated"]
+
+    overflow_feed(beds)
+    assert backend.changes(start)["truncated"]
+    assert not backend.changes(backend.version())["truncated"]
+
+
+def test_follower_replays_the_feed_and_rebuilds_once_it_was_trimmed(backend):
+    beds = backend.collection("beds")
+    beds.put("H1", {"free": 1})
+    follower = mirror(backend)
+    follower.sync()
+    assert follower.records == {"H1": {"free": 1}} and follower.rebuilds == 1
+
+    beds.put("H2", {"free": 2})
+    beds.delete("H1")
+    follower.sync()
+    assert follower.records == {"H2": {"free": 2}} and follower.rebuilds == 1
+
+    overflow_feed(beds)
+    beds.delete("H2")
+    follower.sync()
+    assert follower.rebuilds == 2
+    assert follower.records == {key: value for key, value in beds.items()}
+
+
+def test_sqlite_processes_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteStateBackend(path), SQLiteStateBackend(path)
+    follower = mirror(second)
+    follower.sync()
+
+    first.collection("beds").put("H1", {"free": 3})
+    first.incr("shared")
+    assert second.collection("beds").get("H1") == {"free": 3}
+    assert second.counter("shared") == 1
+    follower.sync()
+    assert follower.records == {"H1": {"free": 3}}
+
+
+def test_indexed_lookups_follow_updates_and_deletes(backend):
+    doctors = backend.collection("doctors")
+    doctors.put("D1", {"hospital_id": "H1", "status": "available", "specialty": "cardiology"})
+    # Created after some records exist: they are indexed too
+    doctors.create_index("status").create_index("hospital_id")
+    doctors.put("D2", {"hospital_id": "H1", "status": "busy", "specialty": "cardiology"})
+    doctors.put("D3", {"hospital_id": "H2", "specialty": "neurology"})
+
+    assert [d["specialty"] for d in doctors.find("hospital_id", "H1")] == ["cardiology", "cardiology"]
+    assert doctors.count("status", "available") == 1
+
+    doctors.update("D1", {"status": "busy"})
+    doctors.delete("D2")
+    assert doctors.find("status", "available") == []
+    assert [d["hospital_id"] for d in doctors.find("status", "busy")] == ["H1"]
+    # None matches records without the field
+    assert [d["hospital_id"] for d in doctors.find("status", None)] == ["H2"]
+    assert doctors.value_counts("status") == {"busy": 1, None: 1}
+
+
+def test_indexed_and_unindexed_lookups_agree(backend):
+    indexed, plain = backend.collection("indexed").create_index("role"), backend.collection("plain")
+    for i in range(40):
+        record = {"role": ["doctor", "patient", "admin"][i % 3], "age": 20 + i % 7}
+        if i % 10 == 0:
+            record.pop("role")
+        indexed.put(f"P{i}", record)
+        plain.put(f"P{i}", record)
+    for i in range(0, 40, 4):
+        indexed.update(f"P{i}", {"role": "patient"})
+        plain.update(f"P{i}", {"role": "patient"})
+
+    for role in ["doctor", "patient", "admin", None, "nobody"]:
+        assert sorted(map(str, indexed.find("role", role))) == sorted(map(str, plain.find("role", role)))
+        assert indexed.count("role", role) == plain.count("role", role)
+    assert indexed.value_counts("role") == plain.value_counts("role")
+
+
+def test_index_field_names_are_validated(backend):
+    with pytest.raises(ValueError):
+        backend.collection("doctors").create_index("status'); DROP TABLE records; --")
@@ -0,0 +1,61 @@
+import json
+import random
+from hospital_allocation.stream_parser import RankingStreamParser
+
+RESPONSE = {
+    "analysis": "Patient needs a cath lab {urgent}; \"closest\" isn't always best \\ see notes",
+    "final_ranking": [
+        {"hospital_id": "0", "rank": 1, "reasoning": "Has {cardiac} ICU and \"free\" beds"},
+        {"hospital_id": "3", "rank": 2, "reasoning": "Close, but ] and } appear in this text", "flags": {"icu": True}},
+        {"hospital_id": "1", "rank": 3, "reasoning": "Backslash at the end \\"},
+    ],
+    "notes": [{"hospital_id": "9", "rank": 99}],
+}
+TEXT = "```json\n" + json.dumps(RESPONSE, indent=2) + "\n```"
+
+
+def feed_in_chunks(text, sizes):
+    parser = RankingStreamParser()
+    seen, pos = [], 0
+    for size in sizes:
+        seen.append(parser.feed(text[pos:pos + size]))
+        pos += size
+    seen.append(parser.feed(text[pos:]))
+    return parser, seen
+
+
+def test_entries_come_out_whole_whatever_the_chunking():
+    rng = random.Random(4)
+    for _ in range(30):
+        sizes = [rng.randint(1, 40) for _ in range(len(TEXT))]
+        parser, _ = feed_in_chunks(TEXT, sizes)
+        assert parser.entries == RESPONSE["final_ranking"]
+    parser, _ = feed_in_chunks(TEXT, [1] * len(TEXT))
+    assert parser.entries == RESPONSE["final_ranking"]
+
+
+def test_each_entry_is_returned_by_the_chunk_that_completes_it():
+    cut = TEXT.index('"hospital_id": "3"')
+    parser = RankingStreamParser()
+    assert parser.feed(TEXT[:cut]) == [RESPONSE["final_ranking"][0]]
+    assert parser.feed(TEXT[cut:]) == RESPONSE["final_ranking"][1:]
+    # Objects after the ranking array are not entries
+    assert len(parser.entries) == 3
+
+
+def test_key_split_across_chunks_is_found():
+    text = '{"final_ranking": [{"hospital_id": "5", "rank": 1}]}'
+    parser = RankingStreamParser()
+    assert parser.feed(text[:8]) == []
+    assert parser.feed(text[8:]) == [{"hospital_id": "5", "rank": 1}]
+
+
+def test_result_parses_the_whole_response_and_tolerates_truncation():
+    parser = RankingStreamParser()
+    parser.feed(TEXT)
+    assert parser.result() == RESPONSE
+
+    truncated = RankingStreamParser()
+    truncated.feed(TEXT[:TEXT.index('"hospital_id": "1"')])
+    assert truncated.result() is None
+    assert len(truncated.entries) == 2
@@ -0,0 +1,243 @@
+import time
+import asyncio
+import threading
+from state_backend import MemoryStateBackend
+from blockchain.write_pipeline import AllocationWritePipeline, CONFIRMED, FAILED, PENDING
+
+
+class FakeHandler:
+    """
+    The handler calls the pipeline makes. Transactions mine on the next
+    receipt poll; a batch containing a `bad` applicant reverts. With
+    `drop_first` the first transaction never gets a receipt and the node
+    forgets it; with `stuck` none do and the node keeps holding them.
+    """
+
+    def __init__(self, bad=(), drop_first=False, stuck=False):
+        self.bad = set(bad)
+        self.drop_first = drop_first
+        self.stuck = stuck
+        self.sent = []
+        self.resyncs = 0
+        self.unreadable = set()
+        self._nonce = 0
+
+    def _send(self, applicant_ids, nonce):
+        if nonce is None:
+            nonce, self._nonce = self._nonce, self._nonce + 1
+        txn_hash = f"0x{len(self.sent):04x}"
+        self.sent.append({"hash": txn_hash, "applicants": applicant_ids, "nonce": nonce})
+        return txn_hash, nonce
+
+    def submit_allocation(self, applicant_id, vulnerability_score, shelter_unit_id, nonce=None):
+        return self._send([applicant_id], nonce)
+
+    def submit_allocations_batch(self, allocations, nonce=None):
+        return self._send([a["applicant_id"] for a in allocations], nonce)
+
+    def _tx(self, txn_hash):
+        return next(tx for tx in self.sent if tx["hash"] == txn_hash)
+
+    def get_receipt(self, txn_hash):
+        if self.stuck or (self.drop_first and txn_hash == "0x0000"):
+            return None
+        tx = self._tx(txn_hash)
+        return {"status": 0 if self.bad & set(tx["applicants"]) else 1, "hash": txn_hash}
+
+    def allocation_result(self, txn_hash, receipt):
+        if txn_hash in self.unreadable:
+            raise ValueError("bad log")
+        if receipt["status"] == 1:
+            return {"success": True, "transaction_hash": txn_hash}
+        return {"success": False, "transaction_hash": txn_hash, "error": "Transaction failed"}
+
+    def transaction_known(self, txn_hash):
+        return self.stuck
+
+    def resync_nonces(self):
+        self.resyncs += 1
+
+    def get_submission_stats(self):
+        return {}
+
+
+def pipeline(handler, **kwargs):
+    options = dict(receipt_poll_seconds=0.01, receipt_timeout_seconds=0.05, max_batch_size=20, max_batch_age_seconds=0.02)
+    options.update(kwargs)
+    return AllocationWritePipeline(handler, **options)
+
+
+async def settle(writes, jobs, timeout=3.0):
+    deadline = time.time() + timeout
+    while any(writes.status(job["job_id"])["status"] not in (CONFIRMED, FAILED) for job in jobs):
+        assert time.time() < deadline, [writes.status(job["job_id"])["status"] for job in jobs]
+        await asyncio.sleep(0.01)
+
+
+def test_queued_jobs_go_out_as_one_batch_transaction():
+    async def run():
+        handler = FakeHandler()
+        writes = pipeline(handler)
+        jobs = [writes.enqueue(f"a{i}", 42.5, "U1") for i in range(5)]
+        assert all(job["status"] == PENDING for job in jobs)
+        await settle(writes, jobs)
+        return handler, writes, jobs
+
+    handler, writes, jobs = asyncio.run(run())
+    assert len(handler.sent) == 1 and handler.sent[0]["applicants"] == [f"a{i}" for i in range(5)]
+    assert {writes.status(job["job_id"])["status"] for job in jobs} == {CONFIRMED}
+    assert writes.stats()["avg_batch_size"] == 5
+
+
+def test_queue_longer_than_the_batch_limit_is_split_across_transactions():
+    async def run():
+        handler = FakeHandler()
+        writes = pipeline(handler, max_batch_size=4)
+        jobs = [writes.enqueue(f"a{i}", 10, "U1") for i in range(10)]
+        await settle(writes, jobs)
+        return handler, writes, jobs
+
+    handler, writes, jobs = asyncio.run(run())
+    assert [len(tx["applicants"]) for tx in handler.sent] == [4, 4, 2]
+    assert [a for tx in handler.sent for a in tx["applicants"]] == [f"a{i}" for i in range(10)]
+    assert [tx["nonce"] for tx in handler.sent] == [0, 1, 2]
+    assert {writes.status(job["job_id"])["status"] for job in jobs} == {CONFIRMED}
+
+
+def test_reverted_batch_is_retried_one_by_one_so_only_the_bad_write_fails():
+    async def run():
+        handler = FakeHandler(bad={"a2"})
+        writes = pipeline(handler)
+        jobs = [writes.enqueue(f"a{i}", 10, "U1") for i in range(4)]
+        await settle(writes, jobs)
+        return handler, writes, jobs
+
+    handler, writes, jobs = asyncio.run(run())
+    statuses = [writes.status(job["job_id"])["status"] for job in jobs]
+    assert statuses == [CONFIRMED, CONFIRMED, FAILED, CONFIRMED]
+    assert len(handler.sent) == 5 and writes.stats()["batch_fallbacks"] == 1
+
+
+def test_dropped_transaction_is_resent_at_the_same_nonce():
+    async def run():
+        handler = FakeHandler(drop_first=True)
+        writes = pipeline(handler)
+        job = writes.enqueue("a0", 10, "U1")
+        await settle(writes, [job])
+        return handler, writes, job
+
+    handler, writes, job = asyncio.run(run())
+    assert [tx["nonce"] for tx in handler.sent] == [0, 0]
+    assert writes.status(job["job_id"])["status"] == CONFIRMED
+    assert writes.stats()["dropped_resubmitted"] == 1
+
+
+def test_stuck_transaction_fails_and_triggers_a_nonce_resync():
+    async def run():
+        handler = FakeHandler(stuck=True)
+        writes = pipeline(handler)
+        job = writes.enqueue("a0", 10, "U1")
+        await settle(writes, [job])
+        return handler, writes, job
+
+    handler, writes, job = asyncio.run(run())
+    assert writes.status(job["job_id"])["error"] == "Transaction confirmation timeout"
+    assert handler.resyncs == 1
+
+
+def test_unreadable_receipt_fails_its_jobs_and_tracking_continues():
+    async def run():
+        handler = FakeHandler()
+        handler.unreadable.add("0x0000")
+        writes = pipeline(handler)
+        first = writes.enqueue("a0", 10, "U1")
+        await settle(writes, [first])
+        second = writes.enqueue("a1", 10, "U1")
+        await settle(writes, [second])
+        assert writes.stats()["workers_running"]
+        return writes, first, second
+
+    writes, first, second = asyncio.run(run())
+    assert writes.status(first["job_id"])["error"].startswith("Receipt processing error")
+    assert writes.status(second["job_id"])["status"] == CONFIRMED
+
+
+def test_only_stopped_workers_are_restarted():
+    async def run():
+        writes = pipeline(FakeHandler())
+        writes.enqueue("a0", 10, "U1")
+        receipt = writes._workers["receipt"]
+        writes._workers["submit"].cancel()
+        await asyncio.sleep(0)
+        job = writes.enqueue("a1", 10, "U1")
+        assert writes._workers["receipt"] is receipt
+        await settle(writes, [job])
+        assert writes.stats()["workers_running"]
+
+    asyncio.run(run())
+
+
+class SlowCollection:
+    """A job store whose writes block like a contended SQLite database"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.inner = MemoryStateBackend().collection("allocation_jobs")
+        self.writer_threads = set()
+
+    def create_index(self, field):
+        self.inner.create_index(field)
+        return self
+
+    def put(self, key, value):
+        self.writer_threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        self.inner.put(key, value)
+
+    def get(self, key):
+        return self.inner.get(key)
+
+    def delete(self, key):
+        return self.inner.delete(key)
+
+    def find(self, field, value):
+        return self.inner.find(field, value)
+
+
+def test_job_store_writes_stay_off_the_event_loop_and_in_order():
+    store = SlowCollection(delay=0.05)
+
+    async def run():
+        writes = pipeline(FakeHandler(), job_store=store)
+        started = time.perf_counter()
+        jobs = [writes.enqueue(f"a{i}", 10, "U1") for i in range(10)]
+        enqueue_seconds = time.perf_counter() - started
+        await settle(writes, jobs)
+        return writes, jobs, enqueue_seconds
+
+    writes, jobs, enqueue_seconds = asyncio.run(run())
+    assert enqueue_seconds < 0.05
+    assert threading.current_thread().name not in store.writer_threads
+
+    writes.flush()
+    # The last write for each job is its final state
+    assert {store.get(job["job_id"])["status"] for job in jobs} == {CONFIRMED}
+    assert writes.status_for_applicant("a3")["job_id"] == jobs[3]["job_id"]
+
+
+def test_other_workers_see_jobs_through_the_job_store():
+    backend = MemoryStateBackend()
+
+    async def run():
+        writes = pipeline(FakeHandler(), job_store=backend.collection("allocation_jobs"))
+        first = writes.enqueue("a0", 10, "U1")
+        await settle(writes, [first])
+        second = writes.enqueue("a0", 10, "U2")
+        await settle(writes, [second])
+        writes.flush()
+        return first, second
+
+    first, second = asyncio.run(run())
+    other = pipeline(FakeHandler(), job_store=backend.collection("allocation_jobs"))
+    assert other.status(first["job_id"])["status"] == CONFIRMED
+    assert other.status_for_applicant("a0")["shelter_unit_id"] == "U2"
@@ -3,20 +3,17 @@ import json
 import requests
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, WebSocket
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import asyncio
 import aiohttp
 
-# --- LangChain Imports ---
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import AgentType, Tool, initialize_agent
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
-from langchain.tools import tool
-from langchain.chains import LLMChain
+from fastapi.concurrency import run_in_threadpool
+from startup import lazy_resource
+from state_backend import state_backend
+from aggregates import RunningTotals, conditional_response, count_all, count_where, field_sum
+from live_updates import live_channel_from_env, serve_websocket, sse_response
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -39,12 +36,6 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not found. Please set it in your .env file.")
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash", 
-    temperature=0.3,  # Lower temperature for more deterministic results
-    google_api_key=GEMINI_API_KEY
-)
-
 # --- Simulated Database and External API Connections ---
 # In a real implementation, these would connect to actual databases and APIs
 
@@ -96,42 +87,47 @@ SIMULATED_STORAGE = [
      "temperature": "ambient", "cost_per_day_per_kg": 0.2},
 ]
 
-# --- Define LangChain Tools ---
+# Shared copies of the simulated data: seeded once into the state backend, so every
+# worker serves (and would update) the same records
+inventory_db = state_backend.collection("waste_inventory")
+demands_db = state_backend.collection("waste_demands")
+logistics_db = state_backend.collection("waste_logistics")
+storage_db = state_backend.collection("waste_storage")
+for collection, records in ((inventory_db, SIMULATED_INVENTORY), (demands_db, SIMULATED_DEMANDS),
+                            (logistics_db, SIMULATED_LOGISTICS), (storage_db, SIMULATED_STORAGE)):
+    collection.seed((str(record["id"]), record) for record in records)
+
+# --- Define the agent's tools (wrapped as LangChain tools when the agent is built) ---
 # These tools simulate connecting to real data sources
 
-@tool
 def get_inventory_data(query: str = "") -> str:
     """Fetches current food surplus from warehouses, markets, and farms. 
     Can filter by location, item type, or perishability level."""
     # In a real implementation, this would query a database
-    return json.dumps(SIMULATED_INVENTORY)
+    return json.dumps(inventory_db.values())
 
-@tool
 def get_demand_signals(location: str = "") -> str:
     """Fetches indicators of demand from communities, NGOs, or food banks. 
     Can filter by location or urgency level."""
     # In a real implementation, this would query a database
-    return json.dumps(SIMULATED_DEMANDS)
+    return json.dumps(demands_db.values())
 
-@tool
 def get_available_logistics(capacity_required: int = 0) -> str:
     """Fetches available transportation options with their capacity, location, and cost details."""
-    available_vehicles = [v for v in SIMULATED_LOGISTICS if v["status"] == "available"]
+    available_vehicles = [v for v in logistics_db.values() if v["status"] == "available"]
     if capacity_required > 0:
         available_vehicles = [v for v in available_vehicles if v["capacity_kg"] >= capacity_required]
     return json.dumps(available_vehicles)
 
-@tool
 def get_storage_options(storage_type: str = "", capacity_needed: int = 0) -> str:
     """Fetches available storage facilities with their capacity, temperature, and cost details."""
-    available_storage = SIMULATED_STORAGE
+    available_storage = storage_db.values()
     if storage_type:
         available_storage = [s for s in available_storage if storage_type in s["temperature"]]
     if capacity_needed > 0:
         available_storage = [s for s in available_storage if s["available_kg"] >= capacity_needed]
     return json.dumps(available_storage)
 
-@tool
 def calculate_route_distance(origin: str, destination: str) -> str:
     """Calculates the distance and estimated travel time between two locations."""
     # Simulated route calculation - in real implementation, use Google Maps API
@@ -151,7 +147,6 @@ def calculate_route_distance(origin: str, destination: str) -> str:
         # Default values if route not in our simulated data
         return json.dumps({"distance_km": 20, "time_min": 40})
 
-@tool
 def get_farmer_info(farmer_id: str) -> str:
     """Retrieves information about a farmer including their economic situation and past transactions."""
     # Simulated farmer data
@@ -170,14 +165,12 @@ def get_farmer_info(farmer_id: str) -> str:
     
     return json.dumps(farmers.get(farmer_id, {"error": "Farmer not found"}))
 
-@tool
 def send_alert(recipient: str, message: str) -> str:
     """Sends an alert or notification to a recipient (driver, warehouse manager, etc.)."""
     # In a real implementation, this would integrate with SMS/email APIs
     print(f"ALERT SENT TO {recipient}: {message}")
     return json.dumps({"status": "success", "message": "Alert sent successfully"})
 
-@tool
 def calculate_environmental_impact(food_waste_kg: int, distance_km: int) -> str:
     """Calculates the environmental impact of food waste and transportation."""
     # Emission factors (kg CO2 equivalent)
@@ -193,15 +186,14 @@ def calculate_environmental_impact(food_waste_kg: int, distance_km: int) -> str:
         "transport_distance_km": distance_km
     })
 
-@tool
 def record_allocation_plan(plan: str) -> str:
     """Records the final allocation plan in the system database."""
     # In a real implementation, this would write to a database
     print(f"ALLOCATION PLAN RECORDED: {plan}")
     return json.dumps({"status": "success", "message": "Plan recorded successfully"})
 
-# --- Initialize the Agent with Tools ---
-tools = [
+# --- Agent setup ---
+TOOL_FUNCTIONS = [
     get_inventory_data, 
     get_demand_signals, 
     get_available_logistics,
@@ -214,7 +206,7 @@ tools = [
 ]
 
 # System message that defines the agent's behavior
-system_message = SystemMessage(content="""You are an expert supply chain logistics coordinator called "HungerGuard AI". 
+SYSTEM_PROMPT = """You are an expert supply chain logistics coordinator called "HungerGuard AI". 
 Your goal is to minimize food waste and hunger by optimally matching food surplus to communities in need. 
 
 You must consider these factors in priority order:
@@ -229,23 +221,39 @@ After creating a plan, calculate its environmental and economic impact.
 Send alerts to relevant stakeholders for urgent actions.
 Finally, record the allocation plan in the system.
 
-Think step-by-step and provide clear reasoning for your decisions.""")
-
-# Initialize memory for the agent
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-
-# Initialize the agent
-agent = initialize_agent(
-    tools,
-    llm,
-    agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    handle_parsing_errors=True,
-    memory=memory,
-    agent_kwargs={
-        "system_message": system_message,
-    }
-)
+Think step-by-step and provide clear reasoning for your decisions."""
+
+def build_agent():
+    """Import LangChain and build the Gemini agent (run once, by the startup warmup or the first plan request)"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain.agents import AgentType, initialize_agent
+    from langchain.memory import ConversationBufferMemory
+    from langchain.schema import SystemMessage
+    from langchain.tools import tool
+
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash", 
+        temperature=0.3,  # Lower temperature for more deterministic results
+        google_api_key=GEMINI_API_KEY
+    )
+
+    # Initialize memory for the agent
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+
+    # Initialize the agent
+    return initialize_agent(
+        [tool(func) for func in TOOL_FUNCTIONS],
+        llm,
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True,
+        handle_parsing_errors=True,
+        memory=memory,
+        agent_kwargs={
+            "system_message": SystemMessage(content=SYSTEM_PROMPT),
+        }
+    )
+
+agent_resource = lazy_resource("waste_optimizer_agent", build_agent)
 
 # --- Impact Calculation Function ---
 def calculate_impact_metrics(plan_text: str) -> Dict[str, Any]:
@@ -312,6 +320,9 @@ async def generate_plan_endpoint(input_data: AgentInput, background_tasks: Backg
         """
         
         # Run the agent
+        agent = await run_in_threadpool(agent_resource.get)
+        if agent is None:
+            raise HTTPException(status_code=503, detail=f"Planning agent unavailable: {agent_resource.error}")
         result = await agent.arun(prompt)
         
         # Parse the result into plan and summary
@@ -339,6 +350,8 @@ async def generate_plan_endpoint(input_data: AgentInput, background_tasks: Backg
             estimated_impact=impact_metrics
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred during agent execution: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
@@ -353,40 +366,66 @@ async def store_allocation_plan(plan: str, impact_metrics: Dict[str, Any]):
     return {"status": "success"}
 
 # --- Additional API Endpoints for System Monitoring ---
+# Handlers that read the state backend (SQLite in multi-worker mode) are plain functions, so
+# FastAPI runs them in the threadpool instead of on the event loop
+def quantity_amount(item: Dict[str, Any]) -> int:
+    """Numeric part of an inventory quantity such as 200kg or 150L"""
+    return int(item['quantity'].replace('kg', '').replace('L', ''))
+
+# Updated by each write instead of re-parsing every quantity on every dashboard poll
+dashboard_totals = RunningTotals(state_backend, {
+    "total_inventory_kg": (inventory_db.name, quantity_amount),
+    "total_demand_capacity": (demands_db.name, field_sum("capacity_kg")),
+    "available_vehicles": (logistics_db.name, count_where("status", "available")),
+    "total_vehicles": (logistics_db.name, count_all),
+    "available_storage_kg": (storage_db.name, field_sum("available_kg")),
+    "total_storage_capacity": (storage_db.name, field_sum("capacity_kg")),
+})
+
+def utilization_rate(totals: Dict[str, Any]) -> float:
+    total_demand = totals["total_demand_capacity"]
+    return round(totals["total_inventory_kg"] / total_demand * 100, 2) if total_demand > 0 else 0
+
+def last_updated() -> str:
+    return datetime.fromtimestamp(dashboard_totals.changed_at).isoformat()
+
+live_dashboard = live_channel_from_env(
+    "waste-optimizer", state_backend,
+    [inventory_db.name, demands_db.name, logistics_db.name, storage_db.name], dashboard_totals
+)
+
 @router.get("/system_status")
-async def get_system_status():
-    """Returns current system status and inventory overview."""
-    total_inventory = sum([int(item['quantity'].replace('kg', '').replace('L', '')) for item in SIMULATED_INVENTORY])
-    total_demand = sum([demand['capacity_kg'] for demand in SIMULATED_DEMANDS])
-    
-    return {
+def get_system_status(request: Request):
+    """Returns current system status and inventory overview (304 when If-None-Match has the current ETag)."""
+    totals, digest = dashboard_totals.snapshot()
+    return conditional_response(request, digest, lambda: {
         "status": "operational",
-        "total_inventory_kg": total_inventory,
-        "total_demand_capacity": total_demand,
-        "utilization_rate": round(total_inventory / total_demand * 100, 2) if total_demand > 0 else 0,
-        "last_updated": datetime.now().isoformat()
-    }
+        "total_inventory_kg": totals["total_inventory_kg"],
+        "total_demand_capacity": totals["total_demand_capacity"],
+        "utilization_rate": utilization_rate(totals),
+        "last_updated": last_updated()
+    })
 
 @router.get("/inventory")
-async def get_inventory():
+def get_inventory():
     """Returns current inventory details."""
-    return SIMULATED_INVENTORY
+    return inventory_db.values()
 
 @router.get("/demand")
-async def get_demand():
+def get_demand():
     """Returns current demand details."""
-    return SIMULATED_DEMANDS
+    return demands_db.values()
 
 # --- Additional Management Endpoints ---
 @router.get("/logistics")
-async def get_logistics():
+def get_logistics():
     """Returns current logistics details."""
-    return SIMULATED_LOGISTICS
+    return logistics_db.values()
 
 @router.get("/storage")
-async def get_storage():
+def get_storage():
     """Returns current storage details."""
-    return SIMULATED_STORAGE
+    return storage_db.values()
 
 @router.get("/farmers")
 async def get_farmers():
@@ -406,23 +445,33 @@ async def get_farmers():
     return farmers
 
 @router.get("/dashboard/stats")
-async def get_waste_optimizer_stats():
-    """Returns dashboard statistics for waste optimizer."""
-    total_inventory = sum([int(item['quantity'].replace('kg', '').replace('L', '')) for item in SIMULATED_INVENTORY])
-    total_demand = sum([demand['capacity_kg'] for demand in SIMULATED_DEMANDS])
-    available_vehicles = len([v for v in SIMULATED_LOGISTICS if v["status"] == "available"])
-    total_storage = sum([s['available_kg'] for s in SIMULATED_STORAGE])
-    
-    return {
-        "total_inventory_kg": total_inventory,
-        "total_demand_capacity": total_demand,
-        "utilization_rate": round(total_inventory / total_demand * 100, 2) if total_demand > 0 else 0,
-        "available_vehicles": available_vehicles,
-        "total_vehicles": len(SIMULATED_LOGISTICS),
-        "available_storage_kg": total_storage,
-        "total_storage_capacity": sum([s['capacity_kg'] for s in SIMULATED_STORAGE]),
-        "last_updated": datetime.now().isoformat()
-    }
+def get_waste_optimizer_stats(request: Request):
+    """Returns dashboard statistics for waste optimizer (304 when If-None-Match has the current ETag)."""
+    totals, digest = dashboard_totals.snapshot()
+    return conditional_response(request, digest, lambda: {
+        "total_inventory_kg": totals["total_inventory_kg"],
+        "total_demand_capacity": totals["total_demand_capacity"],
+        "utilization_rate": utilization_rate(totals),
+        "available_vehicles": totals["available_vehicles"],
+        "total_vehicles": totals["total_vehicles"],
+        "available_storage_kg": totals["available_storage_kg"],
+        "total_storage_capacity": totals["total_storage_capacity"],
+        "last_updated": last_updated()
+    })
+
+@router.websocket("/dashboard/live")
+async def dashboard_live(websocket: WebSocket):
+    """Live dashboard over WebSocket: a snapshot of the totals, then one delta event per tick with changes"""
+    await serve_websocket(websocket, live_dashboard)
+
+@router.get("/dashboard/events")
+async def dashboard_events():
+    """Live dashboard as server-sent events (same events as /dashboard/live)"""
+    return sse_response(live_dashboard)
+
+@router.get("/dashboard/live/stats")
+async def dashboard_live_stats():
+    return live_dashboard.stats()
 
 @router.get("/dashboard/inventory-flow")
 async def get_inventory_flow():